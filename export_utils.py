@@ -0,0 +1,232 @@
+"""
+Streaming CSV / JSON-lines exports.
+
+Rows are read with values_list(...).iterator(chunk_size) and written out
+as they arrive, so memory stays flat no matter how many rows match.
+Used by the export views and `python manage.py export_records`.
+"""
+import csv
+import json
+import logging
+from datetime import datetime, time, timedelta
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+def _transaction_queryset():
+    from payment_management.models import Transaction
+    return Transaction.objects.filter(is_synthetic=False)
+
+
+def _hotel_booking_queryset():
+    from hotel_booking.models import HotelBooking
+    return HotelBooking.objects.all()
+
+
+def _transport_booking_queryset():
+    from transportation.models import TransportBooking
+    return TransportBooking.objects.all()
+
+
+# Export column name -> ORM path. Insertion order is the default column order.
+EXPORT_DATASETS = {
+    'transactions': {
+        'queryset': _transaction_queryset,
+        'date_field': 'initiated_at',
+        'columns': {
+            'transaction_id': 'transaction_id',
+            'initiated_at': 'initiated_at',
+            'completed_at': 'completed_at',
+            'username': 'user__username',
+            'email': 'user__email',
+            'transaction_type': 'transaction_type',
+            'status': 'status',
+            'amount': 'amount',
+            'currency': 'currency',
+            'payment_gateway': 'payment_gateway',
+            'gateway_order_id': 'gateway_transaction_id',
+            'gateway_payment_id': 'gateway_payment_id',
+            'hotel_booking_id': 'hotel_booking__booking_id',
+            'transport_booking_id': 'transport_booking__booking_id',
+            'invoice_number': 'invoice__invoice_number',
+            'tax_amount': 'invoice__tax_amount',
+            'refund_amount': 'refund_amount',
+            'refund_date': 'refund_date',
+            'failure_reason': 'failure_reason',
+        },
+    },
+    'hotel_bookings': {
+        'queryset': _hotel_booking_queryset,
+        'date_field': 'created_at',
+        'columns': {
+            'booking_id': 'booking_id',
+            'created_at': 'created_at',
+            'username': 'user__username',
+            'email': 'user__email',
+            'hotel': 'hotel__name',
+            'city': 'hotel__city',
+            'check_in_date': 'check_in_date',
+            'check_out_date': 'check_out_date',
+            'nights': 'nights',
+            'guests': 'guests',
+            'rooms': 'rooms',
+            'price_per_night': 'price_per_night',
+            'total_amount': 'total_amount',
+            'booking_status': 'booking_status',
+            'contact_name': 'contact_name',
+            'contact_phone': 'contact_phone',
+            'contact_email': 'contact_email',
+        },
+    },
+    'transport_bookings': {
+        'queryset': _transport_booking_queryset,
+        'date_field': 'created_at',
+        'columns': {
+            'booking_id': 'booking_id',
+            'created_at': 'created_at',
+            'username': 'user__username',
+            'email': 'user__email',
+            'transport_type': 'route__transport_type',
+            'operator': 'route__operator_name',
+            'route_number': 'route__route_number',
+            'source_city': 'route__source_city',
+            'destination_city': 'route__destination_city',
+            'travel_date': 'travel_date',
+            'class_type': 'class_type',
+            'passengers': 'passengers',
+            'price_per_ticket': 'price_per_ticket',
+            'total_amount': 'total_amount',
+            'booking_status': 'booking_status',
+            'contact_name': 'contact_name',
+            'contact_phone': 'contact_phone',
+            'contact_email': 'contact_email',
+        },
+    },
+}
+
+
+def parse_export_date(value):
+    """YYYY-MM-DD -> date (None for blank); raises ValueError otherwise"""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def resolve_columns(dataset, columns=None):
+    """Validate a requested column list (or comma string) against the dataset"""
+    available = EXPORT_DATASETS[dataset]['columns']
+    if isinstance(columns, str):
+        columns = [column.strip() for column in columns.split(',') if column.strip()]
+    if not columns:
+        return list(available)
+
+    unknown = [column for column in columns if column not in available]
+    if unknown:
+        raise ValueError(f"Unknown column(s) for {dataset}: {', '.join(unknown)}")
+    return list(columns)
+
+
+def build_export_rows(dataset, columns=None, date_from=None, date_to=None, queryset=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    (columns, row iterator) for a dataset. date_from/date_to are inclusive
+    dates, compared as a datetime range so the date column's index is usable.
+    """
+    if dataset not in EXPORT_DATASETS:
+        raise ValueError(f'Unknown export dataset: {dataset}')
+
+    config = EXPORT_DATASETS[dataset]
+    columns = resolve_columns(dataset, columns)
+    queryset = config['queryset']() if queryset is None else queryset
+
+    date_field = config['date_field']
+    if date_from:
+        queryset = queryset.filter(**{f'{date_field}__gte': timezone.make_aware(datetime.combine(date_from, time.min))})
+    if date_to:
+        end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+        queryset = queryset.filter(**{f'{date_field}__lt': end})
+
+    paths = [config['columns'][column] for column in columns]
+    # Primary key order streams straight off the index instead of sorting the whole result
+    rows = queryset.order_by('pk').values_list(*paths).iterator(chunk_size=chunk_size)
+    return columns, rows
+
+
+def _format_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat() if timezone.is_aware(value) else value.isoformat()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+class _LineBuffer:
+    """File-like target for csv.writer that hands each line back"""
+    def write(self, value):
+        return value
+
+
+def iter_csv(columns, rows, rows_per_chunk=500):
+    """Yield CSV text in blocks of rows_per_chunk lines"""
+    writer = csv.writer(_LineBuffer())
+    block = [writer.writerow(columns)]
+    for row in rows:
+        block.append(writer.writerow([_format_value(value) for value in row]))
+        if len(block) >= rows_per_chunk:
+            yield ''.join(block)
+            block = []
+    if block:
+        yield ''.join(block)
+
+
+def iter_jsonl(columns, rows, rows_per_chunk=500):
+    """Yield JSON-lines text in blocks of rows_per_chunk objects"""
+    block = []
+    for row in rows:
+        record = {column: (None if value is None else _format_value(value)) for column, value in zip(columns, row)}
+        block.append(json.dumps(record, ensure_ascii=False) + '\n')
+        if len(block) >= rows_per_chunk:
+            yield ''.join(block)
+            block = []
+    if block:
+        yield ''.join(block)
+
+
+EXPORT_FORMATS = {
+    'csv': (iter_csv, 'text/csv; charset=utf-8'),
+    'jsonl': (iter_jsonl, 'application/x-ndjson; charset=utf-8'),
+}
+
+
+def streaming_export_response(dataset, params, queryset=None, filename=None):
+    """
+    StreamingHttpResponse for a dataset from request.GET-style params:
+    format (csv|jsonl), columns (comma separated), from / to (YYYY-MM-DD).
+    Raises ValueError for bad parameters.
+    """
+    file_format = params.get('format', 'csv')
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f'Unsupported export format: {file_format}')
+
+    columns, rows = build_export_rows(
+        dataset,
+        columns=params.get('columns'),
+        date_from=parse_export_date(params.get('from')),
+        date_to=parse_export_date(params.get('to')),
+        queryset=queryset,
+    )
+
+    render, content_type = EXPORT_FORMATS[file_format]
+    filename = filename or f"{dataset}-{timezone.localdate():%Y%m%d}"
+    response = StreamingHttpResponse(render(columns, rows), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{file_format}"'
+    response['Cache-Control'] = 'no-store'
+    response['X-Accel-Buffering'] = 'no'  # Let nginx pass chunks through instead of buffering the file
+    logger.info(f"Streaming {dataset} export ({file_format}, {len(columns)} columns)")
+    return response
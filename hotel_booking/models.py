@@ -54,10 +54,18 @@ class Hotel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    def compute_overall_rating(self):
+        """Average of approved guest reviews; the listed ratings until there are any"""
+        # Kept incrementally by review_feedback.aggregates
+        aggregate = getattr(self, 'rating_aggregate', None) if self.pk else None
+        if aggregate is not None and aggregate.review_count:
+            return aggregate.overall_average
+        ratings = [self.cleanliness_rating, self.comfort_rating, self.safety_rating]
+        return sum(ratings) / len([r for r in ratings if r > 0]) if any(ratings) else 0
+    
     def save(self, *args, **kwargs):
         # Calculate overall rating
-        ratings = [self.cleanliness_rating, self.comfort_rating, self.safety_rating]
-        self.overall_rating = sum(ratings) / len([r for r in ratings if r > 0]) if any(ratings) else 0
+        self.overall_rating = self.compute_overall_rating()
         super().save(*args, **kwargs)
     
     def __str__(self):
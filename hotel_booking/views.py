@@ -24,8 +24,8 @@ def hotel_search_view(request):
             budget = form.cleaned_data.get('budget', '')
             min_rating = form.cleaned_data.get('min_rating')
             
-            # Base query
-            hotels = Hotel.objects.filter(is_active=True)
+            # Base query (the review aggregate rides along for the review counts)
+            hotels = Hotel.objects.filter(is_active=True).select_related('rating_aggregate')
             
             # City filter
             if city:
@@ -73,7 +73,8 @@ def hotel_search_view(request):
     return render(request, 'hotel_booking/search.html', context)
 
 def hotel_detail_view(request, hotel_id):
-    hotel = get_object_or_404(Hotel, id=hotel_id, is_active=True)
+    hotel = get_object_or_404(Hotel.objects.select_related('rating_aggregate'), id=hotel_id, is_active=True)
+    rating_aggregate = getattr(hotel, 'rating_aggregate', None)
     
     # FIXED: Check both parameter names
     check_in_date = request.GET.get('check_in_date') or request.GET.get('check_in')
@@ -83,6 +84,9 @@ def hotel_detail_view(request, hotel_id):
     
     context = {
         'hotel': hotel,
+        'review_count': rating_aggregate.review_count if rating_aggregate else 0,
+        'review_averages': rating_aggregate.averages() if rating_aggregate and rating_aggregate.review_count else {},
+        'recent_reviews': hotel.reviews.filter(is_approved=True).select_related('user')[:10],
         'check_in_date': check_in_date,
         'check_out_date': check_out_date,
         'guests': guests,
@@ -205,14 +209,23 @@ def cancel_hotel_booking_view(request, booking_id):
         messages.error(request, 'This booking cannot be cancelled.')
         return redirect('my_hotel_bookings')
     
+    from payment_management.refunds import refund_cancelled_booking, refund_quote
+    
     if request.method == 'POST':
         booking.booking_status = 'CANCELLED'
         booking.save()
         
-        messages.success(request, f'Booking {booking.booking_id} has been cancelled.')
+        refund = refund_cancelled_booking(booking, f'Hotel booking {booking.booking_id} cancelled by guest')
+        if refund:
+            messages.success(request, f'Booking {booking.booking_id} has been cancelled. A refund of ₹{refund.approved_amount} is being processed.')
+        else:
+            messages.success(request, f'Booking {booking.booking_id} has been cancelled.')
         return redirect('my_hotel_bookings')
     
+    _, refund_percent, refund_amount = refund_quote(booking)
     context = {
         'booking': booking,
+        'refund_percent': refund_percent,
+        'refund_amount': refund_amount,
     }
     return render(request, 'hotel_booking/cancel_booking.html', context)
\ No newline at end of file
@@ -1,3 +1,38 @@
 from django.contrib import admin
+from .models import DeadLetterNotification, GeocodeCacheEntry, Geofence, GeofenceEvent, QueuedNotification
+from .notification_queue import requeue_dead_letters
 
-# Register your models here.
+@admin.register(QueuedNotification)
+class QueuedNotificationAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'category', 'priority', 'recipient', 'status', 'attempts', 'available_at', 'sent_at']
+    list_filter = ['status', 'priority', 'category', 'provider']
+    search_fields = ['recipient', 'subject']
+
+@admin.register(DeadLetterNotification)
+class DeadLetterNotificationAdmin(admin.ModelAdmin):
+    list_display = ['failed_at', 'category', 'priority', 'recipient', 'attempts', 'last_error']
+    list_filter = ['category', 'priority', 'provider']
+    search_fields = ['recipient', 'subject']
+    actions = ['requeue']
+
+    @admin.action(description='Move back to the notification queue')
+    def requeue(self, request, queryset):
+        count = requeue_dead_letters(queryset)
+        self.message_user(request, f'{count} notifications requeued.')
+
+@admin.register(Geofence)
+class GeofenceAdmin(admin.ModelAdmin):
+    list_display = ['name', 'user', 'shape', 'notify_on', 'is_inside', 'is_active', 'created_at']
+    list_filter = ['shape', 'notify_on', 'is_active']
+    search_fields = ['name', 'user__username']
+
+@admin.register(GeofenceEvent)
+class GeofenceEventAdmin(admin.ModelAdmin):
+    list_display = ['occurred_at', 'geofence', 'event_type', 'emails_sent']
+    list_filter = ['event_type', 'emails_sent']
+
+@admin.register(GeocodeCacheEntry)
+class GeocodeCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ['key', 'address', 'updated_at']
+    search_fields = ['key', 'address']
+    readonly_fields = ['key', 'latitude', 'longitude', 'created_at', 'updated_at']
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class LocationSosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'location_sos'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,191 @@
+# location_sos/checkin_monitor.py
+"""
+Missed safety check-in monitor.
+
+A check-in made with a schedule ("I'll check in again within 2 hours")
+opens a schedule: schedule_status WAITING until next_checkin_due. The
+user's next check-in marks it MET. If the due time passes first, the
+monitor emails the traveller a reminder (REMINDED). If
+CHECKIN_ESCALATION_GRACE_MINUTES then pass with no check-in, it
+escalates: an SOS alert at the last checked-in position goes to the
+nearest trusted contacts and the emergency contacts (ESCALATED).
+
+CheckinScheduler (run by `python manage.py monitor_checkins`) keeps open
+schedules in a heap ordered by when they next need attention. It only
+wakes for the earliest entry. It loads the open schedules once, through
+the (schedule_status, next_checkin_due) index. After that it follows
+changes incrementally by reading rows whose schedule_changed_at moved, every
+CHECKIN_MONITOR_REFRESH_SECONDS. A new, met, cancelled or rescheduled
+check-in is therefore noticed within seconds, without rescanning the
+table. Stale heap entries are skipped when popped. Every state change is
+a compare-and-set, so two monitors never remind or escalate twice.
+"""
+import heapq
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .email_utils import send_checkin_reminder_email
+from .models import SafetyCheckIn, SOSAlert
+from .recipients import recipients_for
+from .responders import nearest_responders
+from .sos_dispatch import dispatch_sos_alert
+
+logger = logging.getLogger(__name__)
+
+
+# SCHEDULE CHANGES (called from views)
+def schedule_next_checkin(checkin, due_at):
+    """Open a schedule on a new check-in"""
+    now = timezone.now()
+    checkin.is_scheduled = True
+    checkin.next_checkin_due = due_at
+    checkin.schedule_status = 'WAITING'
+    checkin.schedule_changed_at = now
+    checkin.save(update_fields=['is_scheduled', 'next_checkin_due', 'schedule_status', 'schedule_changed_at'])
+
+
+def close_open_schedules(user, exclude_pk=None):
+    """A check-in satisfies every schedule the user had open. Returns the number closed."""
+    open_schedules = SafetyCheckIn.objects.filter(user=user, schedule_status__in=SafetyCheckIn.OPEN_SCHEDULE_STATUSES)
+    if exclude_pk is not None:
+        open_schedules = open_schedules.exclude(pk=exclude_pk)
+    return open_schedules.update(schedule_status='MET', schedule_changed_at=timezone.now())
+
+
+def cancel_schedule(checkin):
+    return SafetyCheckIn.objects.filter(
+        pk=checkin.pk, schedule_status__in=SafetyCheckIn.OPEN_SCHEDULE_STATUSES,
+    ).update(schedule_status='CANCELLED', schedule_changed_at=timezone.now())
+
+
+# ACTIONS
+def _claim(checkin_pk, from_status, changed_at, **fields):
+    """Compare-and-set a schedule transition; returns the new changed_at or None"""
+    now = timezone.now()
+    updated = SafetyCheckIn.objects.filter(
+        pk=checkin_pk, schedule_status=from_status, schedule_changed_at=changed_at,
+    ).update(schedule_changed_at=now, **fields)
+    return now if updated else None
+
+
+def send_reminder(checkin_pk, changed_at):
+    now = timezone.now()
+    claimed = _claim(checkin_pk, 'WAITING', changed_at, schedule_status='REMINDED', reminder_sent_at=now)
+    if claimed:
+        checkin = SafetyCheckIn.objects.select_related('user').get(pk=checkin_pk)
+        send_checkin_reminder_email(checkin)
+        logger.info(f"Reminded {checkin.user.username} of missed check-in {checkin_pk}")
+    return claimed
+
+
+def escalate(checkin_pk, changed_at):
+    """Raise an SOS for a missed check-in and notify the emergency contacts"""
+    now = timezone.now()
+    with transaction.atomic():
+        claimed = _claim(checkin_pk, 'REMINDED', changed_at, schedule_status='ESCALATED', escalated_at=now)
+        if not claimed:
+            return None
+        checkin = SafetyCheckIn.objects.select_related('user').get(pk=checkin_pk)
+        sos_alert = SOSAlert.objects.create(
+            user=checkin.user,
+            latitude=checkin.latitude,
+            longitude=checkin.longitude,
+            address=checkin.address,
+            alert_type='OTHER',
+            message=(f"Missed scheduled safety check-in due at "
+                     f"{timezone.localtime(checkin.next_checkin_due):%Y-%m-%d %H:%M}. "
+                     f"Last check-in location is shown."),
+        )
+        SafetyCheckIn.objects.filter(pk=checkin_pk).update(escalation_alert=sos_alert)
+        responders = nearest_responders(checkin.user, checkin.latitude, checkin.longitude)
+        dispatch_sos_alert(sos_alert, recipients_for(checkin.user_id, 'SOS'), responders=responders)
+    logger.warning(f"Missed check-in {checkin_pk} of {checkin.user.username} escalated as SOS alert {sos_alert.alert_id}")
+    return claimed
+
+
+# SCHEDULER
+class CheckinScheduler:
+    def __init__(self, grace_minutes=None):
+        self.grace = timedelta(minutes=grace_minutes if grace_minutes is not None else getattr(
+            settings, 'CHECKIN_ESCALATION_GRACE_MINUTES', 15))
+        self._heap = []  # (fire_at, pk, changed_at, status)
+        self._current = {}  # pk -> changed_at of the state its live heap entry was made for
+        self._watermark = None
+
+    def _track(self, pk, status, due, changed_at):
+        if status not in SafetyCheckIn.OPEN_SCHEDULE_STATUSES or due is None:
+            self._current.pop(pk, None)
+            return
+        if self._current.get(pk) == changed_at:
+            return
+        self._current[pk] = changed_at
+        fire_at = due if status == 'WAITING' else due + self.grace
+        heapq.heappush(self._heap, (fire_at, pk, changed_at, status))
+
+    def _rows(self, queryset):
+        return queryset.order_by().values_list('pk', 'schedule_status', 'next_checkin_due', 'schedule_changed_at')
+
+    def load(self):
+        """Initial load of every open schedule; returns how many"""
+        self._heap, self._current = [], {}
+        self._watermark = timezone.now()
+        for row in self._rows(SafetyCheckIn.objects.filter(schedule_status__in=SafetyCheckIn.OPEN_SCHEDULE_STATUSES)):
+            self._track(*row)
+        return len(self._current)
+
+    def refresh(self):
+        """Apply schedule changes since the last refresh; returns how many rows changed"""
+        if self._watermark is None:
+            return self.load()
+        # Overlap a little so a row committed just behind the clock is not missed; _track ignores repeats
+        since = self._watermark - timedelta(seconds=2)
+        self._watermark = timezone.now()
+        changed = 0
+        for row in self._rows(SafetyCheckIn.objects.filter(schedule_changed_at__gt=since)):
+            self._track(*row)
+            changed += 1
+        return changed
+
+    def next_fire_at(self):
+        """When the earliest open schedule needs attention, or None"""
+        while self._heap and self._current.get(self._heap[0][1]) != self._heap[0][2]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def run_due(self, now=None):
+        """Remind or escalate everything that has come due. Returns a count per action."""
+        now = now or timezone.now()
+        counts = {}
+        while True:
+            fire_at = self.next_fire_at()
+            if fire_at is None or fire_at > now:
+                break
+            _, pk, changed_at, status = heapq.heappop(self._heap)
+            try:
+                if status == 'WAITING':
+                    new_changed_at = send_reminder(pk, changed_at)
+                else:
+                    new_changed_at = escalate(pk, changed_at)
+            except Exception as e:
+                logger.error(f"Missed check-in {pk}: {str(e)}")
+                # Retry shortly rather than drop it
+                heapq.heappush(self._heap, (now + timedelta(seconds=30), pk, changed_at, status))
+                continue
+
+            self._current.pop(pk, None)
+            if new_changed_at is None:
+                # Changed by someone else first; the next refresh brings the new state
+                continue
+            action = 'REMINDED' if status == 'WAITING' else 'ESCALATED'
+            counts[action] = counts.get(action, 0) + 1
+            if action == 'REMINDED':
+                self._current[pk] = new_changed_at
+                heapq.heappush(self._heap, (fire_at + self.grace, pk, new_changed_at, 'REMINDED'))
+        return counts
+
+    def __len__(self):
+        return len(self._current)
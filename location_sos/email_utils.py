@@ -1,81 +1,57 @@
 # location_sos/email_utils.py
-from django.core.mail import send_mail, EmailMultiAlternatives
-from django.template.loader import render_to_string
+from django.core.mail import send_mail
 from django.conf import settings
-from django.utils import timezone
 from django.urls import reverse
 import logging
 
+from .models import QueuedNotification
+from .notification_queue import enqueue_messages
+from .notification_rendering import render_notification
+
 logger = logging.getLogger(__name__)
 
+def _queue_batch(messages, category, priority, source=None):
+    """Hand a fan-out batch to the notification queue; returns how many were queued"""
+    queued = enqueue_messages(messages, category=category, priority=priority, source=source)
+    logger.info(f"{queued} {category} emails queued")
+    return queued
+
+def sos_alert_context(sos_alert):
+    """Template context shared by every recipient of an SOS alert"""
+    user = sos_alert.user
+    return {
+        'user': user,
+        'user_name': user.get_full_name() or user.username,
+        'sos_alert': sos_alert,
+        'alert_type_display': sos_alert.get_alert_type_display(),
+        'google_maps_url': f"https://maps.google.com/?q={sos_alert.latitude},{sos_alert.longitude}",
+        'company_name': 'Nomado Travel',
+        'support_email': settings.EMAIL_HOST_USER,
+        'emergency_number': '112',  # Indian emergency number
+    }
+
+def render_sos_alert(sos_alert, context=None):
+    """The SOS alert email rendered once for all recipients"""
+    context = context or sos_alert_context(sos_alert)
+    subject = f"🚨 EMERGENCY ALERT from {context['user_name']} - Immediate Action Required"
+    return render_notification('sos_alert', context, subject, personal_fields=('contact_name', 'proximity'))
+
 def send_sos_alert_email(sos_alert, emergency_contacts):
-    """Send SOS alert email to emergency contacts"""
+    """Queue SOS alert email to emergency contacts"""
     try:
-        user = sos_alert.user
-        user_name = user.get_full_name() or user.username
-        
-        # Prepare context
-        context = {
-            'user': user,
-            'user_name': user_name,
-            'sos_alert': sos_alert,
-            'alert_type_display': sos_alert.get_alert_type_display(),
-            'google_maps_url': f"https://maps.google.com/?q={sos_alert.latitude},{sos_alert.longitude}",
-            'company_name': 'Nomado Travel',
-            'support_email': settings.EMAIL_HOST_USER,
-            'emergency_number': '112',  # Indian emergency number
-        }
-        
-        # Render email templates
-        html_content = render_to_string('emails/sos_alert.html', context)
-        text_content = render_to_string('emails/sos_alert.txt', context)
-        
-        # Send to each emergency contact
-        sent_count = 0
-        for contact in emergency_contacts:
-            try:
-                # Create personalized context for each contact
-                contact_context = context.copy()
-                contact_context['contact'] = contact
-                contact_context['contact_name'] = contact.name
-                
-                # Re-render templates with contact context
-                html_content = render_to_string('emails/sos_alert.html', contact_context)
-                text_content = render_to_string('emails/sos_alert.txt', contact_context)
-                
-                subject = f"🚨 EMERGENCY ALERT from {user_name} - Immediate Action Required"
-                
-                # Create email
-                msg = EmailMultiAlternatives(
-                    subject=subject,
-                    body=text_content,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    to=[contact.email]
-                )
-                msg.attach_alternative(html_content, "text/html")
-                
-                # Send email
-                msg.send()
-                sent_count += 1
-                logger.info(f"SOS alert email sent to {contact.email} for alert {sos_alert.alert_id}")
-                
-            except Exception as e:
-                logger.error(f"Failed to send SOS alert email to {contact.email}: {str(e)}")
-        
-        # Update alert with email status
-        if sent_count > 0:
-            sos_alert.emails_sent = True
-            sos_alert.email_sent_at = timezone.now()
-            sos_alert.save()
+        # Render once; only the greeting differs per contact
+        rendered = render_sos_alert(sos_alert)
+        messages = [rendered.message_for(contact.email, contact_name=contact.name) for contact in emergency_contacts]
         
-        return sent_count
+        # Delivered by the notification worker, which also sets emails_sent
+        return _queue_batch(messages, 'SOS_ALERT', QueuedNotification.PRIORITY_SOS, source=sos_alert)
         
     except Exception as e:
         logger.error(f"Failed to send SOS alert emails: {str(e)}")
         return 0
 
 def send_location_share_email(location_share, emergency_contacts, additional_email=None):
-    """Send location sharing email to emergency contacts"""
+    """Queue location sharing email to emergency contacts"""
     try:
         user = location_share.user
         user_name = user.get_full_name() or user.username
@@ -96,61 +72,27 @@ def send_location_share_email(location_share, emergency_contacts, additional_ema
             'support_email': settings.EMAIL_HOST_USER,
         }
         
-        # Send to emergency contacts
-        sent_count = 0
-        email_list = []
-        
         # Add emergency contacts
-        for contact in emergency_contacts:
-            email_list.append((contact.email, contact.name))
+        email_list = [(contact.email, contact.name) for contact in emergency_contacts]
         
         # Add additional email if provided
         if additional_email:
             email_list.append((additional_email, 'Additional Contact'))
         
-        for email, name in email_list:
-            try:
-                # Create personalized context
-                contact_context = context.copy()
-                contact_context['contact_name'] = name
-                
-                # Render email templates
-                html_content = render_to_string('emails/location_share.html', contact_context)
-                text_content = render_to_string('emails/location_share.txt', contact_context)
-                
-                subject = f"📍 {user_name} is sharing their live location with you"
-                
-                # Create email
-                msg = EmailMultiAlternatives(
-                    subject=subject,
-                    body=text_content,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    to=[email]
-                )
-                msg.attach_alternative(html_content, "text/html")
-                
-                # Send email
-                msg.send()
-                sent_count += 1
-                logger.info(f"Location share email sent to {email} for share {location_share.share_id}")
-                
-            except Exception as e:
-                logger.error(f"Failed to send location share email to {email}: {str(e)}")
-        
-        # Update location share with email status
-        if sent_count > 0:
-            location_share.emails_sent = True
-            location_share.email_sent_at = timezone.now()
-            location_share.save()
+        # Render once; only the greeting differs per recipient
+        subject = f"📍 {user_name} is sharing their live location with you"
+        rendered = render_notification('location_share', context, subject)
+        messages = [rendered.message_for(email, contact_name=name) for email, name in email_list]
         
-        return sent_count
+        # Delivered by the notification worker, which also sets emails_sent
+        return _queue_batch(messages, 'LOCATION_SHARE', QueuedNotification.PRIORITY_SAFETY, source=location_share)
         
     except Exception as e:
         logger.error(f"Failed to send location share emails: {str(e)}")
         return 0
 
 def send_safety_checkin_email(safety_checkin, emergency_contacts):
-    """Send safety check-in email to emergency contacts"""
+    """Queue safety check-in email to emergency contacts"""
     try:
         user = safety_checkin.user
         user_name = user.get_full_name() or user.username
@@ -172,56 +114,25 @@ def send_safety_checkin_email(safety_checkin, emergency_contacts):
             'is_concern': safety_checkin.status == 'CONCERN',
         }
         
-        # Send to each emergency contact
-        sent_count = 0
-        for contact in emergency_contacts:
-            try:
-                # Create personalized context for each contact
-                contact_context = context.copy()
-                contact_context['contact'] = contact
-                contact_context['contact_name'] = contact.name
-                
-                # Render email templates
-                html_content = render_to_string('emails/safety_checkin.html', contact_context)
-                text_content = render_to_string('emails/safety_checkin.txt', contact_context)
-                
-                # Set subject based on status
-                if safety_checkin.status == 'EMERGENCY':
-                    subject = f"🚨 EMERGENCY Check-in from {user_name} - Immediate Attention Required"
-                else:
-                    subject = f"⚠️ Safety Concern from {user_name} - Please Check"
-                
-                # Create email
-                msg = EmailMultiAlternatives(
-                    subject=subject,
-                    body=text_content,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    to=[contact.email]
-                )
-                msg.attach_alternative(html_content, "text/html")
-                
-                # Send email
-                msg.send()
-                sent_count += 1
-                logger.info(f"Safety check-in email sent to {contact.email} for checkin by {user.username}")
-                
-            except Exception as e:
-                logger.error(f"Failed to send safety check-in email to {contact.email}: {str(e)}")
+        # Set subject based on status
+        if safety_checkin.status == 'EMERGENCY':
+            subject = f"🚨 EMERGENCY Check-in from {user_name} - Immediate Attention Required"
+        else:
+            subject = f"⚠️ Safety Concern from {user_name} - Please Check"
         
-        # Update check-in with email status
-        if sent_count > 0:
-            safety_checkin.emails_sent = True
-            safety_checkin.email_sent_at = timezone.now()
-            safety_checkin.save()
+        # Render once; only the greeting differs per contact
+        rendered = render_notification('safety_checkin', context, subject)
+        messages = [rendered.message_for(contact.email, contact_name=contact.name) for contact in emergency_contacts]
         
-        return sent_count
+        # Delivered by the notification worker, which also sets emails_sent
+        return _queue_batch(messages, 'SAFETY_CHECKIN', QueuedNotification.PRIORITY_SAFETY, source=safety_checkin)
         
     except Exception as e:
         logger.error(f"Failed to send safety check-in emails: {str(e)}")
         return 0
 
 def send_alert_status_update_email(sos_alert, emergency_contacts, updated_by=None):
-    """Send email when SOS alert status is updated (resolved, false alarm, etc.)"""
+    """Queue email when SOS alert status is updated (resolved, false alarm, etc.)"""
     try:
         user = sos_alert.user
         user_name = user.get_full_name() or user.username
@@ -237,40 +148,84 @@ def send_alert_status_update_email(sos_alert, emergency_contacts, updated_by=Non
             'support_email': settings.EMAIL_HOST_USER,
         }
         
-        # Send to each emergency contact
-        sent_count = 0
-        for contact in emergency_contacts:
-            try:
-                # Create personalized context
-                contact_context = context.copy()
-                contact_context['contact'] = contact
-                contact_context['contact_name'] = contact.name
-                
-                # Render email templates
-                html_content = render_to_string('emails/alert_status_update.html', contact_context)
-                text_content = render_to_string('emails/alert_status_update.txt', contact_context)
-                
-                subject = f"✅ Update: Emergency Alert from {user_name} - {sos_alert.get_status_display()}"
-                
-                # Create email
-                msg = EmailMultiAlternatives(
-                    subject=subject,
-                    body=text_content,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    to=[contact.email]
-                )
-                msg.attach_alternative(html_content, "text/html")
-                
-                # Send email
-                msg.send()
-                sent_count += 1
-                logger.info(f"Alert status update email sent to {contact.email} for alert {sos_alert.alert_id}")
-                
-            except Exception as e:
-                logger.error(f"Failed to send status update email to {contact.email}: {str(e)}")
+        # Render once; only the greeting differs per contact
+        subject = f"✅ Update: Emergency Alert from {user_name} - {sos_alert.get_status_display()}"
+        rendered = render_notification('alert_status_update', context, subject)
+        messages = [rendered.message_for(contact.email, contact_name=contact.name) for contact in emergency_contacts]
         
-        return sent_count
+        return _queue_batch(messages, 'ALERT_STATUS', QueuedNotification.PRIORITY_SAFETY)
         
     except Exception as e:
         logger.error(f"Failed to send alert status update emails: {str(e)}")
+        return 0
+
+def send_geofence_event_email(geofence_event, emergency_contacts):
+    """Queue email to emergency contacts when a traveller enters or leaves one of their geofences"""
+    try:
+        geofence = geofence_event.geofence
+        user = geofence.user
+        user_name = user.get_full_name() or user.username
+        is_enter = geofence_event.event_type == 'ENTER'
+        
+        share_url = ''
+        if geofence_event.share_id:
+            site_url = getattr(settings, 'SITE_URL', 'http://127.0.0.1:8000')
+            share_url = f"{site_url}{reverse('view_shared_location', args=[geofence_event.share.share_id])}"
+        
+        # Prepare context
+        context = {
+            'user': user,
+            'user_name': user_name,
+            'geofence': geofence,
+            'event': geofence_event,
+            'event_display': geofence_event.get_event_type_display(),
+            'is_enter': is_enter,
+            'share_url': share_url,
+            'google_maps_url': f"https://maps.google.com/?q={geofence_event.latitude},{geofence_event.longitude}",
+            'company_name': 'Nomado Travel',
+            'support_email': settings.EMAIL_HOST_USER,
+        }
+        
+        # Render once; only the greeting differs per contact
+        if is_enter:
+            subject = f"📍 {user_name} arrived at {geofence.name}"
+        else:
+            subject = f"🚶 {user_name} left {geofence.name}"
+        rendered = render_notification('geofence_event', context, subject)
+        messages = [rendered.message_for(contact.email, contact_name=contact.name) for contact in emergency_contacts]
+        
+        # Delivered by the notification worker, which also sets emails_sent
+        return _queue_batch(messages, 'GEOFENCE', QueuedNotification.PRIORITY_SAFETY, source=geofence_event)
+        
+    except Exception as e:
+        logger.error(f"Failed to send geofence event emails: {str(e)}")
+        return 0
+
+def send_checkin_reminder_email(safety_checkin):
+    """Queue a reminder to the traveller that their scheduled check-in is overdue"""
+    try:
+        user = safety_checkin.user
+        if not user.email:
+            return 0
+        user_name = user.get_full_name() or user.username
+        grace_minutes = getattr(settings, 'CHECKIN_ESCALATION_GRACE_MINUTES', 15)
+        site_url = getattr(settings, 'SITE_URL', 'http://127.0.0.1:8000')
+        
+        # Prepare context
+        context = {
+            'user': user,
+            'user_name': user_name,
+            'safety_checkin': safety_checkin,
+            'grace_minutes': grace_minutes,
+            'checkin_url': f"{site_url}{reverse('safety_checkin')}",
+            'company_name': 'Nomado Travel',
+            'support_email': settings.EMAIL_HOST_USER,
+        }
+        
+        subject = f"⏰ {user_name}, your safety check-in is overdue"
+        rendered = render_notification('checkin_reminder', context, subject, personal_fields=())
+        return _queue_batch([rendered.message_for(user.email)], 'CHECKIN_REMINDER', QueuedNotification.PRIORITY_SAFETY)
+        
+    except Exception as e:
+        logger.error(f"Failed to send check-in reminder email: {str(e)}")
         return 0
\ No newline at end of file
@@ -0,0 +1,222 @@
+# location_sos/geocoding.py
+"""
+Offline reverse geocoding for location records.
+
+Browsers often send no address, or a placeholder, with a share, SOS
+alert or check-in. Emails then showed bare coordinates. reverse_geocode()
+turns coordinates into "Kochi, Kerala, India" or "12 km NE of Munnar,
+Kerala, India". It uses the bundled gazetteer
+(GEOCODER_GAZETTEER_PATH: a CSV of name, region, country, latitude,
+longitude, population) held in a PointGrid. Nothing leaves the server, so
+the SOS path never waits on an outside service.
+
+Results are keyed on coordinates rounded to GEOCODER_KEY_DECIMALS places
+(3 places is about 100 m). Each process keeps an LRU of them
+(GEOCODER_CACHE_SIZE entries, GEOCODER_CACHE_SECONDS each). Behind the
+LRU sits GeocodeCacheEntry. New gazetteer results are written to it in
+batches by a background thread. An address corrected there in the admin
+wins over the gazetteer from then on.
+"""
+import atexit
+import csv
+import logging
+import math
+import re
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection
+
+from .models import GeocodeCacheEntry
+from .share_cache import LRUCache
+from .spatial import PointGrid
+
+logger = logging.getLogger(__name__)
+
+Place = namedtuple('Place', 'name region country latitude longitude population')
+
+COMPASS = ('N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW')
+
+# What the pages send when they have no real address
+_PLACEHOLDER_ADDRESSES = {'', 'address not found', 'getting address...', 'unknown'}
+_COORDINATES_RE = re.compile(r'^\s*-?\d+(\.\d+)?\s*,\s*-?\d+(\.\d+)?\s*$')
+
+
+def is_placeholder_address(address):
+    """True for a blank address, a placeholder, or bare "lat, lng" text"""
+    address = (address or '').strip()
+    return address.lower() in _PLACEHOLDER_ADDRESSES or bool(_COORDINATES_RE.match(address))
+
+
+def cache_key(lat, lng, decimals=None):
+    decimals = decimals if decimals is not None else getattr(settings, 'GEOCODER_KEY_DECIMALS', 3)
+    return f'{round(float(lat), decimals):.{decimals}f},{round(float(lng), decimals):.{decimals}f}'
+
+
+def compass_point(from_lat, from_lng, to_lat, to_lng):
+    """Eight-point compass direction of the initial bearing"""
+    phi1, phi2 = math.radians(from_lat), math.radians(to_lat)
+    dlmb = math.radians(to_lng - from_lng)
+    x = math.sin(dlmb) * math.cos(phi2)
+    y = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(dlmb)
+    bearing = (math.degrees(math.atan2(x, y)) + 360) % 360
+    return COMPASS[round(bearing / 45) % 8]
+
+
+# GAZETTEER
+class Gazetteer:
+    def __init__(self, places, cell_degrees):
+        self.places = places
+        self.grid = PointGrid(cell_degrees)
+        for i, place in enumerate(places):
+            self.grid.upsert(i, place.latitude, place.longitude)
+
+    @classmethod
+    def load(cls, path, cell_degrees):
+        places = []
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                try:
+                    places.append(Place(
+                        row['name'].strip(), (row.get('region') or '').strip(), (row.get('country') or '').strip(),
+                        float(row['latitude']), float(row['longitude']), int(row.get('population') or 0),
+                    ))
+                except (KeyError, ValueError):
+                    continue
+        return cls(places, cell_degrees)
+
+    def nearest(self, lat, lng, max_distance_m):
+        """(distance_m, Place) of the closest place, or None if none is within max_distance_m"""
+        found = self.grid.nearest(lat, lng, 1, max_distance_m)
+        if not found:
+            return None
+        distance, i = found[0]
+        return distance, self.places[i]
+
+    def describe(self, lat, lng):
+        """Human-readable location of a point, or '' if it is nowhere near a known place"""
+        lat, lng = float(lat), float(lng)
+        nearest = self.nearest(lat, lng, getattr(settings, 'GEOCODER_MAX_DISTANCE_KM', 100) * 1000)
+        if nearest is None:
+            return ''
+        distance, place = nearest
+        parts = []
+        for part in (place.name, place.region, place.country):
+            if part and part not in parts:
+                parts.append(part)
+        label = ', '.join(parts)
+        if distance <= getattr(settings, 'GEOCODER_LOCALITY_RADIUS_KM', 5) * 1000:
+            return label
+        direction = compass_point(place.latitude, place.longitude, lat, lng)
+        return f'{distance / 1000:.0f} km {direction} of {label}'
+
+    def __len__(self):
+        return len(self.places)
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def gazetteer():
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                started = time.perf_counter()
+                _gazetteer = Gazetteer.load(
+                    settings.GEOCODER_GAZETTEER_PATH, getattr(settings, 'GEOCODER_GRID_DEGREES', 0.5))
+                logger.info(f"Loaded {len(_gazetteer)} gazetteer places in {time.perf_counter() - started:.2f}s")
+    return _gazetteer
+
+
+# CACHE
+class GeocodeCache:
+    def __init__(self):
+        self.lru = LRUCache(
+            getattr(settings, 'GEOCODER_CACHE_SIZE', 50000),
+            getattr(settings, 'GEOCODER_CACHE_SECONDS', 3600),
+        )
+        self._pending = {}  # key -> GeocodeCacheEntry waiting to be written
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def lookup(self, lat, lng):
+        key = cache_key(lat, lng)
+        address = self.lru.get(key)
+        if address is not None:
+            return address
+
+        address = GeocodeCacheEntry.objects.filter(key=key).values_list('address', flat=True).first()
+        if address is None:
+            address = gazetteer().describe(lat, lng)
+            if address:
+                rounded_lat, rounded_lng = map(float, key.split(','))
+                with self._lock:
+                    self._pending[key] = GeocodeCacheEntry(
+                        key=key, latitude=rounded_lat, longitude=rounded_lng, address=address)
+                self._ensure_flusher()
+        # Misses (open sea, say) are cached too, as ''
+        self.lru.set(key, address)
+        return address
+
+    def forget(self, key):
+        self.lru.pop(key)
+
+    def flush(self):
+        """Write new results; returns how many were written"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            # An entry written meanwhile (or corrected in the admin) is left alone
+            GeocodeCacheEntry.objects.bulk_create(list(pending.values()), batch_size=500, ignore_conflicts=True)
+        except Exception as e:
+            logger.error(f"Geocode cache flush of {len(pending)} entries failed: {str(e)}")
+            return 0
+        return len(pending)
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._run_flusher, daemon=True, name='geocode-cache')
+                self._flusher.start()
+
+    def _run_flusher(self):
+        interval = getattr(settings, 'GEOCODER_FLUSH_SECONDS', 30)
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+            finally:
+                connection.close()
+
+
+geocode_cache = GeocodeCache()
+atexit.register(geocode_cache.flush)
+
+
+def reverse_geocode(lat, lng):
+    """Address for a coordinate from the caches or the offline gazetteer; '' if unknown"""
+    try:
+        return geocode_cache.lookup(lat, lng)
+    except Exception as e:
+        # Never hold up a location record over an address
+        logger.error(f"Reverse geocoding {lat},{lng} failed: {str(e)}")
+        return ''
+
+
+def fill_address(record):
+    """Give a share, alert or check-in an address if it came without a real one. Returns True if filled."""
+    if not is_placeholder_address(record.address) or record.latitude is None or record.longitude is None:
+        return False
+    address = reverse_geocode(record.latitude, record.longitude)
+    if not address:
+        return False
+    record.address = address
+    return True
@@ -0,0 +1,124 @@
+# location_sos/geofencing.py
+"""
+Geofence evaluation for live location fixes.
+
+Each user's active fences are loaded once into a GridIndex
+(GEOFENCE_GRID_DEGREES cells). The index is kept per process for
+GEOFENCE_INDEX_CACHE_SECONDS and dropped when a fence is saved or deleted.
+For each fix, evaluation reads one grid cell, runs exact containment tests
+on the fences found there, and checks the few fences the user is
+currently inside. So the cost per fix stays flat however many fences the
+user has elsewhere.
+
+A transition (outside -> inside = ENTER, inside -> outside = EXIT) is
+claimed with a compare-and-set on Geofence.is_inside. With several
+processes, each transition is recorded and emailed once. Fixes less
+accurate than GEOFENCE_MAX_ACCURACY_M are skipped, so GPS jumps do not
+flap a fence.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from .email_utils import send_geofence_event_email
+from .models import Geofence, GeofenceEvent
+from .recipients import recipients_for
+from .spatial import GridIndex
+
+logger = logging.getLogger(__name__)
+
+
+class UserFences:
+    """One user's active fences, indexed, with the set they are inside"""
+
+    def __init__(self, fences):
+        self.fences = {fence.pk: fence for fence in fences}
+        self.index = GridIndex(getattr(settings, 'GEOFENCE_GRID_DEGREES', 0.01))
+        for fence in fences:
+            self.index.insert_bbox(fence.pk, fence.bbox)
+        self.inside = {fence.pk for fence in fences if fence.is_inside}
+        self.unknown = {fence.pk for fence in fences if fence.is_inside is None}
+        self.loaded_at = time.monotonic()
+
+
+_user_fences = {}
+_user_fences_lock = threading.Lock()
+
+
+def user_fences(user_id):
+    ttl = getattr(settings, 'GEOFENCE_INDEX_CACHE_SECONDS', 60)
+    cached = _user_fences.get(user_id)
+    if cached is None or time.monotonic() - cached.loaded_at > ttl:
+        cached = UserFences(list(Geofence.objects.filter(user_id=user_id, is_active=True)))
+        with _user_fences_lock:
+            _user_fences[user_id] = cached
+    return cached
+
+
+def forget_user_fences(user_id):
+    with _user_fences_lock:
+        _user_fences.pop(user_id, None)
+
+
+def _transition(fence, inside, share_pk, fix):
+    """Claim the state change; returns a GeofenceEvent to notify about, or None"""
+    previous = fence.is_inside
+    if not Geofence.objects.filter(pk=fence.pk, is_inside=previous).update(
+            is_inside=inside, state_changed_at=fix['recorded_at']):
+        # Another process got there first; reload next time
+        forget_user_fences(fence.user_id)
+        return None
+    fence.is_inside = inside
+    if previous is None:
+        # First fix after the fence was drawn only establishes which side we are on
+        return None
+    event_type = 'ENTER' if inside else 'EXIT'
+    return GeofenceEvent(
+        geofence=fence, share_id=share_pk, event_type=event_type,
+        latitude=fix['latitude'], longitude=fix['longitude'], occurred_at=fix['recorded_at'],
+    )
+
+
+def evaluate_fixes(user_id, share_pk, fixes):
+    """Check a batch of fixes (in any order) against the user's fences. Returns the events recorded."""
+    fences = user_fences(user_id)
+    if not fences.fences:
+        return []
+
+    max_accuracy = getattr(settings, 'GEOFENCE_MAX_ACCURACY_M', 100)
+    events = []
+    for fix in sorted(fixes, key=lambda fix: fix['recorded_at']):
+        if fix.get('accuracy') is not None and fix['accuracy'] > max_accuracy:
+            continue
+        lat, lng = fix['latitude'], fix['longitude']
+        inside_now = {pk for pk in fences.index.candidates(lat, lng) if fences.fences[pk].contains(lat, lng)}
+
+        # Fences to look at: where we are now, where we were, and any not evaluated yet
+        for pk in inside_now | fences.inside | fences.unknown:
+            fence = fences.fences[pk]
+            inside = pk in inside_now
+            if fence.is_inside is inside:
+                continue
+            event = _transition(fence, inside, share_pk, fix)
+            (fences.inside.add if inside else fences.inside.discard)(pk)
+            fences.unknown.discard(pk)
+            if event is not None:
+                events.append(event)
+
+    if events:
+        GeofenceEvent.objects.bulk_create(events)
+        notify_events(user_id, events)
+    return events
+
+
+def notify_events(user_id, events):
+    """Email everyone allowed to see the user's location about events their fence asked for"""
+    wanted = [event for event in events if event.geofence.notifies(event.event_type)]
+    if not wanted:
+        return 0
+    contacts = recipients_for(user_id, 'LOCATION')
+    if not contacts:
+        return 0
+    return sum(send_geofence_event_email(event, contacts) for event in wanted)
@@ -0,0 +1,273 @@
+# location_sos/location_ingest.py
+"""
+Live location ingestion.
+
+Devices post batches of GPS fixes for an active LocationShare. Accepted
+fixes are not written one row at a time. They go into a process-wide
+buffer, which a background thread flushes every
+LOCATION_BUFFER_FLUSH_SECONDS, or sooner once it holds
+LOCATION_BUFFER_MAX_POINTS. A flush is:
+
+- one query to skip shares deleted in the meantime,
+- one bulk INSERT of LocationPoint rows (duplicates from a resent batch
+  are ignored via the (share, recorded_at) constraint), and
+- one bulk UPDATE moving each touched share to its newest fix, unless
+  the share already holds a newer one (a late batch, or another process
+  flushing first).
+
+So a share sending a fix every few seconds costs a fraction of one insert
+and one update per flush interval, however many fixes it sent. The price
+is that up to one flush interval of fixes is lost if the process dies.
+
+Share lookups for authorisation are cached briefly (LOCATION_SHARE_CACHE_SECONDS)
+so an ingest request normally does no database reads either.
+"""
+import atexit
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .geofencing import evaluate_fixes
+from .models import LocationPoint, LocationShare
+from .responders import record_position
+
+logger = logging.getLogger(__name__)
+
+
+class FixRejected(ValueError):
+    pass
+
+
+# PARSING
+def _coordinate(value, limit, name):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise FixRejected(f'{name} is not a number')
+    except OverflowError:
+        raise FixRejected(f'{name} out of range')
+    if not math.isfinite(value) or abs(value) > limit:
+        raise FixRejected(f'{name} out of range')
+    return value
+
+
+def _optional_float(value):
+    if value is None or value == '':
+        return None
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def _timestamp(value, now):
+    """Epoch milliseconds (as sent by navigator.geolocation) or ISO 8601"""
+    if value is None:
+        return now
+    if isinstance(value, (int, float)):
+        try:
+            recorded_at = datetime.fromtimestamp(value / 1000, tz=dt_timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            raise FixRejected('timestamp out of range')
+    else:
+        recorded_at = parse_datetime(str(value))
+        if recorded_at is None:
+            raise FixRejected('timestamp is not a date')
+        if timezone.is_naive(recorded_at):
+            recorded_at = timezone.make_aware(recorded_at, dt_timezone.utc)
+    if recorded_at > now + timedelta(seconds=60):
+        raise FixRejected('timestamp is in the future')
+    return recorded_at
+
+
+def parse_fix(raw, now=None):
+    """Validate one client fix into a dict of LocationPoint fields"""
+    now = now or timezone.now()
+    if not isinstance(raw, dict):
+        raise FixRejected('fix must be an object')
+    try:
+        return {
+            'latitude': _coordinate(raw.get('latitude', raw.get('lat')), 90, 'latitude'),
+            'longitude': _coordinate(raw.get('longitude', raw.get('lng')), 180, 'longitude'),
+            'accuracy': _optional_float(raw.get('accuracy')),
+            'speed': _optional_float(raw.get('speed')),
+            'heading': _optional_float(raw.get('heading')),
+            'recorded_at': _timestamp(raw.get('timestamp'), now),
+        }
+    except (TypeError, ValueError, OverflowError) as e:
+        raise FixRejected(str(e))
+
+
+# SHARE LOOKUP
+_share_cache = {}
+_share_cache_lock = threading.Lock()
+
+
+def active_share(share_id, user_id):
+    """(pk, created_at, expires_at) of the user's share if it is live, else None"""
+    ttl = getattr(settings, 'LOCATION_SHARE_CACHE_SECONDS', 15)
+    key = str(share_id)
+    cached = _share_cache.get(key)
+    if cached is None or time.monotonic() - cached[0] > ttl:
+        row = LocationShare.objects.filter(share_id=share_id).values_list(
+            'pk', 'user_id', 'status', 'created_at', 'expires_at').first()
+        cached = (time.monotonic(), row)
+        with _share_cache_lock:
+            _share_cache[key] = cached
+
+    row = cached[1]
+    if row is None:
+        return None
+    pk, owner_id, status, created_at, expires_at = row
+    if owner_id != user_id or status != 'ACTIVE' or expires_at <= timezone.now():
+        return None
+    return pk, created_at, expires_at
+
+
+def forget_share(share_id):
+    """Drop a share from the lookup cache (after stopping it, say)"""
+    with _share_cache_lock:
+        _share_cache.pop(str(share_id), None)
+
+
+# BUFFER
+def _move_shares(latest, batch_size=500):
+    """Move each share to its newest buffered fix, leaving shares that already hold a newer one"""
+    now = timezone.now()
+    items = list(latest.items())
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        newer = {
+            share_pk: Q(pk=share_pk) & (Q(last_fix_at__isnull=True) | Q(last_fix_at__lt=point.recorded_at))
+            for share_pk, point in batch
+        }
+        values = {
+            'latitude': lambda point: round(point.latitude, 7),
+            'longitude': lambda point: round(point.longitude, 7),
+            'accuracy': lambda point: point.accuracy,
+            'last_fix_at': lambda point: point.recorded_at,
+            'last_updated': lambda point: now,
+        }
+        LocationShare.objects.filter(pk__in=[share_pk for share_pk, _ in batch]).update(**{
+            name: Case(
+                *[When(newer[share_pk], then=Value(value(point), output_field=LocationShare._meta.get_field(name)))
+                  for share_pk, point in batch],
+                default=F(name),
+            ) for name, value in values.items()
+        })
+
+
+class LocationBuffer:
+    def __init__(self):
+        self._points = []
+        self._latest = {}  # share pk -> newest point
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+
+    def add(self, share_pk, fixes):
+        max_points = getattr(settings, 'LOCATION_BUFFER_MAX_POINTS', 5000)
+        points = [LocationPoint(share_id=share_pk, **fix) for fix in fixes]
+        with self._lock:
+            self._points.extend(points)
+            for point in points:
+                latest = self._latest.get(share_pk)
+                if latest is None or point.recorded_at > latest.recorded_at:
+                    self._latest[share_pk] = point
+            full = len(self._points) >= max_points
+        self._ensure_flusher()
+        if full:
+            self.flush()
+
+    def latest(self, share_pk):
+        """Newest fix for a share that this process has not flushed yet"""
+        return self._latest.get(share_pk)
+
+    def flush(self):
+        """Write everything buffered; returns the number of points written"""
+        with self._flush_lock:
+            with self._lock:
+                points, latest = self._points, self._latest
+                self._points, self._latest = [], {}
+            if not points:
+                return 0
+
+            try:
+                # Shares deleted since their fixes arrived would fail the foreign key
+                existing = set(LocationShare.objects.filter(pk__in=list(latest)).values_list('pk', flat=True))
+                if len(existing) < len(latest):
+                    points = [point for point in points if point.share_id in existing]
+                    latest = {share_pk: point for share_pk, point in latest.items() if share_pk in existing}
+                LocationPoint.objects.bulk_create(points, batch_size=1000, ignore_conflicts=True)
+                _move_shares(latest)
+            except Exception as e:
+                logger.error(f"Location buffer flush of {len(points)} points failed: {str(e)}")
+                max_points = getattr(settings, 'LOCATION_BUFFER_MAX_POINTS', 5000)
+                with self._lock:
+                    # Keep them for the next flush, newest positions included, but
+                    # drop the oldest rather than grow without bound while the database is down
+                    self._points = (points + self._points)[-2 * max_points:]
+                    for share_pk, point in latest.items():
+                        current = self._latest.get(share_pk)
+                        if current is None or point.recorded_at > current.recorded_at:
+                            self._latest[share_pk] = point
+                return 0
+        return len(points)
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._run_flusher, daemon=True, name='location-buffer')
+                self._flusher.start()
+
+    def _run_flusher(self):
+        interval = getattr(settings, 'LOCATION_BUFFER_FLUSH_SECONDS', 2.0)
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+            finally:
+                connection.close()
+
+
+location_buffer = LocationBuffer()
+atexit.register(location_buffer.flush)
+
+
+def ingest_fixes(share_pk, raw_fixes, not_before=None, user_id=None):
+    """Validate and buffer a batch of fixes, checking them against user_id's geofences and indexing the newest as their position. Returns (accepted, rejected, newest fix or None)."""
+    max_batch = getattr(settings, 'LOCATION_INGEST_MAX_BATCH', 500)
+    now = timezone.now()
+    fixes, rejected = [], 0
+    for raw in raw_fixes[:max_batch]:
+        try:
+            fix = parse_fix(raw, now)
+        except FixRejected:
+            rejected += 1
+            continue
+        if not_before and fix['recorded_at'] < not_before:
+            rejected += 1
+            continue
+        fixes.append(fix)
+    rejected += max(0, len(raw_fixes) - max_batch)
+
+    if not fixes:
+        return 0, rejected, None
+    location_buffer.add(share_pk, fixes)
+    newest = max(fixes, key=lambda fix: fix['recorded_at'])
+    if user_id is not None:
+        record_position(user_id, newest['latitude'], newest['longitude'], newest['recorded_at'])
+        try:
+            evaluate_fixes(user_id, share_pk, fixes)
+        except Exception as e:
+            # Never lose the fixes over a geofence problem
+            logger.error(f"Geofence evaluation for share {share_pk} failed: {str(e)}")
+    return len(fixes), rejected, newest
@@ -0,0 +1,111 @@
+# location_sos/location_tracks.py
+"""
+Track storage for live location shares.
+
+Fresh fixes land as LocationPoint rows (location_ingest). Once they are
+older than LOCATION_TRACK_COMPACT_AFTER_SECONDS, compact_tracks() moves
+them into LocationTrackChunk blobs (track_codec) of up to
+LOCATION_TRACK_CHUNK_POINTS fixes each and deletes the rows. Run it from
+`python manage.py compact_location_tracks`. A multi-hour track then takes
+a handful of chunk rows of a few kilobytes, not thousands of point rows.
+
+load_track() merges the chunks with any rows not yet compacted.
+served_track() returns the simplified version that viewers download.
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import LocationPoint, LocationTrackChunk
+from .track_codec import decode_track, encode_track, simplify_track
+
+logger = logging.getLogger(__name__)
+
+
+def to_ms(value):
+    return int(value.timestamp() * 1000)
+
+
+def from_ms(value):
+    return datetime.fromtimestamp(value / 1000, tz=dt_timezone.utc)
+
+
+# COMPACTION
+def compact_share(share_pk, cutoff, chunk_points=None):
+    """Move one share's fixes recorded before cutoff into chunks. Returns the number of points moved."""
+    chunk_points = chunk_points or getattr(settings, 'LOCATION_TRACK_CHUNK_POINTS', 2000)
+    with transaction.atomic():
+        rows = list(LocationPoint.objects.filter(share_id=share_pk, recorded_at__lt=cutoff).order_by(
+            'recorded_at').values_list('pk', 'recorded_at', 'latitude', 'longitude', 'accuracy'))
+        if not rows:
+            return 0
+
+        chunks = []
+        for i in range(0, len(rows), chunk_points):
+            run = rows[i:i + chunk_points]
+            chunks.append(LocationTrackChunk(
+                share_id=share_pk,
+                start_at=run[0][1],
+                end_at=run[-1][1],
+                point_count=len(run),
+                data=encode_track([(to_ms(recorded_at), lat, lng, accuracy) for _, recorded_at, lat, lng, accuracy in run]),
+            ))
+        LocationTrackChunk.objects.bulk_create(chunks)
+        # Bounded by the largest pk read, so a late fix flushed meanwhile is left for the next run
+        LocationPoint.objects.filter(
+            share_id=share_pk, recorded_at__lt=cutoff, pk__lte=max(row[0] for row in rows),
+        ).delete()
+    return len(rows)
+
+
+def compact_tracks(older_than_seconds=None, batch_size=100):
+    """Compact up to batch_size shares with old enough fixes. Returns (shares, points)."""
+    older_than_seconds = older_than_seconds if older_than_seconds is not None else getattr(
+        settings, 'LOCATION_TRACK_COMPACT_AFTER_SECONDS', 600)
+    cutoff = timezone.now() - timedelta(seconds=older_than_seconds)
+    share_pks = list(LocationPoint.objects.filter(recorded_at__lt=cutoff).order_by().values_list(
+        'share_id', flat=True).distinct()[:batch_size])
+
+    moved = 0
+    for share_pk in share_pks:
+        try:
+            moved += compact_share(share_pk, cutoff)
+        except Exception as e:
+            logger.error(f"Compacting track of share {share_pk} failed: {str(e)}")
+    return len(share_pks), moved
+
+
+# READING
+def load_track(share_pk, since=None):
+    """Full track as (timestamp_ms, latitude, longitude, accuracy) tuples in time order"""
+    chunks = LocationTrackChunk.objects.filter(share_id=share_pk)
+    rows = LocationPoint.objects.filter(share_id=share_pk)
+    if since is not None:
+        chunks = chunks.filter(end_at__gte=since)
+        rows = rows.filter(recorded_at__gte=since)
+
+    points = {}
+    for data in chunks.values_list('data', flat=True):
+        for point in decode_track(data):
+            points[point[0]] = point
+    # Rows win over chunks: a fix resent after compaction is the same fix
+    for recorded_at, lat, lng, accuracy in rows.values_list('recorded_at', 'latitude', 'longitude', 'accuracy'):
+        timestamp_ms = to_ms(recorded_at)
+        points[timestamp_ms] = (timestamp_ms, lat, lng, accuracy)
+
+    track = sorted(points.values())
+    if since is not None:
+        since_ms = to_ms(since)
+        track = [point for point in track if point[0] >= since_ms]
+    return track
+
+
+def served_track(share_pk, since=None, tolerance_m=None, bucket_seconds=0, max_points=None):
+    """Track simplified for display; returns (points, number of raw points)"""
+    tolerance_m = tolerance_m if tolerance_m is not None else getattr(settings, 'LOCATION_TRACK_SIMPLIFY_METERS', 10)
+    max_points = max_points or getattr(settings, 'LOCATION_TRACK_MAX_SERVED_POINTS', 1000)
+    track = load_track(share_pk, since)
+    return simplify_track(track, tolerance_m, bucket_seconds, max_points), len(track)
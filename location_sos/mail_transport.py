@@ -0,0 +1,90 @@
+# location_sos/mail_transport.py
+"""
+Batch mail transport for notification fan-out.
+
+deliver_messages() opens one SMTP connection for a whole batch and sends
+every message over it, instead of a TLS handshake per recipient. If the
+server drops the session mid-batch the connection is reopened and the
+message retried (up to MAIL_MAX_RECONNECTS times per batch); a rejected
+recipient only fails that one message. The result is one entry per
+message, in order: {'recipient', 'success', 'error'}.
+"""
+import logging
+import smtplib
+import socket
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+
+logger = logging.getLogger(__name__)
+
+# Failures that mean the session is gone, as opposed to this message being refused
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, socket.timeout, ConnectionError)
+
+
+def build_message(subject, text_content, html_content, recipient):
+    """One plain text + HTML email to a single recipient"""
+    msg = EmailMultiAlternatives(
+        subject=subject,
+        body=text_content,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[recipient],
+    )
+    if html_content:
+        msg.attach_alternative(html_content, "text/html")
+    return msg
+
+
+def _open(connection):
+    connection.close()
+    connection.open()
+
+
+def deliver_messages(messages, connection=None, max_reconnects=None):
+    """Send messages over one shared connection; returns per-recipient results"""
+    if max_reconnects is None:
+        max_reconnects = getattr(settings, 'MAIL_MAX_RECONNECTS', 2)
+    if not messages:
+        return []
+
+    connection = connection or get_connection(fail_silently=False)
+    results = []
+    reconnects = 0
+    try:
+        try:
+            connection.open()
+        except Exception as e:
+            logger.error(f"Could not open mail connection: {str(e)}")
+            return [_result(msg, False, str(e)) for msg in messages]
+
+        for msg in messages:
+            while True:
+                try:
+                    sent = connection.send_messages([msg])
+                    results.append(_result(msg, bool(sent), '' if sent else 'Not accepted by mail server'))
+                    break
+                except CONNECTION_ERRORS as e:
+                    if reconnects >= max_reconnects:
+                        results.append(_result(msg, False, str(e)))
+                        break
+                    reconnects += 1
+                    logger.warning(f"Mail connection lost ({str(e)}); reconnecting ({reconnects}/{max_reconnects})")
+                    try:
+                        _open(connection)
+                    except Exception as reopen_error:
+                        results.append(_result(msg, False, str(reopen_error)))
+                        break
+                except Exception as e:
+                    results.append(_result(msg, False, str(e)))
+                    break
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    return results
+
+
+def _result(msg, success, error=''):
+    return {'recipient': ', '.join(msg.to), 'success': success, 'error': error}
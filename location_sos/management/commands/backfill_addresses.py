@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from location_sos.geocoding import fill_address, geocode_cache
+from location_sos.models import LocationShare, SafetyCheckIn, SOSAlert
+
+
+class Command(BaseCommand):
+    help = 'Fill blank or placeholder addresses on shares, SOS alerts and check-ins from the offline gazetteer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        total = 0
+        # Cheap pre-filter; fill_address makes the exact placeholder check
+        candidates = Q(address='') | Q(address__iregex=r'^\s*-?[0-9.]+\s*,\s*-?[0-9.]+\s*$') | Q(
+            address__in=['Address not found', 'Getting address...', 'Unknown'])
+
+        for model in (LocationShare, SOSAlert, SafetyCheckIn):
+            filled = 0
+            last_pk = 0
+            while True:
+                batch = list(model.objects.filter(candidates, pk__gt=last_pk).order_by('pk').only(
+                    'pk', 'latitude', 'longitude', 'address')[:options['batch_size']])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                changed = [record for record in batch if fill_address(record)]
+                # bulk_update skips save() and its signals, and leaves auto_now fields alone
+                model.objects.bulk_update(changed, ['address'])
+                filled += len(changed)
+            self.stdout.write(f'{model.__name__}: filled {filled} addresses')
+            total += filled
+
+        geocode_cache.flush()
+        self.stdout.write(self.style.SUCCESS(f"Filled {total} addresses in {time.perf_counter() - started:.1f}s"))
@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from location_sos.location_tracks import compact_tracks
+
+
+class Command(BaseCommand):
+    help = 'Move older live location fixes into compact delta-encoded track chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Shares per pass')
+        parser.add_argument('--older-than', type=int,
+                            default=getattr(settings, 'LOCATION_TRACK_COMPACT_AFTER_SECONDS', 600),
+                            help='Only compact fixes older than this many seconds')
+        parser.add_argument('--interval', type=float, default=60.0, help='Seconds to sleep when nothing is due')
+        parser.add_argument('--once', action='store_true', help='Compact what is due and exit')
+
+    def handle(self, *args, **options):
+        total_shares = total_points = 0
+        started = time.perf_counter()
+
+        while True:
+            shares, points = compact_tracks(older_than_seconds=options['older_than'], batch_size=options['batch_size'])
+            if shares:
+                total_shares += shares
+                total_points += points
+                self.stdout.write(f'Compacted {points} points from {shares} shares')
+                if shares == options['batch_size']:
+                    continue
+
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Compacted {total_points} points from {total_shares} shares in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from location_sos.share_expiry import expire_shares
+
+
+class Command(BaseCommand):
+    help = 'Mark location shares past their expiry time as expired'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--interval', type=float, default=60.0, help='Seconds between sweeps')
+        parser.add_argument('--once', action='store_true', help='Sweep once and exit')
+
+    def handle(self, *args, **options):
+        total = 0
+        started = time.perf_counter()
+
+        while True:
+            expired = expire_shares(batch_size=options['batch_size'])
+            if expired:
+                total += expired
+                self.stdout.write(f'Expired {expired} shares')
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Expired {total} shares in {time.perf_counter() - started:.1f}s"))
@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from location_sos.checkin_monitor import CheckinScheduler
+
+
+class Command(BaseCommand):
+    help = 'Remind travellers of missed scheduled safety check-ins and escalate to their emergency contacts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-minutes', type=int,
+                            default=getattr(settings, 'CHECKIN_ESCALATION_GRACE_MINUTES', 15),
+                            help='Minutes between the reminder and escalation')
+        parser.add_argument('--interval', type=float,
+                            default=getattr(settings, 'CHECKIN_MONITOR_REFRESH_SECONDS', 5),
+                            help='Longest sleep between looking for schedule changes')
+        parser.add_argument('--once', action='store_true', help='Handle what is due and exit')
+
+    def handle(self, *args, **options):
+        scheduler = CheckinScheduler(grace_minutes=options['grace_minutes'])
+        self.stdout.write(f'Watching {scheduler.load()} open check-in schedules')
+        totals = {}
+
+        while True:
+            counts = scheduler.run_due()
+            for action, count in counts.items():
+                totals[action] = totals.get(action, 0) + count
+            if counts:
+                self.stdout.write(', '.join(f'{action}: {count}' for action, count in sorted(counts.items())))
+
+            if options['once']:
+                break
+
+            # Sleep until the next schedule is due, but wake up to pick up changes
+            next_fire_at = scheduler.next_fire_at()
+            sleep_for = options['interval']
+            if next_fire_at is not None:
+                sleep_for = max(0.0, min(sleep_for, (next_fire_at - timezone.now()).total_seconds()))
+            time.sleep(sleep_for)
+            scheduler.refresh()
+            connection.close_if_unusable_or_obsolete()
+
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f'{action}: {count}' for action, count in sorted(totals.items())) or 'Nothing due'
+        ))
@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from location_sos.notification_queue import process_notifications, purge_sent, queue_metrics, release_stale_claims
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued notification emails by priority, with retries, rate limits and dead-lettering'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'NOTIFICATION_BATCH_SIZE', 100))
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'NOTIFICATION_MAX_WORKERS', 4))
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to sleep when nothing is due')
+        parser.add_argument('--once', action='store_true', help='Process what is due and exit')
+
+    def handle(self, *args, **options):
+        handled = 0
+        started = time.perf_counter()
+        released = release_stale_claims()
+        if released:
+            self.stdout.write(f'Released {released} stale claims')
+
+        while True:
+            counts = process_notifications(batch_size=options['batch_size'], max_workers=options['workers'])
+            if counts:
+                handled += sum(counts.values())
+                self.stdout.write(', '.join(f'{status}: {count}' for status, count in sorted(counts.items())))
+                continue
+
+            if options['once']:
+                break
+            release_stale_claims()
+            purge_sent()
+            time.sleep(options['interval'])
+
+        metrics = queue_metrics()
+        self.stdout.write(self.style.SUCCESS(
+            f"Handled {handled} notifications in {time.perf_counter() - started:.1f}s; "
+            f"{metrics['pending']} pending, {metrics['dead_letters']} dead letters"
+        ))
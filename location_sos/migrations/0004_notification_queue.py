@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:09
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('location_sos', '0003_sos_deliveries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeadLetterNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=30)),
+                ('priority', models.IntegerField(choices=[(0, 'SOS'), (10, 'Safety'), (20, 'Receipt'), (30, 'Marketing')])),
+                ('provider', models.CharField(max_length=30)),
+                ('recipient', models.EmailField(max_length=254)),
+                ('subject', models.CharField(max_length=255)),
+                ('text_body', models.TextField()),
+                ('html_body', models.TextField(blank=True)),
+                ('source_model', models.CharField(blank=True, max_length=100)),
+                ('source_id', models.CharField(blank=True, max_length=64)),
+                ('attempts', models.IntegerField()),
+                ('last_error', models.TextField(blank=True)),
+                ('queued_at', models.DateTimeField()),
+                ('failed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-failed_at'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='sosdelivery',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('SENT', 'Sent'), ('QUEUED', 'Queued for Retry'), ('FAILED', 'Failed')], default='PENDING', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='QueuedNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=30)),
+                ('priority', models.IntegerField(choices=[(0, 'SOS'), (10, 'Safety'), (20, 'Receipt'), (30, 'Marketing')], default=10)),
+                ('provider', models.CharField(default='smtp', max_length=30)),
+                ('recipient', models.EmailField(max_length=254)),
+                ('subject', models.CharField(max_length=255)),
+                ('text_body', models.TextField()),
+                ('html_body', models.TextField(blank=True)),
+                ('source_model', models.CharField(blank=True, max_length=100)),
+                ('source_id', models.CharField(blank=True, max_length=64)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('PROCESSING', 'Processing'), ('SENT', 'Sent')], default='PENDING', max_length=12)),
+                ('attempts', models.IntegerField(default=0)),
+                ('max_attempts', models.IntegerField(default=8)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['priority', 'available_at'],
+                'indexes': [models.Index(fields=['status', 'priority', 'available_at'], name='location_so_status_bc419a_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:11
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('location_sos', '0004_notification_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='locationshare',
+            name='last_fix_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='LocationPoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('accuracy', models.FloatField(blank=True, null=True)),
+                ('speed', models.FloatField(blank=True, null=True)),
+                ('heading', models.FloatField(blank=True, null=True)),
+                ('recorded_at', models.DateTimeField()),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('share', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='points', to='location_sos.locationshare')),
+            ],
+            options={
+                'ordering': ['share', 'recorded_at'],
+                'constraints': [models.UniqueConstraint(fields=('share', 'recorded_at'), name='unique_location_point_per_instant')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('location_sos', '0005_location_points'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationTrackChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_at', models.DateTimeField()),
+                ('end_at', models.DateTimeField()),
+                ('point_count', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('share', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='track_chunks', to='location_sos.locationshare')),
+            ],
+            options={
+                'ordering': ['share', 'start_at'],
+                'indexes': [models.Index(fields=['share', 'start_at'], name='location_so_share_i_a364c9_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel_booking', '0002_hotel_owner'),
+        ('location_sos', '0007_share_expiry_and_views'),
+        ('transportation', '0002_route_owner'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Geofence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('shape', models.CharField(choices=[('CIRCLE', 'Circle'), ('POLYGON', 'Polygon')], default='CIRCLE', max_length=10)),
+                ('notify_on', models.CharField(choices=[('ENTER', 'On arrival'), ('EXIT', 'On leaving'), ('BOTH', 'On arrival and leaving')], default='BOTH', max_length=5)),
+                ('center_latitude', models.FloatField(blank=True, null=True)),
+                ('center_longitude', models.FloatField(blank=True, null=True)),
+                ('radius_m', models.FloatField(blank=True, null=True)),
+                ('polygon', models.JSONField(blank=True, null=True)),
+                ('min_latitude', models.FloatField(default=0, editable=False)),
+                ('min_longitude', models.FloatField(default=0, editable=False)),
+                ('max_latitude', models.FloatField(default=0, editable=False)),
+                ('max_longitude', models.FloatField(default=0, editable=False)),
+                ('is_inside', models.BooleanField(blank=True, null=True)),
+                ('state_changed_at', models.DateTimeField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('hotel', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='geofences', to='hotel_booking.hotel')),
+                ('route', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='geofences', to='transportation.route')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='geofences', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='GeofenceEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('ENTER', 'Entered'), ('EXIT', 'Left')], max_length=5)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('occurred_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('emails_sent', models.BooleanField(default=False)),
+                ('email_sent_at', models.DateTimeField(blank=True, null=True)),
+                ('geofence', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='location_sos.geofence')),
+                ('share', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='geofence_events', to='location_sos.locationshare')),
+            ],
+            options={
+                'ordering': ['-occurred_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('location_sos', '0008_geofences'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='safetycheckin',
+            name='escalated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='safetycheckin',
+            name='escalation_alert',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='missed_checkins', to='location_sos.sosalert'),
+        ),
+        migrations.AddField(
+            model_name='safetycheckin',
+            name='reminder_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='safetycheckin',
+            name='schedule_changed_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='safetycheckin',
+            name='schedule_status',
+            field=models.CharField(blank=True, choices=[('WAITING', 'Waiting for next check-in'), ('REMINDED', 'Reminder sent'), ('MET', 'Checked in'), ('ESCALATED', 'Escalated to contacts'), ('CANCELLED', 'Cancelled')], max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='safetycheckin',
+            index=models.Index(fields=['schedule_status', 'next_checkin_due'], name='location_so_schedul_feb28c_idx'),
+        ),
+    ]
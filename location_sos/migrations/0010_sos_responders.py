@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('location_sos', '0009_checkin_schedule'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sosdelivery',
+            name='distance_m',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sosdelivery',
+            name='responder',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sos_responses', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='locationshare',
+            index=models.Index(fields=['last_updated'], name='location_so_last_up_f498ba_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='safetycheckin',
+            index=models.Index(fields=['created_at'], name='location_so_created_33acd3_idx'),
+        ),
+    ]
@@ -1,7 +1,11 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.utils import timezone
 import uuid
 
+from .spatial import circle_bbox, haversine_m, point_in_polygon, polygon_bbox
+
 User = get_user_model()
 
 class EmergencyContact(models.Model):
@@ -69,12 +73,67 @@ class LocationShare(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
     last_updated = models.DateTimeField(auto_now=True)
+    last_fix_at = models.DateTimeField(null=True, blank=True)  # Device time of the latest ingested fix
+    
+    # Viewer analytics, flushed in batches by location_sos.view_counts
+    view_count = models.PositiveIntegerField(default=0)
+    last_viewed_at = models.DateTimeField(null=True, blank=True)
     
     def __str__(self):
         return f"Location share by {self.user.username} - {self.status}"
     
+    @property
+    def is_live(self):
+        return self.status == 'ACTIVE' and self.expires_at > timezone.now()
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Drives the expiry sweep (location_sos.share_expiry)
+            models.Index(fields=['status', 'expires_at']),
+            # Change feed for the responder index (location_sos.responders)
+            models.Index(fields=['last_updated']),
+        ]
+
+class LocationPoint(models.Model):
+    """One GPS fix on a live share's track (written in bulk by location_sos.location_ingest)"""
+    share = models.ForeignKey(LocationShare, on_delete=models.CASCADE, related_name='points')
+    # Floats, not Decimals: these rows are high-volume and 1e-7 degrees is below GPS precision anyway
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    accuracy = models.FloatField(null=True, blank=True)  # Meters
+    speed = models.FloatField(null=True, blank=True)  # Meters per second
+    heading = models.FloatField(null=True, blank=True)  # Degrees from north
+    recorded_at = models.DateTimeField()  # Device time of the fix
+    received_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.latitude},{self.longitude} at {self.recorded_at}"
+    
+    class Meta:
+        ordering = ['share', 'recorded_at']
+        constraints = [
+            # Also the track index; a client resending a batch does not duplicate fixes
+            models.UniqueConstraint(fields=['share', 'recorded_at'], name='unique_location_point_per_instant'),
+        ]
+
+class LocationTrackChunk(models.Model):
+    """A run of a share's older fixes, delta-encoded by location_sos.track_codec (see location_tracks)"""
+    share = models.ForeignKey(LocationShare, on_delete=models.CASCADE, related_name='track_chunks')
+    start_at = models.DateTimeField()
+    end_at = models.DateTimeField()
+    point_count = models.PositiveIntegerField()
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.point_count} points for share {self.share_id} from {self.start_at}"
+    
+    class Meta:
+        ordering = ['share', 'start_at']
+        indexes = [
+            models.Index(fields=['share', 'start_at']),
+        ]
 
 class SOSAlert(models.Model):
     ALERT_STATUS = [
@@ -115,15 +174,56 @@ class SOSAlert(models.Model):
     emails_sent = models.BooleanField(default=False)
     email_sent_at = models.DateTimeField(null=True, blank=True)
     
+    # Dispatch timing (see location_sos.sos_dispatch)
+    dispatch_started_at = models.DateTimeField(null=True, blank=True)
+    first_notified_at = models.DateTimeField(null=True, blank=True)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     
+    @property
+    def time_to_first_notification(self):
+        """Seconds from the alert being raised to the first contact being notified"""
+        if self.first_notified_at is None:
+            return None
+        return (self.first_notified_at - self.created_at).total_seconds()
+    
     def __str__(self):
         return f"SOS Alert {self.alert_id} by {self.user.username}"
     
     class Meta:
         ordering = ['-created_at']
 
+class SOSDelivery(models.Model):
+    """Delivery of one SOS alert to one recipient"""
+    DELIVERY_STATUS = [
+        ('PENDING', 'Pending'),
+        ('SENT', 'Sent'),
+        ('QUEUED', 'Queued for Retry'),  # Fast path gave up; handed to the notification queue
+        ('FAILED', 'Failed'),
+    ]
+    
+    alert = models.ForeignKey(SOSAlert, on_delete=models.CASCADE, related_name='deliveries')
+    contact = models.ForeignKey(EmergencyContact, on_delete=models.SET_NULL, null=True, blank=True, related_name='sos_deliveries')
+    # Set when the recipient is a nearby trusted contact (location_sos.responders) rather than an emergency contact
+    responder = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='sos_responses')
+    distance_m = models.FloatField(null=True, blank=True)  # How far the responder was from the alert
+    recipient_name = models.CharField(max_length=100)
+    recipient_email = models.EmailField()
+    
+    status = models.CharField(max_length=10, choices=DELIVERY_STATUS, default='PENDING')
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"SOS {self.alert.alert_id} -> {self.recipient_email} ({self.status})"
+    
+    class Meta:
+        ordering = ['created_at']
+        unique_together = ['alert', 'recipient_email']
+
 class SafetyCheckIn(models.Model):
     CHECK_STATUS = [
         ('SAFE', 'Safe'),
@@ -131,6 +231,15 @@ class SafetyCheckIn(models.Model):
         ('EMERGENCY', 'Emergency'),
     ]
     
+    SCHEDULE_STATUS = [
+        ('WAITING', 'Waiting for next check-in'),
+        ('REMINDED', 'Reminder sent'),
+        ('MET', 'Checked in'),
+        ('ESCALATED', 'Escalated to contacts'),
+        ('CANCELLED', 'Cancelled'),
+    ]
+    OPEN_SCHEDULE_STATUSES = ('WAITING', 'REMINDED')
+    
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='safety_checkins')
     
     # Location data
@@ -150,6 +259,13 @@ class SafetyCheckIn(models.Model):
     is_scheduled = models.BooleanField(default=False)
     next_checkin_due = models.DateTimeField(null=True, blank=True)
     
+    # Missed check-in monitoring (location_sos.checkin_monitor)
+    schedule_status = models.CharField(max_length=10, choices=SCHEDULE_STATUS, blank=True)
+    schedule_changed_at = models.DateTimeField(null=True, blank=True, db_index=True)  # Change feed for the monitor
+    reminder_sent_at = models.DateTimeField(null=True, blank=True)
+    escalated_at = models.DateTimeField(null=True, blank=True)
+    escalation_alert = models.ForeignKey(SOSAlert, on_delete=models.SET_NULL, null=True, blank=True, related_name='missed_checkins')
+    
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
@@ -157,6 +273,11 @@ class SafetyCheckIn(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['schedule_status', 'next_checkin_due']),
+            # Change feed for the responder index (location_sos.responders)
+            models.Index(fields=['created_at']),
+        ]
 
 class TrustedContact(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='trusted_contacts')
@@ -178,4 +299,203 @@ class TrustedContact(models.Model):
         unique_together = ['user', 'trusted_user']
     
     def __str__(self):
-        return f"{self.user.username} trusts {self.trusted_user.username}"
\ No newline at end of file
+        return f"{self.user.username} trusts {self.trusted_user.username}"
+
+class QueuedNotification(models.Model):
+    """Rendered email waiting for the notification worker (see location_sos.notification_queue)"""
+    PRIORITY_SOS = 0
+    PRIORITY_SAFETY = 10
+    PRIORITY_RECEIPT = 20
+    PRIORITY_MARKETING = 30
+    PRIORITY_CHOICES = [
+        (PRIORITY_SOS, 'SOS'),
+        (PRIORITY_SAFETY, 'Safety'),
+        (PRIORITY_RECEIPT, 'Receipt'),
+        (PRIORITY_MARKETING, 'Marketing'),
+    ]
+    
+    QUEUE_STATUS = [
+        ('PENDING', 'Pending'),
+        ('PROCESSING', 'Processing'),
+        ('SENT', 'Sent'),
+    ]
+    
+    category = models.CharField(max_length=30)  # SOS_ALERT, LOCATION_SHARE, RECEIPT, ...
+    priority = models.IntegerField(choices=PRIORITY_CHOICES, default=PRIORITY_SAFETY)
+    provider = models.CharField(max_length=30, default='smtp')  # Key into NOTIFICATION_PROVIDERS
+    
+    # Rendered message
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    text_body = models.TextField()
+    html_body = models.TextField(blank=True)
+    
+    # Row to mark as notified once delivered, e.g. 'location_sos.locationshare' / 12
+    source_model = models.CharField(max_length=100, blank=True)
+    source_id = models.CharField(max_length=64, blank=True)
+    
+    status = models.CharField(max_length=12, choices=QUEUE_STATUS, default='PENDING')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=8)
+    available_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.category} to {self.recipient} ({self.status})"
+    
+    class Meta:
+        ordering = ['priority', 'available_at']
+        indexes = [
+            models.Index(fields=['status', 'priority', 'available_at']),
+        ]
+
+class DeadLetterNotification(models.Model):
+    """Notification that ran out of attempts; kept for inspection and requeueing"""
+    category = models.CharField(max_length=30)
+    priority = models.IntegerField(choices=QueuedNotification.PRIORITY_CHOICES)
+    provider = models.CharField(max_length=30)
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    text_body = models.TextField()
+    html_body = models.TextField(blank=True)
+    source_model = models.CharField(max_length=100, blank=True)
+    source_id = models.CharField(max_length=64, blank=True)
+    
+    attempts = models.IntegerField()
+    last_error = models.TextField(blank=True)
+    queued_at = models.DateTimeField()
+    failed_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Dead letter: {self.category} to {self.recipient}"
+    
+    class Meta:
+        ordering = ['-failed_at']
+
+class Geofence(models.Model):
+    """An area a traveller wants to hear about entering or leaving (evaluated by location_sos.geofencing)"""
+    SHAPE_CHOICES = [
+        ('CIRCLE', 'Circle'),
+        ('POLYGON', 'Polygon'),
+    ]
+    
+    NOTIFY_CHOICES = [
+        ('ENTER', 'On arrival'),
+        ('EXIT', 'On leaving'),
+        ('BOTH', 'On arrival and leaving'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='geofences')
+    name = models.CharField(max_length=100)
+    shape = models.CharField(max_length=10, choices=SHAPE_CHOICES, default='CIRCLE')
+    notify_on = models.CharField(max_length=5, choices=NOTIFY_CHOICES, default='BOTH')
+    
+    # Optional anchors, for display; the geometry below is what is evaluated
+    hotel = models.ForeignKey('hotel_booking.Hotel', on_delete=models.SET_NULL, null=True, blank=True, related_name='geofences')
+    route = models.ForeignKey('transportation.Route', on_delete=models.SET_NULL, null=True, blank=True, related_name='geofences')
+    
+    # Circle
+    center_latitude = models.FloatField(null=True, blank=True)
+    center_longitude = models.FloatField(null=True, blank=True)
+    radius_m = models.FloatField(null=True, blank=True)
+    # Polygon: [[lat, lng], ...]
+    polygon = models.JSONField(null=True, blank=True)
+    
+    # Bounding box, derived on save; used to place the fence in the grid index
+    min_latitude = models.FloatField(editable=False, default=0)
+    min_longitude = models.FloatField(editable=False, default=0)
+    max_latitude = models.FloatField(editable=False, default=0)
+    max_longitude = models.FloatField(editable=False, default=0)
+    
+    # Last known side of the fence; None until the first fix after creation
+    is_inside = models.BooleanField(null=True, blank=True)
+    state_changed_at = models.DateTimeField(null=True, blank=True)
+    
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def clean(self):
+        if self.shape == 'CIRCLE':
+            if self.center_latitude is None or self.center_longitude is None or not self.radius_m:
+                raise ValidationError('A circle needs a centre and a radius.')
+            if not (-90 <= self.center_latitude <= 90 and -180 <= self.center_longitude <= 180):
+                raise ValidationError('Centre is out of range.')
+            if not (10 <= self.radius_m <= 50000):
+                raise ValidationError('Radius must be between 10 m and 50 km.')
+        else:
+            polygon = self.polygon
+            if not isinstance(polygon, list) or len(polygon) < 3:
+                raise ValidationError('A polygon needs at least three points.')
+            for point in polygon:
+                if (not isinstance(point, (list, tuple)) or len(point) != 2
+                        or not all(isinstance(value, (int, float)) for value in point)
+                        or not (-90 <= point[0] <= 90 and -180 <= point[1] <= 180)):
+                    raise ValidationError('Polygon points must be [latitude, longitude] pairs.')
+    
+    def save(self, *args, **kwargs):
+        if self.shape == 'CIRCLE':
+            bbox = circle_bbox(self.center_latitude, self.center_longitude, self.radius_m)
+        else:
+            bbox = polygon_bbox(self.polygon)
+        self.min_latitude, self.min_longitude, self.max_latitude, self.max_longitude = bbox
+        super().save(*args, **kwargs)
+    
+    @property
+    def bbox(self):
+        return self.min_latitude, self.min_longitude, self.max_latitude, self.max_longitude
+    
+    def contains(self, latitude, longitude):
+        if not (self.min_latitude <= latitude <= self.max_latitude and self.min_longitude <= longitude <= self.max_longitude):
+            return False
+        if self.shape == 'CIRCLE':
+            return haversine_m(self.center_latitude, self.center_longitude, latitude, longitude) <= self.radius_m
+        return point_in_polygon(latitude, longitude, self.polygon)
+    
+    def notifies(self, event_type):
+        return self.notify_on in ('BOTH', event_type)
+    
+    def __str__(self):
+        return f"{self.name} ({self.get_shape_display()}) - {self.user.username}"
+    
+    class Meta:
+        ordering = ['name']
+
+class GeofenceEvent(models.Model):
+    EVENT_CHOICES = [
+        ('ENTER', 'Entered'),
+        ('EXIT', 'Left'),
+    ]
+    
+    geofence = models.ForeignKey(Geofence, on_delete=models.CASCADE, related_name='events')
+    share = models.ForeignKey(LocationShare, on_delete=models.SET_NULL, null=True, blank=True, related_name='geofence_events')
+    event_type = models.CharField(max_length=5, choices=EVENT_CHOICES)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    occurred_at = models.DateTimeField()  # Device time of the fix that crossed the boundary
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    # Email notification tracking
+    emails_sent = models.BooleanField(default=False)
+    email_sent_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.get_event_type_display()} {self.geofence.name} at {self.occurred_at}"
+    
+    class Meta:
+        ordering = ['-occurred_at']
+
+class GeocodeCacheEntry(models.Model):
+    """Persistent reverse-geocoding result for a rounded coordinate (see location_sos.geocoding)"""
+    key = models.CharField(max_length=32, unique=True)  # "lat,lng" rounded to GEOCODER_KEY_DECIMALS
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    address = models.TextField()  # Editable in the admin; a correction sticks for that spot
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.key}: {self.address}"
\ No newline at end of file
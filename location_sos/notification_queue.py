@@ -0,0 +1,322 @@
+# location_sos/notification_queue.py
+"""
+Durable notification queue.
+
+The send_* helpers render their emails and store them as
+QueuedNotification rows instead of talking to SMTP inline. The worker
+(`python manage.py process_notifications`) does the sending:
+
+- due rows are taken in priority order (SOS, safety, receipts, marketing)
+  and claimed with a compare-and-set on status;
+- each provider in NOTIFICATION_PROVIDERS has a token bucket
+  (rate_per_minute, burst). Rows beyond the bucket stay queued, so
+  lower-priority mail waits behind SOS rather than the other way round;
+- claimed rows are sent per provider over shared connections
+  (mail_transport.deliver_messages);
+- a failure is retried with exponential backoff. After max_attempts the
+  row moves to DeadLetterNotification.
+
+The token buckets live in the worker process. With several worker
+processes, split each provider's rate between them.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from worker_utils import InlineWorker
+
+from .mail_transport import build_message, deliver_messages
+from .models import DeadLetterNotification, QueuedNotification, SOSAlert
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROVIDERS = {'smtp': {'rate_per_minute': 60, 'burst': 20}}
+
+
+# ENQUEUE
+def _source(obj):
+    if obj is None:
+        return '', ''
+    return obj._meta.label_lower, str(obj.pk)
+
+
+def enqueue_email(recipient, subject, text_body, html_body='', category='GENERAL',
+                  priority=QueuedNotification.PRIORITY_SAFETY, source=None, provider='smtp'):
+    """Queue one email; source is a model instance to mark as notified once it is delivered"""
+    return enqueue_messages(
+        [build_message(subject, text_body, html_body, recipient)],
+        category=category, priority=priority, source=source, provider=provider,
+    )
+
+
+def enqueue_messages(messages, category, priority=QueuedNotification.PRIORITY_SAFETY, source=None, provider='smtp'):
+    """Queue rendered EmailMultiAlternatives (one recipient each). Returns the number queued."""
+    source_model, source_id = _source(source)
+    rows = []
+    for msg in messages:
+        html_body = next((content for content, mimetype in msg.alternatives if mimetype == 'text/html'), '')
+        rows.append(QueuedNotification(
+            category=category,
+            priority=priority,
+            provider=provider,
+            recipient=msg.to[0],
+            subject=msg.subject[:255],
+            text_body=msg.body,
+            html_body=html_body,
+            source_model=source_model,
+            source_id=source_id,
+            max_attempts=getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 8),
+        ))
+    QueuedNotification.objects.bulk_create(rows)
+    if rows:
+        kick_inline_worker()
+    return len(rows)
+
+
+# RATE LIMITING
+class TokenBucket:
+    def __init__(self, rate_per_minute, burst):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self):
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def give_back(self, count=1):
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + count)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def _providers():
+    return getattr(settings, 'NOTIFICATION_PROVIDERS', DEFAULT_PROVIDERS)
+
+
+def _bucket(provider):
+    with _buckets_lock:
+        if provider not in _buckets:
+            config = _providers().get(provider) or DEFAULT_PROVIDERS['smtp']
+            _buckets[provider] = TokenBucket(config['rate_per_minute'], config['burst'])
+        return _buckets[provider]
+
+
+def _provider_connection(provider):
+    config = _providers().get(provider, {})
+    return get_connection(config.get('backend'), fail_silently=False, **config.get('options', {}))
+
+
+# WORKER
+def release_stale_claims():
+    """Put rows claimed by a worker that died back in the queue"""
+    timeout = getattr(settings, 'NOTIFICATION_CLAIM_TIMEOUT_SECONDS', 300)
+    return QueuedNotification.objects.filter(
+        status='PROCESSING', claimed_at__lt=timezone.now() - timedelta(seconds=timeout),
+    ).update(status='PENDING', claimed_at=None)
+
+
+def _claim(batch_size):
+    now = timezone.now()
+    due = QueuedNotification.objects.filter(status='PENDING', available_at__lte=now).order_by(
+        'priority', 'available_at', 'pk')[:batch_size * 2]
+
+    claimed = []
+    for notification in due:
+        if len(claimed) >= batch_size:
+            break
+        bucket = _bucket(notification.provider)
+        if not bucket.take():
+            continue
+        if QueuedNotification.objects.filter(pk=notification.pk, status='PENDING').update(
+                status='PROCESSING', claimed_at=now) == 1:
+            claimed.append(notification)
+        else:
+            bucket.give_back()
+    return claimed
+
+
+def _send_chunk(provider, notifications):
+    """Runs in worker threads: no database access"""
+    messages = [
+        build_message(notification.subject, notification.text_body, notification.html_body, notification.recipient)
+        for notification in notifications
+    ]
+    return deliver_messages(messages, connection=_provider_connection(provider))
+
+
+def _mark_sources_delivered(notifications, now):
+    sources = {}
+    for notification in notifications:
+        if notification.source_model:
+            sources.setdefault(notification.source_model, set()).add(notification.source_id)
+
+    for label, ids in sources.items():
+        model = apps.get_model(label)
+        if label == 'location_sos.sosdelivery':
+            model.objects.filter(pk__in=ids).exclude(status='SENT').update(status='SENT', sent_at=now, last_error='')
+            _mark_sos_first_notified(model.objects.filter(pk__in=ids).values('alert_id'), now)
+        elif any(field.name == 'emails_sent' for field in model._meta.fields):
+            if label == 'location_sos.sosalert':
+                _mark_sos_first_notified(ids, now)
+            model.objects.filter(pk__in=ids, emails_sent=False).update(emails_sent=True, email_sent_at=now)
+
+
+def _mark_sos_first_notified(alert_ids, now):
+    """Stamp first_notified_at on alerts whose first delivery came through the queue"""
+    SOSAlert.objects.filter(pk__in=alert_ids, first_notified_at__isnull=True).update(
+        first_notified_at=now, emails_sent=True, email_sent_at=now,
+    )
+
+
+def process_notifications(batch_size=None, max_workers=None):
+    """Send one batch of due notifications. Returns a count per outcome."""
+    batch_size = batch_size or getattr(settings, 'NOTIFICATION_BATCH_SIZE', 100)
+    max_workers = max_workers or getattr(settings, 'NOTIFICATION_MAX_WORKERS', 4)
+    retry_base = getattr(settings, 'NOTIFICATION_RETRY_BASE_SECONDS', 30)
+    retry_max = getattr(settings, 'NOTIFICATION_RETRY_MAX_SECONDS', 3600)
+
+    claimed = _claim(batch_size)
+    if not claimed:
+        return {}
+
+    # One connection per chunk; chunks of one provider run side by side
+    chunks = []
+    by_provider = {}
+    for notification in claimed:
+        by_provider.setdefault(notification.provider, []).append(notification)
+    for provider, notifications in by_provider.items():
+        size = max(1, -(-len(notifications) // max_workers))
+        chunks += [(provider, notifications[i:i + size]) for i in range(0, len(notifications), size)]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        chunk_results = list(pool.map(lambda chunk: _send_chunk(*chunk), chunks))
+
+    now = timezone.now()
+    sent, retry, dead = [], [], []
+    for (provider, notifications), results in zip(chunks, chunk_results):
+        for notification, result in zip(notifications, results):
+            notification.attempts += 1
+            notification.claimed_at = None
+            if result['success']:
+                notification.status = 'SENT'
+                notification.sent_at = now
+                notification.last_error = ''
+                sent.append(notification)
+            elif notification.attempts >= notification.max_attempts:
+                notification.last_error = result['error']
+                dead.append(notification)
+            else:
+                notification.status = 'PENDING'
+                notification.last_error = result['error']
+                delay = min(retry_max, retry_base * 2 ** (notification.attempts - 1))
+                notification.available_at = now + timedelta(seconds=delay)
+                retry.append(notification)
+
+    with transaction.atomic():
+        QueuedNotification.objects.bulk_update(
+            sent + retry, ['status', 'attempts', 'claimed_at', 'sent_at', 'last_error', 'available_at'], batch_size=500,
+        )
+        if dead:
+            DeadLetterNotification.objects.bulk_create([
+                DeadLetterNotification(
+                    category=notification.category,
+                    priority=notification.priority,
+                    provider=notification.provider,
+                    recipient=notification.recipient,
+                    subject=notification.subject,
+                    text_body=notification.text_body,
+                    html_body=notification.html_body,
+                    source_model=notification.source_model,
+                    source_id=notification.source_id,
+                    attempts=notification.attempts,
+                    last_error=notification.last_error,
+                    queued_at=notification.created_at,
+                ) for notification in dead
+            ])
+            QueuedNotification.objects.filter(pk__in=[notification.pk for notification in dead]).delete()
+        _mark_sources_delivered(sent, now)
+
+    for notification in dead:
+        logger.error(f"Notification {notification.pk} to {notification.recipient} dead-lettered: {notification.last_error}")
+    return {key: len(rows) for key, rows in (('SENT', sent), ('RETRY', retry), ('DEAD', dead)) if rows}
+
+
+def purge_sent(older_than_days=None):
+    """Delete delivered rows past NOTIFICATION_SENT_RETENTION_DAYS"""
+    days = older_than_days if older_than_days is not None else getattr(settings, 'NOTIFICATION_SENT_RETENTION_DAYS', 7)
+    deleted, _ = QueuedNotification.objects.filter(
+        status='SENT', sent_at__lt=timezone.now() - timedelta(days=days),
+    ).delete()
+    return deleted
+
+
+def requeue_dead_letters(dead_letters):
+    """Move dead letters back into the queue with a fresh attempt budget"""
+    dead_letters = list(dead_letters)
+    with transaction.atomic():
+        QueuedNotification.objects.bulk_create([
+            QueuedNotification(
+                category=dead.category,
+                priority=dead.priority,
+                provider=dead.provider,
+                recipient=dead.recipient,
+                subject=dead.subject,
+                text_body=dead.text_body,
+                html_body=dead.html_body,
+                source_model=dead.source_model,
+                source_id=dead.source_id,
+                max_attempts=getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 8),
+            ) for dead in dead_letters
+        ])
+        DeadLetterNotification.objects.filter(pk__in=[dead.pk for dead in dead_letters]).delete()
+    return len(dead_letters)
+
+
+# METRICS
+def queue_metrics():
+    """Queue depth and health, for dashboards and alerting"""
+    now = timezone.now()
+    pending = QueuedNotification.objects.filter(status='PENDING')
+    priority_names = dict(QueuedNotification.PRIORITY_CHOICES)
+
+    depth = {name: 0 for name in priority_names.values()}
+    for row in pending.values('priority').annotate(count=Count('id')).order_by():
+        depth[priority_names.get(row['priority'], str(row['priority']))] = row['count']
+
+    oldest = pending.aggregate(oldest=Min('created_at'))['oldest']
+    return {
+        'pending': sum(depth.values()),
+        'pending_by_priority': depth,
+        'due_now': pending.filter(available_at__lte=now).count(),
+        'processing': QueuedNotification.objects.filter(status='PROCESSING').count(),
+        'sent_last_hour': QueuedNotification.objects.filter(status='SENT', sent_at__gte=now - timedelta(hours=1)).count(),
+        'dead_letters': DeadLetterNotification.objects.count(),
+        'oldest_pending_seconds': (now - oldest).total_seconds() if oldest else 0,
+    }
+
+
+kick_inline_worker = InlineWorker(process_notifications, 'NOTIFICATION_INLINE_WORKER').kick
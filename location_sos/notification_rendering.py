@@ -0,0 +1,83 @@
+# location_sos/notification_rendering.py
+"""
+Render-once notification emails.
+
+A fan-out sends the same email to every contact except for a few
+personal fields (the greeting name). Instead of rendering the HTML and
+text templates once per recipient, render_notification() renders them
+once per event with a placeholder token standing in for each personal
+field. RenderedNotification.message_for() then swaps in the recipient's
+values with plain string replacement, HTML-escaped in the HTML part.
+Compiled templates are kept per process.
+
+The tokens carry a random per-process nonce, so user-supplied text (an
+alert message, say) cannot collide with them.
+"""
+import logging
+import secrets
+import threading
+
+from django.template.loader import get_template
+from django.utils.html import escape
+
+from .mail_transport import build_message
+
+logger = logging.getLogger(__name__)
+
+_NONCE = secrets.token_hex(8)
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def _placeholder(field):
+    # Letters, digits and underscores only: autoescaping leaves it untouched
+    return f'__personal_{_NONCE}_{field}__'
+
+
+def compiled_template(name):
+    """Template object for name, compiled once per process"""
+    template = _templates.get(name)
+    if template is None:
+        with _templates_lock:
+            template = _templates.get(name)
+            if template is None:
+                template = _templates[name] = get_template(name)
+    return template
+
+
+class RenderedNotification:
+    """An email rendered once, with placeholders left for the personal fields"""
+
+    def __init__(self, subject, text_content, html_content, personal_fields):
+        self.subject = subject
+        self.text_content = text_content
+        self.html_content = html_content
+        self.personal_fields = personal_fields
+
+    def personalise(self, **values):
+        """(subject, text, html) for one recipient"""
+        subject, text_content, html_content = self.subject, self.text_content, self.html_content
+        for field in self.personal_fields:
+            token = _placeholder(field)
+            value = str(values.get(field, ''))
+            subject = subject.replace(token, value)
+            text_content = text_content.replace(token, value)
+            if html_content:
+                html_content = html_content.replace(token, escape(value))
+        return subject, text_content, html_content
+
+    def message_for(self, recipient, **values):
+        """EmailMultiAlternatives for one recipient"""
+        subject, text_content, html_content = self.personalise(**values)
+        return build_message(subject, text_content, html_content, recipient)
+
+
+def render_notification(template_base, context, subject, personal_fields=('contact_name',)):
+    """Render emails/<template_base>.html and .txt once for an event"""
+    shared_context = dict(context)
+    for field in personal_fields:
+        shared_context[field] = _placeholder(field)
+
+    text_content = compiled_template(f'emails/{template_base}.txt').render(shared_context)
+    html_content = compiled_template(f'emails/{template_base}.html').render(shared_context)
+    return RenderedNotification(subject, text_content, html_content, personal_fields)
@@ -0,0 +1,124 @@
+# location_sos/pubsub.py
+"""
+Publish/subscribe for live location updates.
+
+Ingest publishes each share's newest fix once, on a channel named after
+the share_id. Every viewer streaming that share (location_stream_view /
+location_poll_view) is subscribed, so one fix costs one fan-out, however
+many people are watching.
+
+The broker is chosen by LOCATION_PUBSUB_BROKER (a dotted path). The
+default LocalBroker works within one process. That covers a single ASGI
+server, where ingest and the streams share the process. Multi-process
+deployments need a broker with the same two methods backed by something
+shared, such as Redis pub/sub:
+
+    publish(channel, message)         thread-safe; callable from sync code
+    subscribe(channel) -> Subscription   async context manager with
+                                          `await get(timeout)` (None on timeout)
+"""
+import asyncio
+import logging
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, broker, channel, max_pending):
+        self.broker = broker
+        self.channel = channel
+        self.loop = None
+        self.queue = None
+        self.max_pending = max_pending
+
+    async def __aenter__(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.max_pending)
+        self.broker._add(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.broker._remove(self)
+
+    def _deliver(self, message):
+        # Runs on the subscriber's loop. A slow viewer only needs the newest
+        # position, so the oldest pending message makes room.
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroker:
+    """In-process broker; subscribers may live on any event loop in the process"""
+
+    def __init__(self, max_pending=16):
+        self.max_pending = max_pending
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def _add(self, subscription):
+        with self._lock:
+            self._channels.setdefault(subscription.channel, set()).add(subscription)
+
+    def _remove(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def subscribe(self, channel):
+        return Subscription(self, channel, self.max_pending)
+
+    def publish(self, channel, message):
+        """Deliver to every current subscriber; returns how many there were"""
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._deliver, message)
+            except RuntimeError:
+                # Loop already closed; the subscription is going away
+                self._remove(subscription)
+        return len(subscribers)
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._channels.get(channel, ()))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(getattr(settings, 'LOCATION_PUBSUB_BROKER', 'location_sos.pubsub.LocalBroker'))()
+    return _broker
+
+
+def share_channel(share_id):
+    return f'location-share:{share_id}'
+
+
+def publish_location(share_id, message):
+    """Publish a location event for a share; never raises into the caller"""
+    try:
+        return get_broker().publish(share_channel(share_id), message)
+    except Exception as e:
+        logger.error(f"Publishing location for share {share_id} failed: {str(e)}")
+        return 0
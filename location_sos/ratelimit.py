@@ -0,0 +1,144 @@
+# location_sos/ratelimit.py
+"""
+Rate limiting for the safety and sharing endpoints.
+
+Each protected view has a scope in RATELIMITS with a token bucket
+(rate_per_minute, burst) per user and one per client IP. Bucket state is
+kept in the RATELIMIT_CACHE cache. With the default local-memory cache
+the limit applies per process. Point it at a shared cache (Redis,
+Memcached) to make it global. A request over either limit gets a 429
+with Retry-After, before the view touches the database or the mail
+pipeline. Only state-changing methods are counted.
+
+Buckets are read and written under a striped in-process lock. Across
+processes on a shared cache, two racing requests can occasionally both
+take the last token. That is accepted: the limit exists to stop storms,
+not to count exactly.
+
+claim_sos_window() lets trigger_sos_ajax fold repeated SOS presses
+(double taps, client retries) within SOS_COALESCE_SECONDS into the alert
+already raised. A press that loses the claim to one still raising its
+alert in the same process waits on an Event (wait_for_sos_claim) rather
+than polling.
+"""
+import logging
+import math
+import threading
+import time
+import zlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULE = {'rate_per_minute': 10, 'burst': 5}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_locks = [threading.Lock() for _ in range(64)]
+
+
+def _cache():
+    return caches[getattr(settings, 'RATELIMIT_CACHE', 'default')]
+
+
+def client_ip(request):
+    if getattr(settings, 'RATELIMIT_TRUST_X_FORWARDED_FOR', False):
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def take_token(key, rate_per_minute, burst, now=None):
+    """Take one token from the bucket at key. Returns 0 if allowed, else seconds until a token is due."""
+    now = now or time.time()
+    rate = rate_per_minute / 60.0
+    cache = _cache()
+    with _locks[zlib.crc32(key.encode()) % len(_locks)]:
+        tokens, updated = cache.get(key) or (float(burst), now)
+        tokens = min(float(burst), tokens + (now - updated) * rate)
+        if tokens < 1:
+            return (1 - tokens) / rate
+        # Kept until the bucket would be full again anyway
+        cache.set(key, (tokens - 1, now), timeout=math.ceil(burst / rate) + 1)
+    return 0
+
+
+def check_rate(scope, request):
+    """Seconds the caller must wait, or 0 if the request may go ahead"""
+    rules = getattr(settings, 'RATELIMITS', {}).get(scope, {})
+    identities = [('ip', client_ip(request))]
+    if request.user.is_authenticated:
+        identities.insert(0, ('user', request.user.pk))
+    for kind, identity in identities:
+        rule = rules.get(kind, DEFAULT_RULE)
+        wait = take_token(f'ratelimit:{scope}:{kind}:{identity}', rule['rate_per_minute'], rule['burst'])
+        if wait:
+            logger.warning(f"Rate limit {scope} hit by {kind} {identity}")
+            return wait
+    return 0
+
+
+def rate_limited(scope, json_response=True):
+    """Answer 429 once the user or their IP exceeds the scope's buckets"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method in SAFE_METHODS:
+                return view(request, *args, **kwargs)
+            wait = check_rate(scope, request)
+            if not wait:
+                return view(request, *args, **kwargs)
+            retry_after = max(1, math.ceil(wait))
+            message = f'Too many requests. Please wait {retry_after} seconds and try again.'
+            if json_response:
+                response = JsonResponse({'success': False, 'message': message, 'retry_after': retry_after}, status=429)
+            else:
+                response = HttpResponse(message, status=429, content_type='text/plain')
+            response['Retry-After'] = str(retry_after)
+            return response
+        return wrapper
+    return decorator
+
+
+# SOS COALESCING
+_sos_claims = {}
+_sos_claims_lock = threading.Lock()
+
+
+def claim_sos_window(user_id):
+    """True if this request may raise a new SOS; False if another raised one within SOS_COALESCE_SECONDS"""
+    window = getattr(settings, 'SOS_COALESCE_SECONDS', 60)
+    claimed = _cache().add(f'sos-window:{user_id}', 1, timeout=window)
+    if claimed:
+        with _sos_claims_lock:
+            _sos_claims[user_id] = threading.Event()
+    return claimed
+
+
+def finish_sos_claim(user_id):
+    """Wake presses waiting on this user's claim: the alert is raised (or raising it failed)"""
+    with _sos_claims_lock:
+        event = _sos_claims.pop(user_id, None)
+    if event is not None:
+        event.set()
+
+
+def wait_for_sos_claim(user_id, timeout):
+    """
+    Block until the press holding the user's claim in this process has
+    finished, for at most timeout seconds. Returns at once when there is
+    none here (it finished, or it runs in another process).
+    """
+    with _sos_claims_lock:
+        event = _sos_claims.get(user_id)
+    return event.wait(timeout) if event is not None else True
+
+
+def release_sos_window(user_id):
+    """Let the next press raise an alert again (when raising this one failed)"""
+    _cache().delete(f'sos-window:{user_id}')
+    finish_sos_claim(user_id)
@@ -0,0 +1,104 @@
+# location_sos/recipients.py
+"""
+Who gets told about what.
+
+A user's recipients for a notification kind are their active emergency
+contacts (primary first). After those come the trusted contacts who
+accepted and whose permission covers that kind:
+
+    SOS       can_receive_sos       SOS alerts, their status updates, missed check-in escalations
+    CHECKIN   can_receive_checkins  EMERGENCY / CONCERN check-ins
+    LOCATION  can_see_location      location shares, geofence arrivals and departures
+
+Addresses appear once per set. An emergency contact wins over a trusted
+contact with the same email.
+
+recipient_sets() builds all kinds for a user with two queries. It keeps
+the result in the RECIPIENTS_CACHE cache for RECIPIENTS_CACHE_SECONDS.
+Signals drop the entry whenever the user's emergency or trusted contacts
+change, or a trusted user's name or email does. So the SOS path normally
+works out who to alert without touching the database.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import EmergencyContact, TrustedContact
+
+# contact_id is set for an EmergencyContact, user_id for a trusted Nomado user
+Recipient = namedtuple('Recipient', 'name email contact_id user_id')
+
+KIND_PERMISSIONS = {
+    'SOS': 'can_receive_sos',
+    'CHECKIN': 'can_receive_checkins',
+    'LOCATION': 'can_see_location',
+}
+
+
+class RecipientSets:
+    def __init__(self, emergency, trusted):
+        """emergency: [Recipient]; trusted: [(Recipient, {permission: bool})]"""
+        self._sets = {}
+        self._trusted = {}
+        for kind, permission in KIND_PERMISSIONS.items():
+            seen = set()
+            recipients = []
+            for recipient in emergency + [recipient for recipient, permissions in trusted if permissions[permission]]:
+                email = recipient.email.strip().lower()
+                if email and email not in seen:
+                    seen.add(email)
+                    recipients.append(recipient)
+            self._sets[kind] = tuple(recipients)
+            self._trusted[kind] = {recipient.user_id: recipient for recipient in recipients if recipient.user_id}
+
+    def for_kind(self, kind):
+        return self._sets[kind]
+
+    def trusted(self, kind):
+        """{trusted user id: Recipient} of the trusted contacts in a kind's set"""
+        return self._trusted[kind]
+
+
+def _cache():
+    return caches[getattr(settings, 'RECIPIENTS_CACHE', 'default')]
+
+
+def _key(user_id):
+    return f'recipients:{user_id}'
+
+
+def build_recipient_sets(user_id):
+    emergency = [
+        Recipient(name, email, pk, None)
+        for pk, name, email in EmergencyContact.objects.filter(user_id=user_id, is_active=True).order_by(
+            '-is_primary', 'created_at').values_list('pk', 'name', 'email')
+    ]
+    trusted = []
+    rows = TrustedContact.objects.filter(
+        user_id=user_id, is_active=True, accepted=True, trusted_user__is_active=True,
+    ).exclude(trusted_user__email='').order_by('created_at').values_list(
+        'trusted_user_id', 'trusted_user__first_name', 'trusted_user__last_name', 'trusted_user__username',
+        'trusted_user__email', *KIND_PERMISSIONS.values(),
+    )
+    for trusted_user_id, first_name, last_name, username, email, *permissions in rows:
+        name = f'{first_name} {last_name}'.strip() or username
+        trusted.append((Recipient(name, email, None, trusted_user_id), dict(zip(KIND_PERMISSIONS.values(), permissions))))
+    return RecipientSets(emergency, trusted)
+
+
+def recipient_sets(user_id):
+    sets = _cache().get(_key(user_id))
+    if sets is None:
+        sets = build_recipient_sets(user_id)
+        _cache().set(_key(user_id), sets, timeout=getattr(settings, 'RECIPIENTS_CACHE_SECONDS', 600))
+    return sets
+
+
+def recipients_for(user_id, kind):
+    """Tuple of Recipients to notify of a kind of event for a user"""
+    return recipient_sets(user_id).for_kind(kind)
+
+
+def invalidate_recipients(*user_ids):
+    _cache().delete_many([_key(user_id) for user_id in user_ids])
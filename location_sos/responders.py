@@ -0,0 +1,163 @@
+# location_sos/responders.py
+"""
+Nearest-responder lookup for SOS alerts.
+
+A trusted contact is another Nomado user who agreed to help (accepted,
+is_active, can_receive_sos). When an SOS is raised, the contacts who are
+physically closest are notified first. They are often the ones who can
+actually get there.
+
+ResponderIndex keeps the latest known position of every user with a
+recent fix in a PointGrid (RESPONDER_GRID_DEGREES cells), one per
+process. Positions come from live location shares and from safety
+check-ins. Anything older than RESPONDER_POSITION_MAX_AGE_MINUTES is
+ignored. The index loads once. After that it follows the
+last_updated / created_at change feed in the background, at most every
+RESPONDER_INDEX_REFRESH_SECONDS, and ingest pushes fixes from this
+process straight in. A k-nearest query reads the grid cells around the
+alert, so its cost depends on how many users are nearby, not on how many
+are active. The candidates come from the cached SOS recipient set
+(location_sos.recipients), so a lookup normally runs no queries.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import LocationShare, SafetyCheckIn
+from .recipients import recipient_sets
+from .spatial import PointGrid
+
+logger = logging.getLogger(__name__)
+
+
+class ResponderIndex:
+    def __init__(self, cell_degrees=None):
+        self.grid = PointGrid(cell_degrees or getattr(settings, 'RESPONDER_GRID_DEGREES', 0.05))
+        self._seen = {}  # user_id -> time of the indexed position
+        self._lock = threading.Lock()
+        self._watermark = None
+        self._refreshed_at = None
+        self._pruned_at = None
+        self._refreshing = threading.Lock()
+
+    def max_age(self):
+        return timedelta(minutes=getattr(settings, 'RESPONDER_POSITION_MAX_AGE_MINUTES', 60))
+
+    def update(self, user_id, lat, lng, seen_at):
+        """Record a position if it is newer than the one held"""
+        with self._lock:
+            current = self._seen.get(user_id)
+            if current is not None and current >= seen_at:
+                return
+            self._seen[user_id] = seen_at
+            self.grid.upsert(user_id, float(lat), float(lng))
+
+    def _positions_since(self, since):
+        shares = LocationShare.objects.filter(last_updated__gt=since).order_by().values_list(
+            'user_id', 'latitude', 'longitude', 'last_fix_at', 'last_updated')
+        for user_id, lat, lng, last_fix_at, last_updated in shares.iterator():
+            yield user_id, lat, lng, last_fix_at or last_updated
+        checkins = SafetyCheckIn.objects.filter(created_at__gt=since).order_by().values_list(
+            'user_id', 'latitude', 'longitude', 'created_at')
+        yield from checkins.iterator()
+
+    def refresh(self, force=False):
+        """Pull positions written since the last refresh; returns how many rows were read"""
+        interval = getattr(settings, 'RESPONDER_INDEX_REFRESH_SECONDS', 30)
+        if not force and self._refreshed_at is not None and time.monotonic() - self._refreshed_at < interval:
+            return 0
+        now = timezone.now()
+        # Overlap a little so a row committed just behind the clock is not missed; update() ignores repeats
+        since = self._watermark - timedelta(seconds=2) if self._watermark else now - self.max_age()
+        self._watermark = now
+        self._refreshed_at = time.monotonic()
+
+        rows = 0
+        for user_id, lat, lng, seen_at in self._positions_since(since):
+            self.update(user_id, lat, lng, seen_at)
+            rows += 1
+        if self._pruned_at is None or now - self._pruned_at > self.max_age():
+            self.prune(now)
+        return rows
+
+    def ensure_fresh(self):
+        """Load on first use; after that refresh in the background so a lookup never waits on the database"""
+        if self._refreshed_at is None:
+            self.refresh(force=True)
+            return
+        interval = getattr(settings, 'RESPONDER_INDEX_REFRESH_SECONDS', 30)
+        if time.monotonic() - self._refreshed_at < interval or self._refreshing.locked():
+            return
+        threading.Thread(target=self._background_refresh, daemon=True, name='responder-index').start()
+
+    def _background_refresh(self):
+        if not self._refreshing.acquire(blocking=False):
+            return
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"Responder index refresh failed: {str(e)}")
+        finally:
+            self._refreshing.release()
+            connection.close()
+
+    def prune(self, now=None):
+        """Drop positions too old to be useful; returns how many"""
+        now = now or timezone.now()
+        cutoff = now - self.max_age()
+        with self._lock:
+            stale = [user_id for user_id, seen_at in self._seen.items() if seen_at < cutoff]
+            for user_id in stale:
+                del self._seen[user_id]
+                self.grid.remove(user_id)
+        self._pruned_at = now
+        return len(stale)
+
+    def nearest(self, lat, lng, k, among=None, max_distance_m=None):
+        """Up to k (distance_m, user_id) of fresh positions near (lat, lng), nearest first"""
+        if max_distance_m is None:
+            max_distance_m = getattr(settings, 'RESPONDER_MAX_DISTANCE_KM', 50) * 1000
+        cutoff = timezone.now() - self.max_age()
+        with self._lock:
+            fresh = [user_id for user_id in among if self._seen.get(user_id, cutoff) > cutoff] if among is not None else None
+            # Ask for a few extra so stale entries not yet pruned cannot crowd out fresh ones
+            found = self.grid.nearest(float(lat), float(lng), k if fresh is not None else 2 * k,
+                                      max_distance_m, among=set(fresh) if fresh is not None else None)
+            return [(distance, user_id) for distance, user_id in found if self._seen[user_id] > cutoff][:k]
+
+    def __len__(self):
+        return len(self.grid)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def responder_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ResponderIndex()
+    return _index
+
+
+def record_position(user_id, lat, lng, seen_at):
+    """Feed a fresh position from this process into the index"""
+    responder_index().update(user_id, lat, lng, seen_at)
+
+
+def nearest_responders(user, lat, lng, k=None):
+    """[(distance_m, Recipient)] for the user's nearest trusted contacts willing to receive an SOS, nearest first"""
+    k = k or getattr(settings, 'RESPONDER_NOTIFY_FIRST', 5)
+    candidates = recipient_sets(user.pk).trusted('SOS')
+    if not candidates:
+        return []
+    index = responder_index()
+    index.ensure_fresh()
+    return [(distance, candidates[user_id]) for distance, user_id in index.nearest(lat, lng, k, among=candidates.keys())]
@@ -0,0 +1,151 @@
+# location_sos/share_cache.py
+"""
+In-process cache for the public shared-location endpoints.
+
+view_shared_location and get_location_update_ajax are unauthenticated and
+polled. Each process keeps an LRU of SharedLocation snapshots
+(LOCATION_SHARE_PAYLOAD_CACHE_SIZE entries, each trusted for
+LOCATION_SHARE_PAYLOAD_CACHE_SECONDS). A snapshot carries the ETag and
+Last-Modified of the share's current position and, once built, the
+serialized response body. A conditional request matching the cached
+validators is answered 304 straight from memory, with no ORM access.
+
+Ingest and the stop views call invalidate_share(), so this process picks
+up new positions at once. Other processes catch up within the TTL.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils import timezone
+
+from .location_ingest import location_buffer
+from .models import LocationShare
+
+
+class LRUCache:
+    """Thread-safe LRU with a per-entry time to live"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            stored_at, value = item
+            if time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SharedLocation:
+    """What the public endpoints need of one share, loaded with a single query"""
+
+    def __init__(self, share):
+        # Position from this process's ingest buffer if it is newer than the database
+        buffered = location_buffer.latest(share.pk)
+        if buffered is not None and (share.last_fix_at is None or buffered.recorded_at > share.last_fix_at):
+            share.latitude = round(buffered.latitude, 7)
+            share.longitude = round(buffered.longitude, 7)
+            share.accuracy = buffered.accuracy
+            share.last_fix_at = buffered.recorded_at
+            share.last_updated = max(share.last_updated, buffered.recorded_at)
+
+        self.share = share
+        self.user_name = share.user.get_full_name() or share.user.username
+        self.last_modified = share.last_updated
+        self._position_ms = int((share.last_fix_at or share.last_updated).timestamp() * 1000)
+        self._update_payload = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_live(self):
+        return self.share.is_live
+
+    @property
+    def etag(self):
+        # Changes with every new position and when the share ends
+        return f'{self.share.share_id.hex}-{self._position_ms}-{"live" if self.is_live else "ended"}'
+
+    def update_payload(self):
+        """Serialized get_location_update_ajax body for a live share, built once per snapshot"""
+        with self._lock:
+            if self._update_payload is None:
+                share = self.share
+                self._update_payload = json.dumps({
+                    'success': True,
+                    'latitude': float(share.latitude),
+                    'longitude': float(share.longitude),
+                    'address': share.address,
+                    'accuracy': share.accuracy,
+                    'last_updated': timezone.localtime(share.last_updated).strftime('%H:%M:%S'),
+                    'last_fix_at': share.last_fix_at.isoformat() if share.last_fix_at else None,
+                }).encode()
+            return self._update_payload
+
+
+_MISSING = object()
+_snapshots = None
+_snapshots_lock = threading.Lock()
+
+
+def _cache():
+    global _snapshots
+    if _snapshots is None:
+        with _snapshots_lock:
+            if _snapshots is None:
+                _snapshots = LRUCache(
+                    getattr(settings, 'LOCATION_SHARE_PAYLOAD_CACHE_SIZE', 10000),
+                    getattr(settings, 'LOCATION_SHARE_PAYLOAD_CACHE_SECONDS', 5),
+                )
+    return _snapshots
+
+
+def shared_location(share_id):
+    """Cached SharedLocation for a share_id, or None if there is no such share"""
+    key = str(share_id)
+    snapshot = _cache().get(key)
+    if snapshot is None:
+        share = LocationShare.objects.select_related('user').filter(share_id=share_id).first()
+        # Unknown ids are cached too, so a bad link polled in a loop stays off the database
+        snapshot = SharedLocation(share) if share is not None else _MISSING
+        _cache().set(key, snapshot)
+    return None if snapshot is _MISSING else snapshot
+
+
+def invalidate_share(share_id):
+    _cache().pop(str(share_id))
+
+
+# Validators for django.views.decorators.http.condition
+def share_etag(request, share_id):
+    snapshot = shared_location(share_id)
+    return snapshot.etag if snapshot else None
+
+
+def share_last_modified(request, share_id):
+    snapshot = shared_location(share_id)
+    return snapshot.last_modified if snapshot else None
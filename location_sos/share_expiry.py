@@ -0,0 +1,39 @@
+# location_sos/share_expiry.py
+"""
+Scheduled expiry of location shares.
+
+Shares used to be marked EXPIRED only when someone opened them after
+expiry. expire_shares() sweeps ACTIVE shares past expires_at in batches,
+walking the (status, expires_at) index. Run it periodically with
+`python manage.py expire_location_shares`.
+
+Nothing relies on the sweep being prompt: readers check expires_at
+themselves (LocationShare.is_live, location_ingest.active_share), and
+live streams close at expiry on their own.
+"""
+import logging
+
+from django.utils import timezone
+
+from .models import LocationShare
+
+logger = logging.getLogger(__name__)
+
+
+def expire_shares(batch_size=500):
+    """Mark every ACTIVE share past its expiry as EXPIRED. Returns the number expired."""
+    now = timezone.now()
+    expired = 0
+    while True:
+        pks = list(LocationShare.objects.filter(status='ACTIVE', expires_at__lte=now).order_by(
+            'expires_at').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        # update() skips auto_now, so last_updated keeps meaning "last position"
+        expired += LocationShare.objects.filter(pk__in=pks, status='ACTIVE').update(status='EXPIRED')
+        if len(pks) < batch_size:
+            break
+
+    if expired:
+        logger.info(f"Expired {expired} location shares")
+    return expired
@@ -0,0 +1,51 @@
+# location_sos/signals.py
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import EmergencyContact, GeocodeCacheEntry, Geofence, LocationShare, SafetyCheckIn, SOSAlert, TrustedContact
+
+
+@receiver([post_save, post_delete], sender=Geofence)
+def invalidate_geofence_index(sender, instance, **kwargs):
+    from .geofencing import forget_user_fences
+
+    forget_user_fences(instance.user_id)
+
+
+@receiver(pre_save, sender=LocationShare)
+@receiver(pre_save, sender=SOSAlert)
+@receiver(pre_save, sender=SafetyCheckIn)
+def geocode_blank_address(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'address' not in update_fields:
+        return
+    from .geocoding import fill_address
+
+    fill_address(instance)
+
+
+@receiver([post_save, post_delete], sender=GeocodeCacheEntry)
+def invalidate_geocode_cache(sender, instance, **kwargs):
+    from .geocoding import geocode_cache
+
+    geocode_cache.forget(instance.key)
+
+
+@receiver([post_save, post_delete], sender=EmergencyContact)
+@receiver([post_save, post_delete], sender=TrustedContact)
+def invalidate_contact_recipients(sender, instance, **kwargs):
+    from .recipients import invalidate_recipients
+
+    invalidate_recipients(instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_trusting_recipients(sender, instance, created, update_fields=None, **kwargs):
+    """A trusted user's name, email or active flag appears in other users' recipient sets"""
+    if created or (update_fields is not None and set(update_fields) <= {'last_login', 'password'}):
+        return
+    from .recipients import invalidate_recipients
+
+    trusting = list(TrustedContact.objects.filter(trusted_user=instance).values_list('user_id', flat=True))
+    if trusting:
+        invalidate_recipients(*trusting)
@@ -0,0 +1,222 @@
+# location_sos/sos_dispatch.py
+"""
+SOS alert fan-out.
+
+dispatch_sos_alert() only records one SOSDelivery row per recipient and
+returns, so the person raising the alert gets an answer straight away.
+After commit a dispatcher thread sends to every recipient at once on a
+bounded, process-wide thread pool (SOS_DISPATCH_MAX_WORKERS). Each
+recipient has its own SMTP connection, a deadline
+(SOS_DELIVERY_DEADLINE_SECONDS) and up to SOS_DELIVERY_MAX_ATTEMPTS
+tries, so one slow mail server cannot hold up the others. Sends still
+waiting for a pool thread when time runs out are cancelled and queued;
+sends already under way are waited for, so nobody gets the alert twice.
+
+The pool threads only send mail. The dispatcher thread writes each result
+to the database as it arrives, and stamps SOSAlert.first_notified_at on
+the first success. Time to first notification is logged and checked
+against SOS_FIRST_NOTIFICATION_TARGET_SECONDS. A recipient the fast path
+cannot reach is handed to the durable notification queue at SOS priority
+(status QUEUED) instead of being dropped.
+
+Nearby trusted contacts (location_sos.responders) passed as responders
+get deliveries ahead of the other recipients, nearest first. Their email
+says how far away they are.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .email_utils import render_sos_alert
+from .models import QueuedNotification, SOSAlert, SOSDelivery
+from .notification_queue import enqueue_messages
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """Process-wide pool shared by all alerts, so concurrent SOS bursts stay bounded"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'SOS_DISPATCH_MAX_WORKERS', 16),
+                thread_name_prefix='sos-dispatch',
+            )
+        return _pool
+
+
+def dispatch_sos_alert(sos_alert, recipients, responders=()):
+    """Queue delivery to nearby responders, then every other recipient, and start sending after commit. Returns the number queued."""
+    deliveries = []
+    seen = set()
+    # Nearest first, with their distance; then the rest of the SOS recipients (location_sos.recipients)
+    for distance, recipient in [*responders, *((None, recipient) for recipient in recipients)]:
+        email = recipient.email.strip().lower()
+        if not email or email in seen:
+            continue
+        seen.add(email)
+        deliveries.append(SOSDelivery(
+            alert=sos_alert, contact_id=recipient.contact_id, responder_id=recipient.user_id,
+            distance_m=round(distance, 1) if distance is not None else None,
+            recipient_name=recipient.name, recipient_email=recipient.email,
+        ))
+
+    with transaction.atomic():
+        SOSDelivery.objects.bulk_create(deliveries, ignore_conflicts=True)
+        SOSAlert.objects.filter(pk=sos_alert.pk).update(dispatch_started_at=timezone.now())
+        alert_pk = sos_alert.pk
+        transaction.on_commit(lambda: threading.Thread(
+            target=_run_dispatch, args=(alert_pk,), daemon=True, name=f'sos-{alert_pk}',
+        ).start())
+
+    logger.info(f"SOS alert {sos_alert.alert_id}: {len(deliveries)} deliveries queued")
+    return len(deliveries)
+
+
+def _personal_values(delivery):
+    """Personal fields of the SOS email for one delivery"""
+    proximity = ''
+    if delivery.distance_m is not None:
+        distance = (f'{delivery.distance_m / 1000:.1f} km' if delivery.distance_m >= 1000
+                    else f'{delivery.distance_m:.0f} m')
+        proximity = f' You are one of their trusted contacts, about {distance} from where the alert was raised.'
+    return {'contact_name': delivery.recipient_name, 'proximity': proximity}
+
+
+# SENDING (pool threads: no database access)
+def _send_with_deadline(message, deadline):
+    """Try to send until it works, the attempts run out, or the deadline passes. Returns (success, attempts, error)."""
+    max_attempts = getattr(settings, 'SOS_DELIVERY_MAX_ATTEMPTS', 3)
+    retry_delay = getattr(settings, 'SOS_DELIVERY_RETRY_SECONDS', 1.0)
+    email_timeout = getattr(settings, 'EMAIL_TIMEOUT', None) or 10
+
+    error = ''
+    attempts = 0
+    while attempts < max_attempts:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            error = error or 'Delivery deadline passed'
+            break
+        attempts += 1
+        try:
+            mail_connection = get_connection(fail_silently=False, timeout=min(email_timeout, remaining))
+            if mail_connection.send_messages([message]):
+                return True, attempts, ''
+            error = 'Not accepted by mail server'
+        except Exception as e:
+            error = str(e)
+        if attempts < max_attempts:
+            # Back off, but never past the deadline
+            time.sleep(max(0, min(retry_delay * 2 ** (attempts - 1), deadline - time.monotonic())))
+    return False, attempts, error
+
+
+# DISPATCHER
+def _fall_back_to_queue(delivery, message, error):
+    """Give a delivery the fast path could not make to the durable queue, at SOS priority"""
+    delivery.last_error = error
+    try:
+        enqueue_messages([message], category='SOS_ALERT', priority=QueuedNotification.PRIORITY_SOS, source=delivery)
+        delivery.status = 'QUEUED'
+    except Exception as e:
+        logger.error(f"Could not queue SOS delivery {delivery.pk} for retry: {str(e)}")
+        delivery.status = 'FAILED'
+
+
+def _record(delivery, message, success, attempts, error, sos_alert):
+    now = timezone.now()
+    delivery.attempts += attempts
+    if success:
+        delivery.status = 'SENT'
+        delivery.sent_at = now
+        delivery.last_error = ''
+    else:
+        _fall_back_to_queue(delivery, message, error)
+    delivery.save(update_fields=['status', 'attempts', 'sent_at', 'last_error'])
+
+    if success and sos_alert.first_notified_at is None:
+        # Only the first success wins
+        if SOSAlert.objects.filter(pk=sos_alert.pk, first_notified_at__isnull=True).update(
+            first_notified_at=now, emails_sent=True, email_sent_at=now,
+        ):
+            sos_alert.first_notified_at = now
+            elapsed = sos_alert.time_to_first_notification
+            target = getattr(settings, 'SOS_FIRST_NOTIFICATION_TARGET_SECONDS', 1.0)
+            log = logger.warning if elapsed > target else logger.info
+            log(f"SOS alert {sos_alert.alert_id}: first contact notified after {elapsed:.2f}s (target {target}s)")
+
+
+def send_pending_deliveries(sos_alert):
+    """Send every PENDING delivery of an alert concurrently; returns (sent, failed)"""
+    deadline_seconds = getattr(settings, 'SOS_DELIVERY_DEADLINE_SECONDS', 30)
+    # Nearest responders first, then the other recipients in the order they were queued
+    deliveries = list(sos_alert.deliveries.filter(status='PENDING').order_by(
+        F('distance_m').asc(nulls_last=True), 'pk'))
+    if not deliveries:
+        return 0, 0
+
+    deadline = time.monotonic() + deadline_seconds
+    rendered = render_sos_alert(sos_alert)
+    pool = _get_pool()
+
+    futures = {}
+    for delivery in deliveries:
+        message = rendered.message_for(delivery.recipient_email, **_personal_values(delivery))
+        futures[pool.submit(_send_with_deadline, message, deadline)] = (delivery, message)
+
+    sent = failed = 0
+    try:
+        # Slack on top of the deadline covers a send already in progress when it passes
+        for future in as_completed(futures, timeout=deadline_seconds + 5):
+            delivery, message = futures.pop(future)
+            success, attempts, error = future.result()
+            _record(delivery, message, success, attempts, error, sos_alert)
+            sent += success
+            failed += not success
+    except FuturesTimeout:
+        # Cancel every send not yet started before waiting on any, so none starts meanwhile
+        cancelled = {future: future.cancel() for future in futures}
+        for future, (delivery, message) in futures.items():
+            if cancelled[future]:
+                # Never started: the notification queue sends it instead
+                success, attempts, error = False, 0, 'Delivery deadline passed'
+            else:
+                # Already sending: wait for the outcome, since queueing it now could send it twice
+                success, attempts, error = future.result()
+            _record(delivery, message, success, attempts, error, sos_alert)
+            sent += success
+            failed += not success
+
+    logger.info(f"SOS alert {sos_alert.alert_id}: {sent} delivered, {failed} handed to the notification queue")
+    return sent, failed
+
+
+def _run_dispatch(alert_pk):
+    try:
+        sos_alert = SOSAlert.objects.select_related('user').get(pk=alert_pk)
+        send_pending_deliveries(sos_alert)
+    except Exception as e:
+        logger.error(f"SOS dispatch for alert {alert_pk} failed: {str(e)}")
+        # Whatever the fast path did not get to goes through the queue instead
+        try:
+            sos_alert = SOSAlert.objects.select_related('user').get(pk=alert_pk)
+            rendered = render_sos_alert(sos_alert)
+            for delivery in sos_alert.deliveries.filter(status='PENDING'):
+                message = rendered.message_for(delivery.recipient_email, **_personal_values(delivery))
+                _fall_back_to_queue(delivery, message, str(e))
+                delivery.save(update_fields=['status', 'last_error'])
+        except Exception as queue_error:
+            logger.error(f"SOS alert {alert_pk}: could not queue undelivered contacts: {str(queue_error)}")
+    finally:
+        connection.close()
@@ -0,0 +1,186 @@
+# location_sos/spatial.py
+"""
+Planar helpers and a uniform grid index for latitude/longitude data.
+
+GridIndex buckets items by fixed-size cells of `cell_degrees`. An item
+with a bounding box is registered in every cell the box covers. A lookup
+then reads the one cell a point falls in, so its cost does not grow with
+the number of items indexed elsewhere. Callers run exact tests
+(haversine_m, point_in_polygon) on the candidates only. An item whose box
+would cover more than `max_cells` cells is kept on a short list checked
+for every lookup instead.
+
+PointGrid holds movable points (one position per item) and answers
+k-nearest queries by searching rings of cells outward from the query
+point. It stops once the k-th best distance is closer than anything in
+the unsearched rings could be. So a query reads only the cells near the
+point, not every item.
+"""
+import math
+
+EARTH_RADIUS_M = 6_371_000
+METERS_PER_DEGREE_LAT = 111_320
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance in meters"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def point_in_polygon(lat, lng, polygon):
+    """Ray casting; polygon is a list of (lat, lng) vertices, open or closed"""
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        lat_i, lng_i = polygon[i]
+        lat_j, lng_j = polygon[j]
+        if (lat_i > lat) != (lat_j > lat):
+            crossing_lng = lng_i + (lat - lat_i) * (lng_j - lng_i) / (lat_j - lat_i)
+            if lng < crossing_lng:
+                inside = not inside
+        j = i
+    return inside
+
+
+def circle_bbox(lat, lng, radius_m):
+    """(min_lat, min_lng, max_lat, max_lng) enclosing a circle"""
+    dlat = radius_m / METERS_PER_DEGREE_LAT
+    dlng = radius_m / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+    return lat - dlat, lng - dlng, lat + dlat, lng + dlng
+
+
+def polygon_bbox(polygon):
+    lats = [point[0] for point in polygon]
+    lngs = [point[1] for point in polygon]
+    return min(lats), min(lngs), max(lats), max(lngs)
+
+
+class GridIndex:
+    def __init__(self, cell_degrees, max_cells=400):
+        self.cell_degrees = cell_degrees
+        self.max_cells = max_cells
+        self._cells = {}
+        self._large = []
+
+    def cell(self, lat, lng):
+        return math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees)
+
+    def insert_bbox(self, item, bbox):
+        min_lat, min_lng, max_lat, max_lng = bbox
+        low_row, low_col = self.cell(min_lat, min_lng)
+        high_row, high_col = self.cell(max_lat, max_lng)
+        if (high_row - low_row + 1) * (high_col - low_col + 1) > self.max_cells:
+            self._large.append(item)
+            return
+        for row in range(low_row, high_row + 1):
+            for col in range(low_col, high_col + 1):
+                self._cells.setdefault((row, col), []).append(item)
+
+    def insert_point(self, item, lat, lng):
+        self._cells.setdefault(self.cell(lat, lng), []).append(item)
+
+    def candidates(self, lat, lng):
+        """Items whose box covers the cell of (lat, lng)"""
+        cell_items = self._cells.get(self.cell(lat, lng), ())
+        return [*cell_items, *self._large] if self._large else cell_items
+
+    def __len__(self):
+        return len(self._cells)
+
+
+class PointGrid:
+    def __init__(self, cell_degrees):
+        self.cell_degrees = cell_degrees
+        self._cells = {}
+        self._positions = {}  # item -> (lat, lng, cell)
+
+    def cell(self, lat, lng):
+        return math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees)
+
+    def upsert(self, item, lat, lng):
+        """Add an item or move it to a new position"""
+        cell = self.cell(lat, lng)
+        previous = self._positions.get(item)
+        if previous is not None and previous[2] != cell:
+            self._discard_from_cell(item, previous[2])
+        self._cells.setdefault(cell, set()).add(item)
+        self._positions[item] = (lat, lng, cell)
+
+    def remove(self, item):
+        previous = self._positions.pop(item, None)
+        if previous is not None:
+            self._discard_from_cell(item, previous[2])
+
+    def _discard_from_cell(self, item, cell):
+        items = self._cells.get(cell)
+        if items is not None:
+            items.discard(item)
+            if not items:
+                del self._cells[cell]
+
+    def position(self, item):
+        position = self._positions.get(item)
+        return position[:2] if position else None
+
+    def _ring(self, row, col, radius):
+        """Cells on the border of the square `radius` cells out from (row, col)"""
+        if radius == 0:
+            yield row, col
+            return
+        for c in range(col - radius, col + radius + 1):
+            yield row - radius, c
+            yield row + radius, c
+        for r in range(row - radius + 1, row + radius):
+            yield r, col - radius
+            yield r, col + radius
+
+    def _ring_clearance_m(self, lat, radius):
+        """Lower bound on the distance to any point outside the first `radius` rings"""
+        # Use the narrowest longitude span inside the searched band so the bound stays conservative
+        band_lat = min(abs(lat) + radius * self.cell_degrees, 89.0)
+        cell_m = self.cell_degrees * METERS_PER_DEGREE_LAT * math.cos(math.radians(band_lat))
+        return radius * cell_m
+
+    def nearest(self, lat, lng, k, max_distance_m, among=None, direct_limit=64):
+        """Up to k (distance_m, item) pairs within max_distance_m, nearest first, optionally only items in `among`"""
+        if among is not None and len(among) <= direct_limit:
+            # A short list is cheaper to measure directly than to search for
+            found = []
+            for item in among:
+                position = self._positions.get(item)
+                if position is not None:
+                    distance = haversine_m(lat, lng, position[0], position[1])
+                    if distance <= max_distance_m:
+                        found.append((distance, item))
+            found.sort(key=lambda pair: pair[0])
+            return found[:k]
+
+        if not self._positions:
+            return []
+        row, col = self.cell(lat, lng)
+        found = []
+        radius = 0
+        while True:
+            for cell in self._ring(row, col, radius):
+                for item in self._cells.get(cell, ()):
+                    if among is not None and item not in among:
+                        continue
+                    item_lat, item_lng, _ = self._positions[item]
+                    distance = haversine_m(lat, lng, item_lat, item_lng)
+                    if distance <= max_distance_m:
+                        found.append((distance, item))
+            found.sort(key=lambda pair: pair[0])
+            del found[k:]
+            clearance = self._ring_clearance_m(lat, radius)
+            if (len(found) == k and found[-1][0] <= clearance) or clearance >= max_distance_m:
+                return found
+            if len(found) == len(self._positions):
+                return found
+            radius += 1
+
+    def __len__(self):
+        return len(self._positions)
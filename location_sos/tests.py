@@ -1,3 +1,344 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import ratelimit, sos_dispatch
+from .geofencing import evaluate_fixes
+from .location_ingest import FixRejected, LocationBuffer, parse_fix
+from .location_tracks import compact_share, load_track, to_ms
+from .models import Geofence, GeofenceEvent, LocationPoint, LocationShare, LocationTrackChunk, SOSAlert, SOSDelivery
+from .responders import ResponderIndex
+from .spatial import PointGrid, haversine_m
+from .track_codec import TrackDecodeError, decode_track, douglas_peucker, encode_track, simplify_track, time_bucket
+from .view_counts import view_counter
+
+User = get_user_model()
+
+
+def make_share(user, **fields):
+    now = timezone.now()
+    return LocationShare.objects.create(
+        user=user, latitude=fields.pop('latitude', 12.97), longitude=fields.pop('longitude', 77.59),
+        address='MG Road, Bengaluru', expires_at=fields.pop('expires_at', now + timedelta(hours=1)), **fields
+    )
+
+
+def fix(lat, lng, recorded_at, accuracy=5.0):
+    return {'latitude': lat, 'longitude': lng, 'accuracy': accuracy, 'recorded_at': recorded_at}
+
+
+class TrackCodecTests(SimpleTestCase):
+    def test_round_trip_to_micro_degrees(self):
+        points = [
+            (1_700_000_000_000, 12.9715987, 77.5945627, 4.6),
+            (1_700_000_003_000, 12.9716301, 77.5944112, None),
+            (1_699_999_999_000, -33.8688197, 151.2092955, 0),
+        ]
+        decoded = decode_track(encode_track(points))
+        self.assertEqual([point[0] for point in decoded], [point[0] for point in points])
+        for (_, lat, lng, _), (_, decoded_lat, decoded_lng, _) in zip(points, decoded):
+            self.assertAlmostEqual(lat, decoded_lat, places=6)
+            self.assertAlmostEqual(lng, decoded_lng, places=6)
+        self.assertEqual([point[3] for point in decoded], [5, None, 0])
+
+    def test_walking_fixes_stay_small(self):
+        points = [(1_700_000_000_000 + i * 3000, 12.97 + i * 1e-5, 77.59 + i * 1e-5, 5) for i in range(100)]
+        self.assertLess(len(encode_track(points)), 100 * 8)
+
+    def test_corrupt_data_is_rejected(self):
+        data = encode_track([(1_700_000_000_000, 12.97, 77.59, 5)])
+        with self.assertRaises(TrackDecodeError):
+            decode_track(data[:-2])
+        with self.assertRaises(TrackDecodeError):
+            decode_track(b'\x09' + data[1:])
+        with self.assertRaises(TrackDecodeError):
+            decode_track(b'')
+
+    def test_simplification(self):
+        straight = [(i * 1000, 12.97 + i * 1e-4, 77.59, None) for i in range(50)]
+        self.assertEqual(douglas_peucker(straight, 1), [straight[0], straight[-1]])
+
+        bucketed = time_bucket(straight, 10)
+        self.assertEqual(bucketed[0], straight[0])
+        self.assertEqual(bucketed[-1], straight[-1])
+        self.assertEqual(len(bucketed), 6)
+
+        zigzag = [(i * 1000, 12.97 + (i % 2) * 1e-3, 77.59 + i * 1e-3, None) for i in range(200)]
+        self.assertLessEqual(len(simplify_track(zigzag, tolerance_m=0, max_points=20)), 20)
+
+
+class TrackStorageTests(TestCase):
+    def test_compaction_keeps_the_track(self):
+        share = make_share(User.objects.create_user(username='walker', password='pw-12345'))
+        start = timezone.now() - timedelta(hours=1)
+        LocationPoint.objects.bulk_create([
+            LocationPoint(share=share, latitude=12.97 + i * 1e-5, longitude=77.59, accuracy=5.0,
+                          recorded_at=start + timedelta(seconds=5 * i))
+            for i in range(25)
+        ])
+        before = load_track(share.pk)
+
+        self.assertEqual(compact_share(share.pk, timezone.now(), chunk_points=10), 25)
+        self.assertEqual(LocationTrackChunk.objects.filter(share=share).count(), 3)
+        self.assertFalse(LocationPoint.objects.filter(share=share).exists())
+        after = load_track(share.pk)
+        self.assertEqual([point[0] for point in after], [point[0] for point in before])
+
+        since = start + timedelta(seconds=60)
+        self.assertEqual(load_track(share.pk, since=since)[0][0], to_ms(since))
+
+
+class FixParsingTests(SimpleTestCase):
+    def test_valid_fix(self):
+        now = timezone.now()
+        parsed = parse_fix({'lat': '12.5', 'lng': 77.5, 'accuracy': '', 'timestamp': to_ms(now)}, now)
+        self.assertEqual((parsed['latitude'], parsed['longitude'], parsed['accuracy']), (12.5, 77.5, None))
+        self.assertEqual(to_ms(parsed['recorded_at']), to_ms(now))
+
+    def test_invalid_fixes_are_rejected(self):
+        now = timezone.now()
+        for raw in (
+            [12.5, 77.5],
+            {'latitude': 91, 'longitude': 0},
+            {'latitude': 'nan', 'longitude': 0},
+            {'latitude': 1e400, 'longitude': 0},
+            {'latitude': 0, 'longitude': 0, 'timestamp': 'yesterday'},
+            {'latitude': 0, 'longitude': 0, 'timestamp': to_ms(now + timedelta(minutes=5))},
+            {'latitude': 0, 'longitude': 0, 'timestamp': 10 ** 20},
+        ):
+            with self.subTest(raw=raw), self.assertRaises(FixRejected):
+                parse_fix(raw, now)
+
+
+@mock.patch.object(LocationBuffer, '_ensure_flusher')
+class LocationBufferTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='walker', password='pw-12345')
+        self.now = timezone.now()
+
+    def test_flush_writes_points_and_newest_position(self, ensure_flusher):
+        share = make_share(self.user)
+        buffer = LocationBuffer()
+        buffer.add(share.pk, [fix(13.0, 77.0, self.now - timedelta(seconds=10)), fix(13.1, 77.1, self.now)])
+        # A resent batch is not stored twice
+        buffer.add(share.pk, [fix(13.0, 77.0, self.now - timedelta(seconds=10))])
+
+        self.assertEqual(buffer.latest(share.pk).latitude, 13.1)
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(LocationPoint.objects.filter(share=share).count(), 2)
+        share.refresh_from_db()
+        self.assertEqual(float(share.latitude), 13.1)
+        self.assertEqual(share.last_fix_at, self.now)
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_late_batch_does_not_move_a_share_back(self, ensure_flusher):
+        share = make_share(self.user, last_fix_at=self.now)
+        buffer = LocationBuffer()
+        buffer.add(share.pk, [fix(14.0, 78.0, self.now - timedelta(minutes=1))])
+        buffer.flush()
+
+        share.refresh_from_db()
+        self.assertEqual(float(share.latitude), 12.97)
+        self.assertEqual(share.last_fix_at, self.now)
+        self.assertEqual(LocationPoint.objects.filter(share=share).count(), 1)
+
+    def test_points_of_deleted_shares_are_dropped(self, ensure_flusher):
+        share = make_share(self.user)
+        buffer = LocationBuffer()
+        buffer.add(share.pk, [fix(13.0, 77.0, self.now)])
+        share.delete()
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_failed_flush_keeps_the_points(self, ensure_flusher):
+        share = make_share(self.user)
+        buffer = LocationBuffer()
+        buffer.add(share.pk, [fix(13.0, 77.0, self.now)])
+        with mock.patch.object(LocationPoint.objects, 'bulk_create', side_effect=RuntimeError('database is down')):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.flush(), 1)
+
+
+class GeofenceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='walker', password='pw-12345')
+        self.share = make_share(self.user)
+        self.fence = Geofence.objects.create(
+            user=self.user, name='Hotel', center_latitude=12.97, center_longitude=77.59, radius_m=200)
+        self.now = timezone.now()
+
+    def test_enter_and_exit(self):
+        outside, inside = (12.99, 77.59), (12.9701, 77.5901)
+        events = evaluate_fixes(self.user.pk, self.share.pk, [
+            fix(*outside, self.now),
+            fix(*inside, self.now + timedelta(seconds=10)),
+            fix(*outside, self.now + timedelta(seconds=20)),
+        ])
+        self.assertEqual([event.event_type for event in events], ['ENTER', 'EXIT'])
+        self.assertEqual(GeofenceEvent.objects.filter(geofence=self.fence).count(), 2)
+
+    def test_first_fix_only_establishes_the_side(self):
+        self.assertEqual(evaluate_fixes(self.user.pk, self.share.pk, [fix(12.9701, 77.5901, self.now)]), [])
+        self.fence.refresh_from_db()
+        self.assertTrue(self.fence.is_inside)
+
+    @override_settings(GEOFENCE_MAX_ACCURACY_M=50)
+    def test_inaccurate_fixes_are_skipped(self):
+        evaluate_fixes(self.user.pk, self.share.pk, [fix(12.99, 77.59, self.now)])
+        events = evaluate_fixes(self.user.pk, self.share.pk, [fix(12.9701, 77.5901, self.now, accuracy=500)])
+        self.assertEqual(events, [])
+
+    def test_polygon_fence(self):
+        square = Geofence.objects.create(
+            user=self.user, name='Park', shape='POLYGON', is_inside=False,
+            polygon=[[13.0, 77.0], [13.0, 77.01], [13.01, 77.01], [13.01, 77.0]])
+        events = evaluate_fixes(self.user.pk, self.share.pk, [fix(13.005, 77.005, self.now)])
+        self.assertEqual([(event.geofence_id, event.event_type) for event in events], [(square.pk, 'ENTER')])
+
+
+class ResponderIndexTests(TestCase):
+    def test_point_grid_nearest_matches_brute_force(self):
+        grid = PointGrid(0.05)
+        positions = {i: (12.5 + (i * 37 % 100) / 100, 77.0 + (i * 53 % 100) / 100) for i in range(200)}
+        for item, (lat, lng) in positions.items():
+            grid.upsert(item, lat, lng)
+        grid.upsert(0, 12.95, 77.55)
+        positions[0] = (12.95, 77.55)
+        grid.remove(1)
+        del positions[1]
+
+        expected = sorted((haversine_m(12.95, 77.55, lat, lng), item) for item, (lat, lng) in positions.items())
+        found = grid.nearest(12.95, 77.55, 5, 50_000)
+        self.assertEqual([distance for distance, _ in found], [distance for distance, _ in expected[:5]])
+        self.assertEqual(grid.nearest(12.95, 77.55, 5, 50_000, among={2, 3}),
+                         [(distance, item) for distance, item in expected if item in {2, 3} and distance <= 50_000])
+
+    @override_settings(RESPONDER_POSITION_MAX_AGE_MINUTES=60)
+    def test_stale_and_older_positions_are_ignored(self):
+        index = ResponderIndex(0.05)
+        now = timezone.now()
+        index.update(1, 12.97, 77.59, now)
+        index.update(1, 13.50, 78.00, now - timedelta(minutes=5))  # Older than the one held
+        index.update(2, 12.971, 77.591, now - timedelta(hours=2))
+        index.update(3, 12.98, 77.60, now)
+
+        self.assertEqual([user_id for _, user_id in index.nearest(12.97, 77.59, 5)], [1, 3])
+        self.assertEqual([user_id for _, user_id in index.nearest(12.97, 77.59, 5, among=[2, 3])], [3])
+        self.assertEqual(index.prune(now), 1)
+
+    def test_refresh_reads_shares(self):
+        user = User.objects.create_user(username='walker', password='pw-12345')
+        make_share(user, latitude=12.97, longitude=77.59, last_fix_at=timezone.now())
+        index = ResponderIndex(0.05)
+        index.refresh(force=True)
+        self.assertEqual([user_id for _, user_id in index.nearest(12.97, 77.59, 1)], [user.pk])
+
+
+class SOSDispatchTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='walker', password='pw-12345')
+        self.alert = SOSAlert.objects.create(user=user, latitude=12.97, longitude=77.59, address='MG Road, Bengaluru')
+        for i in range(2):
+            SOSDelivery.objects.create(alert=self.alert, recipient_name=f'Contact {i}', recipient_email=f'c{i}@example.com')
+
+    def dispatch(self, send, pool_size=2):
+        pool = ThreadPoolExecutor(max_workers=pool_size)
+        with mock.patch.object(sos_dispatch, '_get_pool', return_value=pool), \
+                mock.patch.object(sos_dispatch, '_send_with_deadline', send):
+            try:
+                return sos_dispatch.send_pending_deliveries(self.alert)
+            finally:
+                pool.shutdown()
+
+    def test_deliveries_are_recorded(self):
+        self.assertEqual(self.dispatch(lambda message, deadline: (True, 1, '')), (2, 0))
+        self.assertEqual(set(self.alert.deliveries.values_list('status', flat=True)), {'SENT'})
+        self.alert.refresh_from_db()
+        self.assertIsNotNone(self.alert.first_notified_at)
+
+    def test_failed_sends_go_to_the_queue(self):
+        self.assertEqual(self.dispatch(lambda message, deadline: (False, 3, 'Connection refused')), (0, 2))
+        self.assertEqual(set(self.alert.deliveries.values_list('status', flat=True)), {'QUEUED'})
+
+    @override_settings(SOS_DELIVERY_DEADLINE_SECONDS=-4.8)
+    def test_send_in_flight_at_the_deadline_is_not_queued_twice(self):
+        calls = []
+
+        def slow(message, deadline):
+            calls.append(message)
+            time.sleep(0.5)
+            return True, 1, ''
+
+        # One pool thread: the first send is under way when time runs out, the second never starts
+        self.assertEqual(self.dispatch(slow, pool_size=1), (1, 1))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(self.alert.deliveries.values_list('status', flat=True)), ['QUEUED', 'SENT'])
+
+
+class SOSCoalescingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='walker', password='pw-12345')
+        self.client.force_login(self.user)
+
+    def press(self):
+        return self.client.post(reverse('trigger_sos_ajax'), json.dumps({'latitude': 12.97, 'longitude': 77.59}),
+                                content_type='application/json').json()
+
+    def test_repeated_presses_return_the_same_alert(self):
+        first, second = self.press(), self.press()
+        self.assertTrue(first['success'])
+        self.assertTrue(second['coalesced'])
+        self.assertEqual(first['alert_id'], second['alert_id'])
+        self.assertEqual(SOSAlert.objects.filter(user=self.user).count(), 1)
+
+    def test_waiter_wakes_when_the_claim_finishes(self):
+        self.assertTrue(ratelimit.claim_sos_window(self.user.pk))
+        self.assertFalse(ratelimit.claim_sos_window(self.user.pk))
+
+        started = time.monotonic()
+        threading.Timer(0.2, ratelimit.finish_sos_claim, args=[self.user.pk]).start()
+        self.assertTrue(ratelimit.wait_for_sos_claim(self.user.pk, timeout=5))
+        self.assertLess(time.monotonic() - started, 2)
+        # Nothing held in this process: no wait at all
+        self.assertTrue(ratelimit.wait_for_sos_claim(self.user.pk, timeout=5))
+
+    def test_release_lets_the_next_press_raise(self):
+        self.assertTrue(ratelimit.claim_sos_window(self.user.pk))
+        ratelimit.release_sos_window(self.user.pk)
+        self.assertTrue(ratelimit.claim_sos_window(self.user.pk))
+        ratelimit.release_sos_window(self.user.pk)
+
+
+class SharedLocationEndpointTests(TestCase):
+    def setUp(self):
+        self.share = make_share(User.objects.create_user(username='walker', password='pw-12345'),
+                                last_fix_at=timezone.now())
+
+    def test_revalidated_views_are_counted(self):
+        url = reverse('view_shared_location', args=[self.share.share_id])
+        with mock.patch.object(view_counter, 'record') as record:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+        self.assertEqual(record.call_count, 2)
+
+    async def test_malformed_poll_since_is_rejected(self):
+        url = reverse('location_poll', args=[self.share.share_id])
+        for since in ('2024-13-45T10:00:00', '2024-02-30T10:00:00'):
+            response = await self.async_client.get(url, {'since': since})
+            self.assertEqual(response.status_code, 400)
+
+    def test_malformed_track_parameters_are_rejected(self):
+        url = reverse('get_location_track', args=[self.share.share_id])
+        for params in ({'since': '2024-13-45T10:00:00'}, {'tolerance': '-1'}, {'bucket': 'x'}):
+            self.assertEqual(self.client.get(url, params).status_code, 400)
@@ -0,0 +1,161 @@
+# location_sos/track_codec.py
+"""
+Compact encoding and simplification of location tracks.
+
+A track is a list of (timestamp_ms, latitude, longitude, accuracy)
+tuples, where accuracy is in meters or None. encode_track() stores it as:
+
+    version byte, point count,
+    then per point: Δtime (ms), Δlatitude, Δlongitude (micro-degrees), accuracy
+
+Every number is a varint. Deltas are zigzag-encoded so that small negative
+steps stay small too. Micro-degrees are about 0.1 m, well below GPS noise.
+Accuracy is stored as whole meters + 1, with 0 meaning unknown. A fix every
+few seconds while walking costs roughly 6-8 bytes, against a database row
+of around a hundred.
+
+simplify_track() thins a track for display. Time bucketing keeps at most
+one fix per interval, and Douglas-Peucker drops points that lie within a
+tolerance of the line through their neighbours.
+"""
+import math
+
+FORMAT_VERSION = 1
+MICRODEGREES = 1_000_000
+EARTH_RADIUS_M = 6_371_000
+
+
+class TrackDecodeError(ValueError):
+    pass
+
+
+# VARINTS
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def _write_varint(out, value):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, pos):
+    result = shift = 0
+    while True:
+        if pos >= len(data):
+            raise TrackDecodeError('truncated track data')
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+# ENCODING
+def encode_track(points):
+    """Encode (timestamp_ms, latitude, longitude, accuracy) tuples, in time order"""
+    out = bytearray([FORMAT_VERSION])
+    _write_varint(out, len(points))
+    prev_t = prev_lat = prev_lng = 0
+    for timestamp_ms, latitude, longitude, accuracy in points:
+        t = int(timestamp_ms)
+        lat = round(latitude * MICRODEGREES)
+        lng = round(longitude * MICRODEGREES)
+        _write_varint(out, _zigzag(t - prev_t))
+        _write_varint(out, _zigzag(lat - prev_lat))
+        _write_varint(out, _zigzag(lng - prev_lng))
+        _write_varint(out, 0 if accuracy is None else round(max(accuracy, 0)) + 1)
+        prev_t, prev_lat, prev_lng = t, lat, lng
+    return bytes(out)
+
+
+def decode_track(data):
+    """Inverse of encode_track; coordinates come back rounded to micro-degrees"""
+    data = bytes(data)
+    if not data or data[0] != FORMAT_VERSION:
+        raise TrackDecodeError('unknown track format')
+    count, pos = _read_varint(data, 1)
+    points = []
+    t = lat = lng = 0
+    for _ in range(count):
+        delta, pos = _read_varint(data, pos)
+        t += _unzigzag(delta)
+        delta, pos = _read_varint(data, pos)
+        lat += _unzigzag(delta)
+        delta, pos = _read_varint(data, pos)
+        lng += _unzigzag(delta)
+        accuracy, pos = _read_varint(data, pos)
+        points.append((t, lat / MICRODEGREES, lng / MICRODEGREES, accuracy - 1 if accuracy else None))
+    return points
+
+
+# SIMPLIFICATION
+def time_bucket(points, seconds):
+    """Keep the last fix of every `seconds` interval (plus the very first fix)"""
+    if seconds <= 0 or len(points) < 3:
+        return list(points)
+    width = seconds * 1000
+    kept = [points[0]]
+    for i in range(1, len(points)):
+        is_last = i == len(points) - 1
+        if is_last or points[i][0] // width != points[i + 1][0] // width:
+            kept.append(points[i])
+    return kept
+
+
+def _offset_m(origin, point):
+    """Equirectangular (x, y) in meters of point from origin; fine over track-sized spans"""
+    x = math.radians(point[2] - origin[2]) * math.cos(math.radians((point[1] + origin[1]) / 2))
+    y = math.radians(point[1] - origin[1])
+    return x * EARTH_RADIUS_M, y * EARTH_RADIUS_M
+
+
+def _distance_to_segment_m(point, start, end):
+    px, py = _offset_m(start, point)
+    ex, ey = _offset_m(start, end)
+    length_sq = ex * ex + ey * ey
+    if length_sq == 0:
+        return math.hypot(px, py)
+    t = max(0.0, min(1.0, (px * ex + py * ey) / length_sq))
+    return math.hypot(px - t * ex, py - t * ey)
+
+
+def douglas_peucker(points, tolerance_m):
+    """Drop points within tolerance_m of the simplified line (iterative, so long tracks cannot hit the recursion limit)"""
+    if tolerance_m <= 0 or len(points) < 3:
+        return list(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        farthest, max_distance = None, tolerance_m
+        for i in range(first + 1, last):
+            distance = _distance_to_segment_m(points[i], points[first], points[last])
+            if distance > max_distance:
+                farthest, max_distance = i, distance
+        if farthest is not None:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def simplify_track(points, tolerance_m=0, bucket_seconds=0, max_points=None):
+    """Bucket, then Douglas-Peucker; the tolerance doubles until the track fits max_points"""
+    points = time_bucket(points, bucket_seconds)
+    simplified = douglas_peucker(points, tolerance_m)
+    if max_points:
+        # A zero (or negative) tolerance would never grow
+        tolerance_m = max(tolerance_m, 1)
+        while len(simplified) > max_points:
+            tolerance_m *= 2
+            simplified = douglas_peucker(points, tolerance_m)
+    return simplified
@@ -16,8 +16,15 @@ urlpatterns = [
     # AJAX endpoints
     path('ajax/share-location/', views.share_location_ajax, name='share_location_ajax'),
     path('ajax/trigger-sos/', views.trigger_sos_ajax, name='trigger_sos_ajax'),
+    path('ajax/sos-alerts/<uuid:alert_id>/deliveries/', views.sos_delivery_status_ajax, name='sos_delivery_status'),
     path('ajax/safety-checkin/', views.safety_checkin_ajax, name='safety_checkin_ajax'),
+    path('ajax/safety-checkin/<int:checkin_id>/cancel-schedule/', views.cancel_checkin_schedule_ajax, name='cancel_checkin_schedule'),
     path('ajax/stop-all-shares/', views.stop_all_shares_ajax, name='stop_all_shares_ajax'),
+    path('ajax/location-shares/<uuid:share_id>/fixes/', views.ingest_location_fixes_ajax, name='ingest_location_fixes'),
+    path('ajax/geofences/', views.geofences_ajax, name='geofences_ajax'),
+    path('ajax/geofences/<int:geofence_id>/delete/', views.delete_geofence_ajax, name='delete_geofence_ajax'),
+    path('ajax/geofences/events/', views.geofence_events_ajax, name='geofence_events_ajax'),
+    path('ajax/reverse-geocode/', views.reverse_geocode_ajax, name='reverse_geocode_ajax'),
     
     # Public location view
     path('shared/<uuid:share_id>/', views.view_shared_location, name='view_shared_location'),
@@ -27,4 +34,7 @@ urlpatterns = [
     path('location-shares/<uuid:share_id>/stop/', views.stop_location_share_view, name='stop_location_share'),
 
     path('ajax/get-location/<uuid:share_id>/', views.get_location_update_ajax, name='get_location_update'),
+    path('ajax/location-shares/<uuid:share_id>/track/', views.get_location_track_ajax, name='get_location_track'),
+    path('shared/<uuid:share_id>/stream/', views.location_stream_view, name='location_stream'),
+    path('shared/<uuid:share_id>/poll/', views.location_poll_view, name='location_poll'),
 ]
\ No newline at end of file
@@ -0,0 +1,84 @@
+# location_sos/view_counts.py
+"""
+Buffered viewer analytics for public location shares.
+
+Opening a shared location used to save() the share on every view. Views
+now only bump an in-process counter. A background thread folds the
+counters into LocationShare.view_count / last_viewed_at every
+LOCATION_VIEW_COUNT_FLUSH_SECONDS, with a single UPDATE however many
+shares were viewed. Counts from the last interval are lost if the
+process dies. That is acceptable for analytics.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import LocationShare
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    def __init__(self):
+        self._counts = {}  # share pk -> [views, last viewed at]
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def record(self, share_pk):
+        now = timezone.now()
+        with self._lock:
+            entry = self._counts.setdefault(share_pk, [0, now])
+            entry[0] += 1
+            entry[1] = now
+        self._ensure_flusher()
+
+    def flush(self):
+        """Write buffered counts; returns the number of shares updated"""
+        with self._lock:
+            counts, self._counts = self._counts, {}
+        if not counts:
+            return 0
+
+        try:
+            LocationShare.objects.filter(pk__in=list(counts)).update(
+                view_count=F('view_count') + Case(
+                    *[When(pk=pk, then=Value(views)) for pk, (views, _) in counts.items()],
+                    default=Value(0), output_field=IntegerField(),
+                ),
+                last_viewed_at=Case(*[When(pk=pk, then=Value(viewed_at)) for pk, (_, viewed_at) in counts.items()]),
+            )
+        except Exception as e:
+            logger.error(f"View count flush for {len(counts)} shares failed: {str(e)}")
+            with self._lock:
+                for pk, (views, viewed_at) in counts.items():
+                    entry = self._counts.setdefault(pk, [0, viewed_at])
+                    entry[0] += views
+            return 0
+        return len(counts)
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._run_flusher, daemon=True, name='share-view-counts')
+                self._flusher.start()
+
+    def _run_flusher(self):
+        interval = getattr(settings, 'LOCATION_VIEW_COUNT_FLUSH_SECONDS', 30)
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+            finally:
+                connection.close()
+
+
+view_counter = ViewCounter()
+atexit.register(view_counter.flush)
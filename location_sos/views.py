@@ -2,15 +2,36 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.cache import patch_cache_control
+from django.urls import reverse
 from django.core.paginator import Paginator
+from django.core.exceptions import ValidationError
+from django.conf import settings
 from datetime import timedelta
+from functools import wraps
 import json
-from .models import EmergencyContact, LocationShare, SOSAlert, SafetyCheckIn
+import math
+from .models import EmergencyContact, Geofence, GeofenceEvent, LocationShare, SOSAlert, SafetyCheckIn
 from .forms import EmergencyContactForm, LocationShareForm, SOSAlertForm, SafetyCheckInForm, QuickSOSForm
-from .email_utils import send_sos_alert_email, send_location_share_email, send_safety_checkin_email, send_alert_status_update_email
+from .sos_dispatch import dispatch_sos_alert
+from .recipients import recipients_for
+from .responders import nearest_responders, record_position
+from .geocoding import reverse_geocode
+from .ratelimit import claim_sos_window, finish_sos_claim, rate_limited, release_sos_window, wait_for_sos_claim
+from .checkin_monitor import cancel_schedule, close_open_schedules, schedule_next_checkin
+from .location_ingest import active_share, forget_share, ingest_fixes, location_buffer
+from .location_tracks import from_ms, served_track
+from .track_codec import encode_track
+from .view_counts import view_counter
+from .share_cache import invalidate_share, share_etag, share_last_modified, shared_location
+from .pubsub import get_broker, publish_location, share_channel
+from .email_utils import send_location_share_email, send_safety_checkin_email, send_alert_status_update_email
 
 @login_required
 def location_dashboard_view(request):
@@ -164,6 +185,7 @@ def location_share_view(request):
 
 @csrf_exempt
 @login_required
+@rate_limited('share')
 def share_location_ajax(request):
     """Handle location sharing via AJAX"""
     if request.method == 'POST':
@@ -191,12 +213,9 @@ def share_location_ajax(request):
                 shared_with_email=shared_with_email
             )
             
-            # Get ALL emergency contacts if none specifically selected
+            # Everyone allowed to see the user's location if no one was specifically selected
             if not selected_contacts:
-                emergency_contacts = EmergencyContact.objects.filter(
-                    user=request.user, 
-                    is_active=True
-                )
+                emergency_contacts = recipients_for(request.user.pk, 'LOCATION')
             else:
                 emergency_contacts = EmergencyContact.objects.filter(
                     id__in=selected_contacts, 
@@ -204,8 +223,10 @@ def share_location_ajax(request):
                     is_active=True
                 )
             
-            # Add emergency contacts to the location share
-            location_share.shared_with_contacts.set(emergency_contacts)
+            # Add emergency contacts to the location share (trusted contacts are Nomado users, not EmergencyContacts)
+            location_share.shared_with_contacts.set(
+                [contact.contact_id for contact in emergency_contacts if contact.contact_id]
+                if not selected_contacts else emergency_contacts)
             
             # Send email notifications
             email_count = send_location_share_email(
@@ -219,9 +240,10 @@ def share_location_ajax(request):
             
             return JsonResponse({
                 'success': True,
-                'message': f'Location shared successfully! {email_count} email notifications sent.',
+                'message': f'Location shared successfully! {email_count} email notifications on their way.',
                 'share_id': str(location_share.share_id),
                 'share_url': share_url,
+                'fixes_url': reverse('ingest_location_fixes', args=[location_share.share_id]),
                 'expires_at': location_share.expires_at.strftime('%Y-%m-%d %H:%M:%S'),
                 'emails_sent': email_count
             })
@@ -234,6 +256,40 @@ def share_location_ajax(request):
     
     return JsonResponse({'success': False, 'message': 'Invalid request'})
 
+@csrf_exempt
+@login_required
+def ingest_location_fixes_ajax(request, share_id):
+    """Accept a batch of GPS fixes for one of the user's active shares"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Invalid request'}, status=405)
+    
+    share = active_share(share_id, request.user.pk)
+    if share is None:
+        return JsonResponse({'success': False, 'message': 'Location share is not active'}, status=404)
+    
+    try:
+        data = json.loads(request.body)
+        fixes = data['fixes'] if isinstance(data, dict) else data
+        if not isinstance(fixes, list):
+            raise ValueError('fixes must be a list')
+    except (ValueError, KeyError) as e:
+        return JsonResponse({'success': False, 'message': f'Invalid payload: {str(e)}'}, status=400)
+    
+    share_pk, created_at, expires_at = share
+    accepted, rejected, newest = ingest_fixes(
+        share_pk, fixes, not_before=created_at - timedelta(minutes=5), user_id=request.user.pk)
+    if newest:
+        invalidate_share(share_id)
+        publish_location(share_id, _position_event(
+            newest['latitude'], newest['longitude'], newest['accuracy'], newest['recorded_at'],
+        ))
+    return JsonResponse({
+        'success': True,
+        'accepted': accepted,
+        'rejected': rejected,
+        'expires_at': expires_at.isoformat(),
+    })
+
 @csrf_exempt
 @login_required
 def stop_all_shares_ajax(request):
@@ -247,8 +303,12 @@ def stop_all_shares_ajax(request):
                 expires_at__gt=timezone.now()
             )
             
-            stopped_count = active_shares.count()
-            active_shares.update(status='STOPPED')
+            share_ids = list(active_shares.values_list('share_id', flat=True))
+            stopped_count = active_shares.update(status='STOPPED')
+            for share_id in share_ids:
+                forget_share(share_id)
+                invalidate_share(share_id)
+                publish_location(share_id, {'type': 'end', 'status': 'STOPPED'})
             
             return JsonResponse({
                 'success': True,
@@ -264,11 +324,29 @@ def stop_all_shares_ajax(request):
     
     return JsonResponse({'success': False, 'message': 'Invalid request'})
 
+def _recent_sos_alert(user):
+    """The user's active SOS alert raised within the coalescing window, if any"""
+    since = timezone.now() - timedelta(seconds=getattr(settings, 'SOS_COALESCE_SECONDS', 60))
+    return SOSAlert.objects.filter(user=user, status='ACTIVE', created_at__gte=since).order_by('-created_at').first()
+
+def _coalesced_sos_response(sos_alert):
+    queued = sos_alert.deliveries.count()
+    return JsonResponse({
+        'success': True,
+        'coalesced': True,
+        'message': f'SOS alert already raised! Your {queued} contacts are being notified.',
+        'alert_id': str(sos_alert.alert_id),
+        'contacts_count': queued,
+        'status_url': reverse('sos_delivery_status', args=[sos_alert.alert_id]),
+    })
+
 @csrf_exempt
 @login_required
+@rate_limited('sos')
 def trigger_sos_ajax(request):
     """Handle SOS alert via AJAX"""
     if request.method == 'POST':
+        claimed = False
         try:
             data = json.loads(request.body)
             latitude = float(data.get('latitude'))
@@ -277,6 +355,19 @@ def trigger_sos_ajax(request):
             alert_type = data.get('alert_type', 'EMERGENCY')
             message = data.get('message', '')
             
+            # Repeated presses and client retries fold into the alert already raised
+            existing = _recent_sos_alert(request.user)
+            if existing is not None:
+                return _coalesced_sos_response(existing)
+            claimed = claim_sos_window(request.user.pk)
+            if not claimed:
+                # A concurrent press is raising it; hand back its alert once it exists
+                wait_for_sos_claim(request.user.pk, timeout=2)
+                existing = _recent_sos_alert(request.user)
+                if existing is not None:
+                    return _coalesced_sos_response(existing)
+                # Never drop an SOS: if the other press produced nothing, raise this one
+            
             # Create SOS alert
             sos_alert = SOSAlert.objects.create(
                 user=request.user,
@@ -287,24 +378,31 @@ def trigger_sos_ajax(request):
                 message=message
             )
             
-            # Get emergency contacts
-            emergency_contacts = EmergencyContact.objects.filter(
-                user=request.user, 
-                is_active=True
-            )
+            # Emergency contacts and willing trusted contacts, usually straight from the cache
+            recipients = recipients_for(request.user.pk, 'SOS')
             
-            # Send email notifications
-            email_count = send_sos_alert_email(sos_alert, emergency_contacts)
+            # Trusted contacts close to the alert are notified ahead of everyone else
+            responders = nearest_responders(request.user, latitude, longitude)
+            
+            # Acknowledge now; contacts are notified concurrently in the background
+            queued = dispatch_sos_alert(sos_alert, recipients, responders=responders)
+            if claimed:
+                finish_sos_claim(request.user.pk)
             
             return JsonResponse({
                 'success': True,
-                'message': f'SOS alert sent successfully! {email_count} emergency contacts notified via email.',
+                'message': (f'SOS alert raised! Notifying {queued} contacts by email now, '
+                            f'starting with {len(responders)} trusted contacts nearby.' if responders
+                            else f'SOS alert raised! Notifying {queued} contacts by email now.'),
                 'alert_id': str(sos_alert.alert_id),
-                'contacts_count': emergency_contacts.count(),
-                'emails_sent': email_count
+                'contacts_count': queued,
+                'responders_count': len(responders),
+                'status_url': reverse('sos_delivery_status', args=[sos_alert.alert_id]),
             })
             
         except Exception as e:
+            if claimed:
+                release_sos_window(request.user.pk)
             return JsonResponse({
                 'success': False,
                 'message': f'Error sending SOS alert: {str(e)}'
@@ -312,8 +410,25 @@ def trigger_sos_ajax(request):
     
     return JsonResponse({'success': False, 'message': 'Invalid request'})
 
+@login_required
+def sos_delivery_status_ajax(request, alert_id):
+    """Per-recipient delivery status of an SOS alert"""
+    sos_alert = get_object_or_404(SOSAlert, alert_id=alert_id, user=request.user)
+    deliveries = sos_alert.deliveries.values('recipient_name', 'recipient_email', 'distance_m', 'status', 'attempts', 'sent_at')
+    
+    return JsonResponse({
+        'success': True,
+        'alert_id': str(sos_alert.alert_id),
+        'time_to_first_notification': sos_alert.time_to_first_notification,
+        'deliveries': [
+            {**delivery, 'sent_at': delivery['sent_at'].isoformat() if delivery['sent_at'] else None}
+            for delivery in deliveries
+        ],
+    })
+
 @csrf_exempt
 @login_required
+@rate_limited('checkin')
 def safety_checkin_ajax(request):
     """Handle safety check-in via AJAX"""
     if request.method == 'POST':
@@ -324,6 +439,13 @@ def safety_checkin_ajax(request):
             address = data.get('address', '')
             status = data.get('status', 'SAFE')
             message = data.get('message', '')
+            next_checkin_minutes = data.get('next_checkin_minutes')
+            if next_checkin_minutes not in (None, ''):
+                next_checkin_minutes = int(next_checkin_minutes)
+                min_minutes = getattr(settings, 'CHECKIN_MIN_INTERVAL_MINUTES', 5)
+                max_minutes = getattr(settings, 'CHECKIN_MAX_INTERVAL_MINUTES', 24 * 60)
+                if not min_minutes <= next_checkin_minutes <= max_minutes:
+                    raise ValueError(f'next check-in must be between {min_minutes} and {max_minutes} minutes away')
             
             # Create safety check-in
             checkin = SafetyCheckIn.objects.create(
@@ -335,6 +457,13 @@ def safety_checkin_ajax(request):
                 message=message
             )
             
+            record_position(request.user.pk, latitude, longitude, checkin.created_at)
+            
+            # This check-in satisfies any schedule still open, and may open the next one
+            close_open_schedules(request.user, exclude_pk=checkin.pk)
+            if next_checkin_minutes:
+                schedule_next_checkin(checkin, checkin.created_at + timedelta(minutes=next_checkin_minutes))
+            
             # If status is EMERGENCY or CONCERN, create SOS alert and send notifications
             email_count = 0
             if status in ['EMERGENCY', 'CONCERN']:
@@ -352,18 +481,15 @@ def safety_checkin_ajax(request):
                     )
                 
                 # Send check-in email notifications
-                emergency_contacts = EmergencyContact.objects.filter(
-                    user=request.user, 
-                    is_active=True
-                )
-                email_count = send_safety_checkin_email(checkin, emergency_contacts)
+                email_count = send_safety_checkin_email(checkin, recipients_for(request.user.pk, 'CHECKIN'))
             
             return JsonResponse({
                 'success': True,
-                'message': f'Safety check-in recorded successfully! {email_count} notifications sent.' if email_count > 0 else 'Safety check-in recorded successfully!',
+                'message': f'Safety check-in recorded successfully! {email_count} notifications on their way.' if email_count > 0 else 'Safety check-in recorded successfully!',
                 'status': status,
                 'created_at': checkin.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                'emails_sent': email_count
+                'emails_sent': email_count,
+                'next_checkin_due': checkin.next_checkin_due.isoformat() if checkin.next_checkin_due else None,
             })
             
         except Exception as e:
@@ -374,6 +500,18 @@ def safety_checkin_ajax(request):
     
     return JsonResponse({'success': False, 'message': 'Invalid request'})
 
+@csrf_exempt
+@login_required
+def cancel_checkin_schedule_ajax(request, checkin_id):
+    """Stop expecting the next check-in of a scheduled check-in"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Invalid request'}, status=405)
+    
+    checkin = get_object_or_404(SafetyCheckIn, pk=checkin_id, user=request.user)
+    if not cancel_schedule(checkin):
+        return JsonResponse({'success': False, 'message': 'This check-in has no open schedule'})
+    return JsonResponse({'success': True, 'message': 'Scheduled check-in cancelled'})
+
 @login_required
 def sos_alerts_view(request):
     """View SOS alerts history"""
@@ -404,18 +542,14 @@ def update_sos_status_view(request, alert_id):
                 alert.resolved_at = timezone.now()
             alert.save()
             
-            # Send status update email to emergency contacts
-            emergency_contacts = EmergencyContact.objects.filter(
-                user=request.user, 
-                is_active=True
-            )
+            # Send status update email to everyone who got the alert
             email_count = send_alert_status_update_email(
                 alert, 
-                emergency_contacts, 
+                recipients_for(request.user.pk, 'SOS'), 
                 updated_by=request.user
             )
             
-            messages.success(request, f'SOS alert marked as {status.lower().replace("_", " ")}. {email_count} notifications sent.')
+            messages.success(request, f'SOS alert marked as {status.lower().replace("_", " ")}. {email_count} notifications on their way.')
     
     return redirect('sos_alerts')
 
@@ -437,37 +571,47 @@ def safety_checkin_view(request):
     }
     return render(request, 'location_sos/safety_checkin.html', context)
 
+def _public_cache_headers(response):
+    # Shared caches may hold these briefly; after that clients revalidate with the ETag
+    max_age = getattr(settings, 'LOCATION_VIEW_CACHE_SECONDS', 10)
+    patch_cache_control(response, public=True, max_age=max_age, s_maxage=max_age)
+    return response
+
+def _counts_share_views(view):
+    # Outside @condition, so a 304 revalidation still counts as a view
+    @wraps(view)
+    def wrapper(request, share_id):
+        snapshot = shared_location(share_id)
+        if snapshot is not None and snapshot.is_live:
+            view_counter.record(snapshot.share.pk)
+        return view(request, share_id)
+    return wrapper
+
+@_counts_share_views
+@condition(etag_func=share_etag, last_modified_func=share_last_modified)
 def view_shared_location(request, share_id):
-    """Public view for shared location"""
-    try:
-        location_share = get_object_or_404(LocationShare, share_id=share_id)
-        
-        # Check if location sharing has expired
-        if location_share.expires_at < timezone.now():
-            location_share.status = 'EXPIRED'
-            location_share.save()
-            context = {
-                'expired': True,
-                'user_name': location_share.user.get_full_name() or location_share.user.username
-            }
-            return render(request, 'location_sos/view_shared_location.html', context)
-        
-        # Update last accessed time
-        location_share.last_updated = timezone.now()
-        location_share.save()
-        
+    """Public view for shared location (read-only: expiry is swept by expire_location_shares)"""
+    snapshot = shared_location(share_id)
+    if snapshot is None:
         context = {
-            'location_share': location_share,
-            'user_name': location_share.user.get_full_name() or location_share.user.username,
-            'time_remaining': (location_share.expires_at - timezone.now()).total_seconds() / 3600,  # hours
+            'not_found': True
         }
         return render(request, 'location_sos/view_shared_location.html', context)
-        
-    except LocationShare.DoesNotExist:
+    
+    if not snapshot.is_live:
         context = {
-            'not_found': True
+            'expired': True,
+            'user_name': snapshot.user_name
         }
-        return render(request, 'location_sos/view_shared_location.html', context)
+        return _public_cache_headers(render(request, 'location_sos/view_shared_location.html', context))
+    
+    location_share = snapshot.share
+    context = {
+        'location_share': location_share,
+        'user_name': snapshot.user_name,
+        'time_remaining': (location_share.expires_at - timezone.now()).total_seconds() / 3600,  # hours
+    }
+    return _public_cache_headers(render(request, 'location_sos/view_shared_location.html', context))
 
 @login_required
 def my_location_shares_view(request):
@@ -504,6 +648,9 @@ def stop_location_share_view(request, share_id):
     if request.method == 'POST':
         location_share.status = 'STOPPED'
         location_share.save()
+        forget_share(location_share.share_id)
+        invalidate_share(location_share.share_id)
+        publish_location(location_share.share_id, {'type': 'end', 'status': 'STOPPED'})
         messages.success(request, 'Location sharing stopped successfully!')
     
     return redirect('location_dashboard')
@@ -531,6 +678,7 @@ def safety_checkin_history_view(request):
     return render(request, 'location_sos/checkin_history.html', context)
 
 @login_required
+@rate_limited('contact_test', json_response=False)
 def emergency_contact_test_view(request, contact_id):
     """Test emergency contact (send test email)"""
     contact = get_object_or_404(EmergencyContact, id=contact_id, user=request.user, is_active=True)
@@ -573,22 +721,247 @@ Nomado Travel Safety Team"""
     return redirect('emergency_contacts')
 
 @csrf_exempt
+@condition(etag_func=share_etag, last_modified_func=share_last_modified)
 def get_location_update_ajax(request, share_id):
     """Get updated location for a share"""
+    snapshot = shared_location(share_id)
+    if snapshot is None:
+        return JsonResponse({'success': False, 'not_found': True})
+    
+    if not snapshot.is_live:
+        return _public_cache_headers(JsonResponse({'success': False, 'expired': True}))
+    return _public_cache_headers(HttpResponse(snapshot.update_payload(), content_type='application/json'))
+
+@csrf_exempt
+def get_location_track_ajax(request, share_id):
+    """Simplified track of a share; ?format=binary returns it track_codec-encoded"""
+    location_share = get_object_or_404(LocationShare, share_id=share_id)
+    if not location_share.is_live:
+        return JsonResponse({'success': False, 'expired': True})
+    
     try:
-        location_share = get_object_or_404(LocationShare, share_id=share_id)
-        
-        # Check if expired
-        if location_share.expires_at < timezone.now():
-            return JsonResponse({'success': False, 'expired': True})
-            
-        return JsonResponse({
-            'success': True,
-            'latitude': float(location_share.latitude),
-            'longitude': float(location_share.longitude),
-            'address': location_share.address,
-            'last_updated': location_share.last_updated.strftime('%H:%M:%S')
-        })
-        
-    except LocationShare.DoesNotExist:
-        return JsonResponse({'success': False, 'not_found': True})
\ No newline at end of file
+        since = parse_datetime(request.GET['since']) if request.GET.get('since') else None
+        if since is not None and timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        tolerance = float(request.GET['tolerance']) if request.GET.get('tolerance') else None
+        bucket = int(request.GET.get('bucket') or 0)
+        if tolerance is not None and not (math.isfinite(tolerance) and tolerance > 0):
+            raise ValueError('tolerance must be a positive number of metres')
+        if bucket < 0:
+            raise ValueError('bucket must not be negative')
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': f'Invalid parameter: {str(e)}'}, status=400)
+    
+    points, raw_count = served_track(location_share.pk, since=since, tolerance_m=tolerance, bucket_seconds=bucket)
+    if request.GET.get('format') == 'binary':
+        response = HttpResponse(encode_track(points), content_type='application/octet-stream')
+        response['X-Track-Raw-Points'] = raw_count
+        return response
+    return JsonResponse({
+        'success': True,
+        'raw_points': raw_count,
+        # [timestamp_ms, latitude, longitude]
+        'points': [[timestamp_ms, round(lat, 6), round(lng, 6)] for timestamp_ms, lat, lng, _ in points],
+        'last_point_at': from_ms(points[-1][0]).isoformat() if points else None,
+    })
+
+def _geofence_json(geofence):
+    return {
+        'id': geofence.pk,
+        'name': geofence.name,
+        'shape': geofence.shape,
+        'notify_on': geofence.notify_on,
+        'center': [geofence.center_latitude, geofence.center_longitude] if geofence.shape == 'CIRCLE' else None,
+        'radius_m': geofence.radius_m,
+        'polygon': geofence.polygon,
+        'hotel_id': geofence.hotel_id,
+        'route_id': geofence.route_id,
+        'is_inside': geofence.is_inside,
+        'is_active': geofence.is_active,
+    }
+
+@csrf_exempt
+@login_required
+def geofences_ajax(request):
+    """List the user's geofences (GET) or create one (POST, JSON)"""
+    if request.method == 'GET':
+        geofences = Geofence.objects.filter(user=request.user)
+        return JsonResponse({'success': True, 'geofences': [_geofence_json(geofence) for geofence in geofences]})
+    
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Invalid request'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
+        center = data.get('center') or [None, None]
+        geofence = Geofence(
+            user=request.user,
+            name=str(data.get('name', '')).strip()[:100],
+            shape=data.get('shape', 'CIRCLE'),
+            notify_on=data.get('notify_on', 'BOTH'),
+            center_latitude=center[0],
+            center_longitude=center[1],
+            radius_m=data.get('radius_m'),
+            polygon=data.get('polygon'),
+            hotel_id=data.get('hotel_id'),
+            route_id=data.get('route_id'),
+        )
+        geofence.full_clean()
+        geofence.save()
+    except (ValueError, TypeError, IndexError) as e:
+        return JsonResponse({'success': False, 'message': f'Invalid payload: {str(e)}'}, status=400)
+    except ValidationError as e:
+        return JsonResponse({'success': False, 'message': ' '.join(e.messages)}, status=400)
+    
+    return JsonResponse({'success': True, 'geofence': _geofence_json(geofence)}, status=201)
+
+@csrf_exempt
+@login_required
+def delete_geofence_ajax(request, geofence_id):
+    """Delete one of the user's geofences"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Invalid request'}, status=405)
+    
+    geofence = get_object_or_404(Geofence, pk=geofence_id, user=request.user)
+    geofence.delete()
+    return JsonResponse({'success': True})
+
+@login_required
+def geofence_events_ajax(request):
+    """Recent arrivals and departures across the user's geofences"""
+    events = GeofenceEvent.objects.filter(geofence__user=request.user).select_related('geofence')[:50]
+    return JsonResponse({
+        'success': True,
+        'events': [{
+            'geofence_id': event.geofence_id,
+            'geofence': event.geofence.name,
+            'event_type': event.event_type,
+            'latitude': event.latitude,
+            'longitude': event.longitude,
+            'occurred_at': event.occurred_at.isoformat(),
+            'emails_sent': event.emails_sent,
+        } for event in events],
+    })
+
+@login_required
+def reverse_geocode_ajax(request):
+    """Address for the browser's coordinates, from the offline gazetteer"""
+    try:
+        latitude = float(request.GET.get('lat'))
+        longitude = float(request.GET.get('lng'))
+    except (TypeError, ValueError):
+        return JsonResponse({'success': False, 'message': 'lat and lng are required'}, status=400)
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return JsonResponse({'success': False, 'message': 'Coordinates out of range'}, status=400)
+    return JsonResponse({'success': True, 'address': reverse_geocode(latitude, longitude)})
+
+# LIVE PUSH (async; stream properly only when served over ASGI)
+def _position_event(latitude, longitude, accuracy, recorded_at):
+    return {
+        'type': 'position',
+        'latitude': float(latitude),
+        'longitude': float(longitude),
+        'accuracy': accuracy,
+        'recorded_at': recorded_at.isoformat() if recorded_at else None,
+    }
+
+
+async def _share_snapshot(share_id):
+    """Current state of a share, including a newer fix still in this process's ingest buffer"""
+    share = await LocationShare.objects.filter(share_id=share_id).values(
+        'pk', 'status', 'expires_at', 'latitude', 'longitude', 'accuracy', 'last_fix_at').afirst()
+    if share is None:
+        return None
+    buffered = location_buffer.latest(share['pk'])
+    if buffered is not None and (share['last_fix_at'] is None or buffered.recorded_at > share['last_fix_at']):
+        share.update(latitude=buffered.latitude, longitude=buffered.longitude,
+                     accuracy=buffered.accuracy, last_fix_at=buffered.recorded_at)
+    return share
+
+
+def _share_ended(share):
+    if share['status'] != 'ACTIVE':
+        return {'type': 'end', 'status': share['status']}
+    if share['expires_at'] <= timezone.now():
+        return {'type': 'end', 'status': 'EXPIRED'}
+    return None
+
+
+def _sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def _location_events(share_id, subscription):
+    keepalive = getattr(settings, 'LOCATION_STREAM_KEEPALIVE_SECONDS', 15)
+    max_seconds = getattr(settings, 'LOCATION_STREAM_MAX_SECONDS', 300)
+    async with subscription:
+        # Subscribed before reading the snapshot, so no fix falls in between
+        share = await _share_snapshot(share_id)
+        ended = _share_ended(share) if share else {'type': 'end', 'status': 'NOT_FOUND'}
+        if ended:
+            yield _sse(ended)
+            return
+
+        yield f"retry: {keepalive * 1000}\n"
+        yield _sse(_position_event(share['latitude'], share['longitude'], share['accuracy'], share['last_fix_at']))
+
+        # Close at expiry, or after max_seconds so EventSource reconnects and re-checks the share
+        stream_until = min(share['expires_at'], timezone.now() + timedelta(seconds=max_seconds))
+        while True:
+            remaining = (stream_until - timezone.now()).total_seconds()
+            if remaining <= 0:
+                if stream_until >= share['expires_at']:
+                    yield _sse({'type': 'end', 'status': 'EXPIRED'})
+                return
+            event = await subscription.get(timeout=min(keepalive, remaining))
+            if event is None:
+                yield ': keepalive\n\n'
+                continue
+            yield _sse(event)
+            if event['type'] == 'end':
+                return
+
+
+async def location_stream_view(request, share_id):
+    """Server-Sent Events stream of a shared location: one event per new fix"""
+    if not isinstance(request, ASGIRequest):
+        # A WSGI server would buffer the whole stream; the page long-polls instead
+        return JsonResponse({'success': False, 'message': 'Streaming needs an ASGI server'}, status=503)
+    response = StreamingHttpResponse(
+        _location_events(share_id, get_broker().subscribe(share_channel(share_id))),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx holding events back
+    return response
+
+
+async def location_poll_view(request, share_id):
+    """Long-poll fallback: answers as soon as there is a fix newer than ?since=, or after a timeout"""
+    try:
+        since = parse_datetime(request.GET['since']) if request.GET.get('since') else None
+        if since is not None and timezone.is_naive(since):
+            since = timezone.make_aware(since)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': f'Invalid parameter: {str(e)}'}, status=400)
+    timeout = getattr(settings, 'LOCATION_LONGPOLL_TIMEOUT_SECONDS', 25)
+
+    async with get_broker().subscribe(share_channel(share_id)) as subscription:
+        share = await _share_snapshot(share_id)
+        if share is None:
+            return JsonResponse({'success': False, 'not_found': True}, status=404)
+        ended = _share_ended(share)
+        if ended:
+            return JsonResponse({'success': False, 'ended': True, 'status': ended['status']})
+
+        if since is None or (share['last_fix_at'] and share['last_fix_at'] > since):
+            event = _position_event(share['latitude'], share['longitude'], share['accuracy'], share['last_fix_at'])
+        else:
+            remaining = (share['expires_at'] - timezone.now()).total_seconds()
+            event = await subscription.get(timeout=min(timeout, remaining))
+
+    if event is None:
+        return JsonResponse({'success': True, 'changed': False})
+    if event['type'] == 'end':
+        return JsonResponse({'success': False, 'ended': True, 'status': event['status']})
+    return JsonResponse({'success': True, 'changed': True, **event})
@@ -3,6 +3,14 @@ ASGI config for nomado_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server (e.g. ``uvicorn nomado_project.asgi:application``)
+so the live location stream (location_sos.views.location_stream_view) holds
+an open connection per viewer without a thread each. Under WSGI the stream
+is buffered, and viewers fall back to long-polling.
+
+The default LOCATION_PUBSUB_BROKER delivers within one process only. Run a
+single ASGI worker process, or configure a shared broker.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -140,6 +140,130 @@ AUTH_USER_MODEL = 'user_management.CustomUser'
 RAZORPAY_KEY_ID = 'rzp_test_1DP5mmOlF5G5ag'  # Replace with your Razorpay Key ID
 RAZORPAY_KEY_SECRET = 'thisissecretkeytest123456'    # Replace with your Razorpay Key Secret
 
+# Webhook secret configured in the Razorpay dashboard (Settings > Webhooks)
+RAZORPAY_WEBHOOK_SECRET = 'nomado_webhook_secret_test'
+
+# 'local' uses the bundled gateway simulator to deliver signed webhooks for
+# checkout callbacks; 'razorpay' waits for the real gateway webhook.
+# 'local' is ignored unless DEBUG is on.
+PAYMENT_GATEWAY_MODE = 'local' if DEBUG else 'razorpay'
+
+# Webhook worker settings
+PAYMENT_WEBHOOK_BATCH_SIZE = 100
+PAYMENT_WEBHOOK_MAX_ATTEMPTS = 5
+PAYMENT_WEBHOOK_CLAIM_TIMEOUT_SECONDS = 300  # Events left in PROCESSING longer than this go back to PENDING
+PAYMENT_WEBHOOK_INLINE_WORKER = DEBUG  # Drain events in a background thread (no separate worker needed in dev)
+
+# Post-payment outbox (receipts, invoices, provider notifications, earnings)
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_WORKERS = 4
+OUTBOX_MAX_ATTEMPTS = 6
+OUTBOX_RETRY_BASE_SECONDS = 30
+OUTBOX_CLAIM_TIMEOUT_SECONDS = 300  # Messages left in PROCESSING longer than this go back to PENDING
+OUTBOX_INLINE_WORKER = DEBUG
+
+# Refund worker
+REFUND_BATCH_SIZE = 100
+REFUND_MAX_WORKERS = 8  # Concurrent gateway refund calls
+REFUND_MAX_ATTEMPTS = 5
+REFUND_RETRY_BASE_SECONDS = 60
+REFUND_CLAIM_TIMEOUT_SECONDS = 900  # Refunds left in PROCESSING longer than this are retried
+REFUND_INLINE_WORKER = DEBUG
+
+# SOS fan-out (location_sos.sos_dispatch)
+SOS_DISPATCH_MAX_WORKERS = 16  # Concurrent SMTP sessions across all alerts
+SOS_DELIVERY_DEADLINE_SECONDS = 30  # Per recipient, including retries
+SOS_DELIVERY_MAX_ATTEMPTS = 3
+SOS_DELIVERY_RETRY_SECONDS = 1.0  # Doubles per attempt
+SOS_FIRST_NOTIFICATION_TARGET_SECONDS = 1.0
+
+# Live location ingestion (location_sos.location_ingest)
+LOCATION_BUFFER_FLUSH_SECONDS = 2.0
+LOCATION_BUFFER_MAX_POINTS = 5000  # Flush early once this many fixes are buffered
+LOCATION_INGEST_MAX_BATCH = 500  # Fixes accepted per request
+LOCATION_SHARE_CACHE_SECONDS = 15
+
+# Location track storage (location_sos.location_tracks)
+LOCATION_TRACK_COMPACT_AFTER_SECONDS = 600  # Fixes older than this move into encoded chunks
+LOCATION_TRACK_CHUNK_POINTS = 2000
+LOCATION_TRACK_SIMPLIFY_METERS = 10  # Douglas-Peucker tolerance for served tracks
+LOCATION_TRACK_MAX_SERVED_POINTS = 1000
+
+# Public share pages (location_sos.view_counts, location_sos.share_cache)
+LOCATION_VIEW_COUNT_FLUSH_SECONDS = 30
+LOCATION_VIEW_CACHE_SECONDS = 10  # Cache-Control max-age (browsers and shared caches) of the public page and position endpoint
+LOCATION_SHARE_PAYLOAD_CACHE_SIZE = 10000  # Shares kept in the in-process LRU (location_sos.share_cache)
+LOCATION_SHARE_PAYLOAD_CACHE_SECONDS = 5
+
+# Geofences (location_sos.geofencing)
+GEOFENCE_GRID_DEGREES = 0.01  # Grid cell size, about 1.1 km north-south
+GEOFENCE_INDEX_CACHE_SECONDS = 60
+GEOFENCE_MAX_ACCURACY_M = 100  # Less accurate fixes are not evaluated
+
+# Missed check-in monitor (location_sos.checkin_monitor)
+CHECKIN_ESCALATION_GRACE_MINUTES = 15  # Between the reminder and the SOS to contacts
+CHECKIN_MONITOR_REFRESH_SECONDS = 5  # How often the monitor picks up schedule changes
+CHECKIN_MIN_INTERVAL_MINUTES = 5
+CHECKIN_MAX_INTERVAL_MINUTES = 24 * 60
+
+# Nearest responders to an SOS (location_sos.responders)
+RESPONDER_GRID_DEGREES = 0.05  # About 5 km cells
+RESPONDER_POSITION_MAX_AGE_MINUTES = 60  # Older positions are not trusted for proximity
+RESPONDER_INDEX_REFRESH_SECONDS = 30
+RESPONDER_MAX_DISTANCE_KM = 50
+RESPONDER_NOTIFY_FIRST = 5  # Nearest trusted contacts notified ahead of the emergency contacts
+
+# Offline reverse geocoding (location_sos.geocoding)
+GEOCODER_GAZETTEER_PATH = BASE_DIR / 'location_sos' / 'data' / 'gazetteer.csv'  # Swap in a larger export for finer results
+GEOCODER_GRID_DEGREES = 0.5
+GEOCODER_MAX_DISTANCE_KM = 100  # Further than this from any known place gives no address
+GEOCODER_LOCALITY_RADIUS_KM = 5  # Within this of a place the address is just the place
+GEOCODER_KEY_DECIMALS = 3  # Cache key precision, about 100 m
+GEOCODER_CACHE_SIZE = 50000
+GEOCODER_CACHE_SECONDS = 3600
+GEOCODER_FLUSH_SECONDS = 30
+
+# Rate limits on the safety and sharing endpoints (location_sos.ratelimit)
+RATELIMIT_CACHE = 'default'  # Per process with the default local-memory cache; use a shared cache to limit globally
+RATELIMIT_TRUST_X_FORWARDED_FOR = False  # Only behind a proxy that sets it
+RATELIMITS = {
+    # Token bucket per user and per client IP
+    'sos': {'user': {'rate_per_minute': 6, 'burst': 5}, 'ip': {'rate_per_minute': 30, 'burst': 20}},
+    'share': {'user': {'rate_per_minute': 10, 'burst': 5}, 'ip': {'rate_per_minute': 30, 'burst': 15}},
+    'checkin': {'user': {'rate_per_minute': 10, 'burst': 5}, 'ip': {'rate_per_minute': 30, 'burst': 15}},
+    'contact_test': {'user': {'rate_per_minute': 2, 'burst': 3}, 'ip': {'rate_per_minute': 10, 'burst': 5}},
+}
+SOS_COALESCE_SECONDS = 60  # Further SOS presses within this window return the alert already raised
+
+# Notification recipient sets (location_sos.recipients)
+RECIPIENTS_CACHE = 'default'  # Use a shared cache with several processes so contact changes reach all of them
+RECIPIENTS_CACHE_SECONDS = 600  # Backstop; contact changes invalidate at once
+
+# Live location push to viewers (location_sos.pubsub)
+# LocalBroker only reaches viewers in the same process; run one ASGI process or plug in a shared broker
+LOCATION_PUBSUB_BROKER = 'location_sos.pubsub.LocalBroker'
+LOCATION_STREAM_KEEPALIVE_SECONDS = 15
+LOCATION_STREAM_MAX_SECONDS = 300  # EventSource reconnects by itself after this
+LOCATION_LONGPOLL_TIMEOUT_SECONDS = 25
+
+# Notification queue (location_sos.notification_queue)
+NOTIFICATION_BATCH_SIZE = 100
+NOTIFICATION_MAX_WORKERS = 4  # Concurrent SMTP connections per worker
+NOTIFICATION_MAX_ATTEMPTS = 8  # Then the row moves to the dead-letter table
+NOTIFICATION_RETRY_BASE_SECONDS = 30
+NOTIFICATION_RETRY_MAX_SECONDS = 3600
+NOTIFICATION_CLAIM_TIMEOUT_SECONDS = 300
+NOTIFICATION_SENT_RETENTION_DAYS = 7
+NOTIFICATION_INLINE_WORKER = DEBUG
+NOTIFICATION_PROVIDERS = {
+    # Token bucket per provider; keeps well inside Gmail's sending limits
+    'smtp': {'rate_per_minute': 60, 'burst': 20},
+}
+
+# Tax engine (rates live in payment_management.TaxRule)
+TAX_RULES_CACHE_SECONDS = 300
+TAX_DEFAULT_RATE = '18.00'  # Used only when no rule matches
+
 # For testing, you can use these test keys:
 # RAZORPAY_KEY_ID = 'rzp_test_1DP5mmOlF5G5ag'
 # RAZORPAY_KEY_SECRET = 'thisissecretkeytest123456'
@@ -152,4 +276,6 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = 'abhijithshaibinu001@gmail.com'
 EMAIL_HOST_PASSWORD = 'yzmn swpe vzbi arwt'  # Use App Password, not regular password
 DEFAULT_FROM_EMAIL = 'Nomado Travel <abhijithshaibinu001@gmail.com>'  # Fixed syntax error
-SERVER_EMAIL = 'abhijithshaibinu001@gmail.com'
\ No newline at end of file
+SERVER_EMAIL = 'abhijithshaibinu001@gmail.com'
+EMAIL_TIMEOUT = 10  # Seconds per SMTP operation, so one stalled server cannot hang a fan-out
+MAIL_MAX_RECONNECTS = 2  # Per batch, see location_sos.mail_transport
\ No newline at end of file
@@ -1,3 +1,62 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db import transaction
+from django.db.models import ProtectedError
+from django.http import HttpResponseRedirect
+from .models import LedgerAccount, LedgerEntry, TaxRule
 
-# Register your models here.
+
+class LedgerProtectedDeleteMixin:
+    """
+    For admins of models the ledger references with PROTECT (users,
+    providers). The delete confirmation already lists ledger rows as
+    protected; this turns a delete that still hits one (a posting made
+    after the confirmation page) into an error message instead of a 500.
+    """
+    protected_delete_message = 'Cannot delete: it has ledger postings, which are kept permanently. Deactivate it instead.'
+
+    def delete_view(self, request, object_id, extra_context=None):
+        try:
+            return super().delete_view(request, object_id, extra_context)
+        except ProtectedError:
+            self.message_user(request, self.protected_delete_message, messages.ERROR)
+            return HttpResponseRedirect(request.path)
+
+    def response_action(self, request, queryset):
+        try:
+            # Bulk delete logs its deletions first; roll them back with the delete
+            with transaction.atomic():
+                return super().response_action(request, queryset)
+        except ProtectedError:
+            self.message_user(request, self.protected_delete_message, messages.ERROR)
+            return HttpResponseRedirect(request.get_full_path())
+
+@admin.register(TaxRule)
+class TaxRuleAdmin(admin.ModelAdmin):
+    list_display = ['name', 'transaction_type', 'service_type', 'min_amount', 'max_amount', 'rate', 'effective_from', 'effective_to', 'is_active']
+    list_filter = ['transaction_type', 'service_type', 'is_active']
+    search_fields = ['name']
+    list_editable = ['is_active']
+
+@admin.register(LedgerAccount)
+class LedgerAccountAdmin(admin.ModelAdmin):
+    list_display = ['code', 'kind', 'business_line', 'balance', 'total_debits', 'total_credits', 'updated_at']
+    list_filter = ['kind', 'business_line']
+    search_fields = ['code']
+    readonly_fields = ['balance', 'total_debits', 'total_credits', 'updated_at']
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    # Append-only: entries are posted through payment_management.ledger, never edited
+    list_display = ['created_at', 'account', 'debit', 'credit', 'balance_after', 'journal']
+    list_filter = ['account__kind', 'journal__journal_type']
+    search_fields = ['account__code', 'journal__idempotency_key']
+    list_select_related = ['account', 'journal']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,197 @@
+# payment_management/gateway_simulator.py
+"""
+Local stand-in for the payment gateway.
+
+Builds Razorpay-shaped webhook events signed with RAZORPAY_WEBHOOK_SECRET.
+Used by the checkout callback when PAYMENT_GATEWAY_MODE = 'local' (DEBUG
+only: it captures without a gateway), and by
+`python manage.py simulate_gateway_webhooks` to replay webhook storms
+(duplicates, out-of-order and forged deliveries) for offline benchmarking.
+"""
+import json
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib import request as urllib_request
+from urllib.error import HTTPError, URLError
+
+from django.conf import settings
+from django.db import connection
+
+from .webhooks import compute_webhook_signature
+
+
+def local_gateway_enabled():
+    """True when the simulator stands in for the gateway (PAYMENT_GATEWAY_MODE = 'local' under DEBUG)"""
+    return settings.DEBUG and getattr(settings, 'PAYMENT_GATEWAY_MODE', 'razorpay') == 'local'
+
+
+def new_order_id():
+    return 'order_' + uuid.uuid4().hex[:14]
+
+
+def new_payment_id():
+    return 'pay_' + uuid.uuid4().hex[:14]
+
+
+def build_payment_event(transaction_obj, event='payment.captured', payment_id=None, amount_paise=None, error=''):
+    """Razorpay-style payment event for a transaction"""
+    entity = {
+        'id': payment_id or new_payment_id(),
+        'entity': 'payment',
+        'amount': amount_paise if amount_paise is not None else int(transaction_obj.amount * 100),
+        'currency': transaction_obj.currency,
+        'status': 'captured' if event == 'payment.captured' else 'failed',
+        'order_id': transaction_obj.gateway_transaction_id,
+        'method': 'upi',
+        'captured': event == 'payment.captured',
+        'notes': {'transaction_id': str(transaction_obj.transaction_id)},
+        'created_at': int(time.time()),
+    }
+    if error:
+        entity['error_description'] = error
+    return {
+        'entity': 'event',
+        'account_id': 'acc_nomado_local',
+        'event': event,
+        'contains': ['payment'],
+        'payload': {'payment': {'entity': entity}},
+        'created_at': int(time.time()),
+    }
+
+
+def sign_event(data, secret=None):
+    """Serialize an event and return a delivery (body, signature, event_id)"""
+    body = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    return {
+        'body': body,
+        'signature': compute_webhook_signature(body, secret),
+        'event_id': 'evt_' + uuid.uuid4().hex[:14],
+    }
+
+
+def simulate_checkout_capture(transaction_obj):
+    """
+    Play the gateway for a checkout callback: assign an order id if the
+    transaction has none and deliver a signed payment.captured event.
+    """
+    from .webhooks import record_webhook_event, verify_webhook_signature
+
+    if not transaction_obj.gateway_transaction_id:
+        transaction_obj.gateway_transaction_id = new_order_id()
+        transaction_obj.save(update_fields=['gateway_transaction_id'])
+
+    delivery = sign_event(build_payment_event(transaction_obj))
+    if not verify_webhook_signature(delivery['body'], delivery['signature']):
+        return None
+    event, _ = record_webhook_event(delivery['body'], delivery['signature'], delivery['event_id'])
+    return event
+
+
+def simulate_refund(payment_id, amount, receipt=None, notes=None):
+    """Local stand-in for create_razorpay_refund (same return shape)"""
+    if not payment_id:
+        return {'success': False, 'error': 'Payment has no gateway payment id'}
+    return {
+        'success': True,
+        'refund': {
+            'id': 'rfnd_' + uuid.uuid4().hex[:14],
+            'entity': 'refund',
+            'amount': int(amount * 100),
+            'payment_id': payment_id,
+            'receipt': receipt,
+            'notes': notes or {},
+            'status': 'processed',
+            'created_at': int(time.time()),
+        },
+    }
+
+
+def generate_storm(transactions, duplicate_rate=0.3, failure_rate=0.05, forged_rate=0.02,
+                   amount_mismatch_rate=0.01, seed=None):
+    """
+    Build a shuffled list of deliveries for the given transactions.
+    Each transaction gets a capture (or a failure); some deliveries are
+    retried by the "gateway", some are forged and some carry a wrong amount.
+    """
+    rng = random.Random(seed)
+    deliveries = []
+
+    for transaction_obj in transactions:
+        if rng.random() < failure_rate:
+            event = build_payment_event(transaction_obj, 'payment.failed', error='Payment declined by bank')
+        elif rng.random() < amount_mismatch_rate:
+            event = build_payment_event(transaction_obj, amount_paise=int(transaction_obj.amount * 100) + 100)
+        else:
+            event = build_payment_event(transaction_obj)
+
+        delivery = sign_event(event)
+        if rng.random() < forged_rate:
+            delivery['signature'] = compute_webhook_signature(delivery['body'], 'forged-secret')
+        deliveries.append(delivery)
+
+        # Gateway retries reuse the same event id and body
+        while rng.random() < duplicate_rate:
+            deliveries.append(dict(delivery))
+
+    rng.shuffle(deliveries)
+    return deliveries
+
+
+def _deliver_local(delivery):
+    from django.test import RequestFactory
+    from .views import payment_webhook_view
+
+    try:
+        webhook_request = RequestFactory().post(
+            '/payments/webhooks/razorpay/',
+            data=delivery['body'],
+            content_type='application/json',
+            HTTP_X_RAZORPAY_SIGNATURE=delivery['signature'],
+            HTTP_X_RAZORPAY_EVENT_ID=delivery['event_id'],
+        )
+        return payment_webhook_view(webhook_request).status_code
+    finally:
+        connection.close()
+
+
+def _deliver_http(url, delivery, timeout=10):
+    req = urllib_request.Request(url, data=delivery['body'], method='POST', headers={
+        'Content-Type': 'application/json',
+        'X-Razorpay-Signature': delivery['signature'],
+        'X-Razorpay-Event-Id': delivery['event_id'],
+    })
+    try:
+        with urllib_request.urlopen(req, timeout=timeout) as response:
+            return response.status
+    except HTTPError as e:
+        return e.code
+    except URLError:
+        return 0
+
+
+def replay_storm(deliveries, url=None, concurrency=8):
+    """
+    Deliver a storm either in-process (url=None) or over HTTP.
+    Returns a status-code histogram plus elapsed seconds and deliveries/sec.
+    """
+    if url:
+        deliver = lambda delivery: _deliver_http(url, delivery)
+    else:
+        deliver = _deliver_local
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        codes = list(pool.map(deliver, deliveries))
+    elapsed = time.perf_counter() - started
+
+    histogram = {}
+    for code in codes:
+        histogram[code] = histogram.get(code, 0) + 1
+    return {
+        'delivered': len(codes),
+        'status_codes': histogram,
+        'elapsed': elapsed,
+        'rate': len(codes) / elapsed if elapsed else 0,
+    }
@@ -0,0 +1,220 @@
+# payment_management/invoice_documents.py
+"""
+Invoice and monthly statement documents.
+
+Each document is rendered once and written to default_storage under a
+name derived from the SHA-256 of its content (documents/ab/abcdef....html),
+so identical renders share one file and the hash doubles as the ETag for
+invoice downloads. A statement's ETag is its source key, a digest of the
+ids and updated_at of the invoices it lists, so a download can be
+answered (304, or the stored copy) before anything is rendered. Monthly
+statements can be generated in bulk across worker
+processes with generate_monthly_statements().
+"""
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Sum
+from django.template.loader import render_to_string
+
+from .models import Invoice, InvoiceDocument
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    'html': 'text/html; charset=utf-8',
+    'pdf': 'application/pdf',
+}
+
+
+class DocumentFormatUnavailable(Exception):
+    """Requested format needs an optional dependency that is not installed"""
+
+
+def _document_context():
+    return {
+        'company_name': 'Nomado',
+        'support_email': 'support@nomado.com',
+        'support_phone': '+91-1234-567890',
+    }
+
+
+def render_pdf(html):
+    """Convert rendered HTML to PDF (requires WeasyPrint)"""
+    try:
+        from weasyprint import HTML
+    except ImportError:
+        raise DocumentFormatUnavailable('PDF documents require WeasyPrint (pip install weasyprint)')
+    return HTML(string=html).write_pdf()
+
+
+def _encode(html, fmt):
+    if fmt == 'pdf':
+        return render_pdf(html)
+    return html.encode('utf-8')
+
+
+def store_content(content, fmt):
+    """Write content under its SHA-256 name unless it is already stored"""
+    content_hash = hashlib.sha256(content).hexdigest()
+    directory = getattr(settings, 'INVOICE_DOCUMENT_DIR', 'documents')
+    name = f'{directory}/{content_hash[:2]}/{content_hash}.{fmt}'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(content))
+    return content_hash, name
+
+
+def render_invoice_html(invoice):
+    transaction_obj = invoice.transaction
+    booking = transaction_obj.hotel_booking or transaction_obj.transport_booking
+    context = dict(_document_context(), invoice=invoice, transaction=transaction_obj,
+                   booking=booking, user=transaction_obj.user)
+    return render_to_string('payment_management/invoice_document.html', context)
+
+
+def _save_document(lookup, content, fmt, **fields):
+    """Create the document row, or return the one a concurrent render created"""
+    content_hash, name = store_content(content, fmt)
+    try:
+        with transaction.atomic():
+            return InvoiceDocument.objects.create(
+                format=fmt, content_hash=content_hash, storage_name=name, size=len(content),
+                **lookup, **fields
+            )
+    except IntegrityError:
+        return InvoiceDocument.objects.get(format=fmt, **lookup)
+
+
+def get_invoice_document(invoice, fmt='html'):
+    """Cached document for an invoice, rendering it on first request"""
+    document = InvoiceDocument.objects.filter(kind='INVOICE', invoice=invoice, format=fmt).first()
+    if document and default_storage.exists(document.storage_name):
+        return document
+    if document:
+        document.delete()
+
+    content = _encode(render_invoice_html(invoice), fmt)
+    return _save_document({'kind': 'INVOICE', 'invoice': invoice}, content, fmt, user_id=invoice.transaction.user_id)
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def _next_month(period):
+    return date(period.year + (period.month == 12), period.month % 12 + 1, 1)
+
+
+def statement_invoices(user, period):
+    return Invoice.objects.filter(
+        transaction__user=user,
+        invoice_date__date__gte=period,
+        invoice_date__date__lt=_next_month(period),
+    ).select_related(
+        'transaction__hotel_booking__hotel', 'transaction__transport_booking__route'
+    ).order_by('invoice_date')
+
+
+def render_statement_html(user, period):
+    invoices = statement_invoices(user, period)
+    totals = invoices.aggregate(subtotal=Sum('subtotal'), tax_amount=Sum('tax_amount'), total_amount=Sum('total_amount'))
+    totals = {key: value or Decimal('0.00') for key, value in totals.items()}
+    context = dict(_document_context(), user=user, period=period, invoices=invoices, totals=totals)
+    return render_to_string('payment_management/statement_document.html', context)
+
+
+def statement_source_key(user, period, fmt='html'):
+    """Digest of what a statement shows; changes whenever one of its invoices does"""
+    rows = statement_invoices(user, month_start(period)).values_list('pk', 'updated_at')
+    source = f'{fmt}:' + ','.join(f'{pk}@{updated_at.isoformat()}' for pk, updated_at in rows)
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def get_statement_document(user, period, fmt='html', source_key=None):
+    """
+    Cached monthly statement, re-rendered only when its source key no
+    longer matches (an invoice was added or changed). Identical content
+    is still deduplicated in storage.
+    """
+    period = month_start(period)
+    source_key = source_key or statement_source_key(user, period, fmt)
+    lookup = {'kind': 'STATEMENT', 'user': user, 'period': period}
+    document = InvoiceDocument.objects.filter(format=fmt, **lookup).first()
+
+    if document and document.source_key == source_key and default_storage.exists(document.storage_name):
+        return document
+
+    content = _encode(render_statement_html(user, period), fmt)
+    if document is None:
+        return _save_document(lookup, content, fmt, source_key=source_key)
+
+    document.content_hash, document.storage_name = store_content(content, fmt)
+    document.size = len(content)
+    document.source_key = source_key
+    document.save(update_fields=['content_hash', 'storage_name', 'size', 'source_key'])
+    return document
+
+
+# BULK GENERATION
+def _init_worker():
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
+
+
+def _generate_chunk(user_ids, period_iso, fmt):
+    """Render statements and their invoice documents for a chunk of users (worker process)"""
+    from django.contrib.auth import get_user_model
+
+    period = date.fromisoformat(period_iso)
+    counts = {'statements': 0, 'invoices': 0, 'errors': 0}
+    try:
+        for user in get_user_model().objects.filter(id__in=user_ids):
+            try:
+                for invoice in statement_invoices(user, period):
+                    get_invoice_document(invoice, fmt)
+                    counts['invoices'] += 1
+                get_statement_document(user, period, fmt)
+                counts['statements'] += 1
+            except DocumentFormatUnavailable:
+                raise
+            except Exception as e:
+                logger.error(f"Statement generation failed for user {user.id}: {str(e)}")
+                counts['errors'] += 1
+    finally:
+        connections.close_all()
+    return counts
+
+
+def generate_monthly_statements(period, fmt='html', processes=None, chunk_size=50, user_ids=None):
+    """Generate statements for every user invoiced in the month across worker processes"""
+    period = month_start(period)
+    if user_ids is None:
+        user_ids = list(Invoice.objects.filter(
+            invoice_date__date__gte=period,
+            invoice_date__date__lt=_next_month(period),
+        ).values_list('transaction__user_id', flat=True).distinct())
+
+    chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+    totals = {'statements': 0, 'invoices': 0, 'errors': 0}
+    if not chunks:
+        return totals
+
+    # Children must not share the parent's database connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker) as pool:
+        futures = [pool.submit(_generate_chunk, chunk, period.isoformat(), fmt) for chunk in chunks]
+        for future in futures:
+            for key, value in future.result().items():
+                totals[key] += value
+    return totals
@@ -0,0 +1,376 @@
+# payment_management/ledger.py
+"""
+Append-only double-entry ledger.
+
+Every money movement is one LedgerJournal whose LedgerEntry lines sum to
+zero (debits == credits). Each account keeps its balance and debit/credit
+totals as a snapshot that is updated in the same database transaction as
+the lines, and each line records the balance it left behind, so:
+
+- current balances are a single row read, and
+- a statement for any period is the last line before it (opening
+  balance) plus an indexed range scan over (account, created_at).
+
+Journals carry an idempotency key, so posting the same event twice is a
+no-op. Accounts are locked in primary-key order to avoid deadlocks.
+
+Capture of a paid transaction:
+    Dr CUSTOMER             amount captured
+        Cr TAX_PAYABLE          GST on the invoice
+        Cr PROVIDER_PAYABLE     the provider's earnings (ProviderEarnings)
+        Cr PLATFORM_COMMISSION  the rest
+    Dr GATEWAY_CLEARING     amount captured
+        Cr CUSTOMER             amount captured
+Booking prices are charged as quoted and the invoice adds GST on top, so
+the tax is remitted out of the platform's share, not the provider's. The
+customer account nets to zero.
+
+Refund (split between provider and commission in the capture's ratio;
+tax already invoiced is not reversed):
+    Dr PROVIDER_PAYABLE / PLATFORM_COMMISSION   refund
+        Cr CUSTOMER                                 refund
+    Dr CUSTOMER             refund
+        Cr GATEWAY_CLEARING     refund
+
+Settlement of a ProviderEarnings row (a payout to the provider):
+    Dr PROVIDER_PAYABLE     provider earnings
+        Cr GATEWAY_CLEARING     same, on the provider's payouts account
+The payable balance is what the provider is still owed and the payouts
+account what they have been paid, both single-row reads.
+"""
+import heapq
+import logging
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import LedgerAccount, LedgerEntry, LedgerJournal, Transaction
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal('0')
+CENT = Decimal('0.01')
+
+
+class UnbalancedJournal(ValueError):
+    pass
+
+
+# ACCOUNTS
+def _account_code(kind, user=None, provider=None, business_line='', name=''):
+    parts = [kind.lower()]
+    if user is not None:
+        parts.append(f'user-{user.pk}')
+    if provider is not None:
+        parts.append(f'provider-{provider.pk}')
+    if business_line:
+        parts.append(business_line.lower())
+    if name:
+        parts.append(name.lower())
+    return ':'.join(parts)
+
+
+def get_account(kind, user=None, provider=None, business_line='', name=''):
+    """The account for (kind, owner, business line), created on first use"""
+    code = _account_code(kind, user, provider, business_line, name)
+    account = LedgerAccount.objects.filter(code=code).first()
+    if account:
+        return account
+    try:
+        with transaction.atomic():
+            return LedgerAccount.objects.create(
+                code=code, kind=kind, user=user, provider=provider, business_line=business_line,
+            )
+    except IntegrityError:
+        return LedgerAccount.objects.get(code=code)
+
+
+# POSTING
+def post_journal(idempotency_key, journal_type, lines, description='', transaction_obj=None, refund=None, posted_at=None):
+    """
+    Post a balanced journal. lines is a list of (account, debit, credit).
+    Returns (journal, created); created is False if the key was already posted.
+    """
+    lines = [(account, Decimal(debit), Decimal(credit)) for account, debit, credit in lines if debit or credit]
+    if sum(debit for _, debit, _ in lines) != sum(credit for _, _, credit in lines):
+        raise UnbalancedJournal(f'Journal {idempotency_key} does not balance')
+
+    posted_at = posted_at or timezone.now()
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                journal = LedgerJournal.objects.create(
+                    idempotency_key=idempotency_key,
+                    journal_type=journal_type,
+                    description=description[:255],
+                    transaction=transaction_obj,
+                    refund=refund,
+                    created_at=posted_at,
+                )
+        except IntegrityError:
+            return LedgerJournal.objects.get(idempotency_key=idempotency_key), False
+
+        account_ids = sorted({account.pk for account, _, _ in lines})
+        accounts = {
+            account.pk: account
+            for account in LedgerAccount.objects.select_for_update().filter(pk__in=account_ids).order_by('pk')
+        }
+
+        entries = []
+        for line_account, debit, credit in lines:
+            account = accounts[line_account.pk]
+            account.balance += debit - credit
+            account.total_debits += debit
+            account.total_credits += credit
+            entries.append(LedgerEntry(
+                journal=journal, account=account, debit=debit, credit=credit,
+                balance_after=account.balance, created_at=posted_at,
+            ))
+
+        now = timezone.now()
+        for account in accounts.values():
+            account.updated_at = now
+        LedgerAccount.objects.bulk_update(
+            accounts.values(), ['balance', 'total_debits', 'total_credits', 'updated_at'],
+        )
+        LedgerEntry.objects.bulk_create(entries)
+
+    return journal, True
+
+
+def _business_line(transaction_obj):
+    if transaction_obj.hotel_booking_id:
+        return 'HOTEL'
+    if transaction_obj.transport_booking_id:
+        return 'TRANSPORT'
+    return ''
+
+
+def _booking(transaction_obj):
+    return transaction_obj.hotel_booking or transaction_obj.transport_booking
+
+
+def _provider_for(transaction_obj):
+    if transaction_obj.hotel_booking_id:
+        return transaction_obj.hotel_booking.hotel.owner
+    if transaction_obj.transport_booking_id:
+        return transaction_obj.transport_booking.route.owner
+    return None
+
+
+def _payouts_account(provider, business_line):
+    return get_account('GATEWAY_CLEARING', provider=provider, business_line=business_line, name='payouts')
+
+
+def post_capture(transaction_obj, posted_at=None):
+    """Post the capture of a paid transaction (idempotent)"""
+    from service_provider.models import ProviderEarnings
+
+    invoice = getattr(transaction_obj, 'invoice', None)
+    captured = transaction_obj.amount
+    tax = invoice.tax_amount if invoice else ZERO
+
+    provider = _provider_for(transaction_obj)
+    line = _business_line(transaction_obj)
+    customer = get_account('CUSTOMER', user=transaction_obj.user)
+
+    provider_share = ZERO
+    if provider is not None:
+        booking_field = 'hotel_booking' if line == 'HOTEL' else 'transport_booking'
+        earnings = ProviderEarnings.objects.filter(provider=provider, **{booking_field: _booking(transaction_obj)}).first()
+        if earnings:
+            provider_share = earnings.provider_earnings
+        else:
+            commission = (captured * provider.commission_rate / Decimal('100')).quantize(CENT, rounding=ROUND_HALF_UP)
+            provider_share = captured - commission
+    # Negative when the GST is more than the commission: the platform pays the difference
+    platform_share = captured - tax - provider_share
+
+    commission_account = get_account('PLATFORM_COMMISSION', provider=provider, business_line=line)
+    lines = [
+        (customer, captured, ZERO),
+        (get_account('TAX_PAYABLE', name='gst'), ZERO, tax),
+        (commission_account, ZERO, platform_share) if platform_share >= 0 else (commission_account, -platform_share, ZERO),
+    ]
+    if provider is not None:
+        lines.append((get_account('PROVIDER_PAYABLE', provider=provider, business_line=line), ZERO, provider_share))
+    lines += [
+        (get_account('GATEWAY_CLEARING', name=transaction_obj.payment_gateway or 'gateway'), captured, ZERO),
+        (customer, ZERO, captured),
+    ]
+    return post_journal(
+        f'capture:{transaction_obj.transaction_id}', 'CAPTURE', lines,
+        description=f'Payment {transaction_obj.transaction_id}',
+        transaction_obj=transaction_obj, posted_at=posted_at,
+    )
+
+
+def post_refund(refund, posted_at=None):
+    """Post a completed refund (idempotent); posts the capture first if it is missing"""
+    transaction_obj = refund.transaction
+    capture, _ = post_capture(transaction_obj, posted_at=posted_at)
+
+    # Reverse the provider's and the platform's shares in the ratio they were credited
+    credited = list(
+        capture.entries.filter(account__kind__in=['PROVIDER_PAYABLE', 'PLATFORM_COMMISSION'])
+        .select_related('account').order_by('account__kind')
+    )
+    shared = sum(entry.credit for entry in credited)
+    amount = refund.approved_amount
+    lines = []
+    remaining = amount
+    for index, entry in enumerate(credited):
+        if index == len(credited) - 1:
+            share = remaining
+        else:
+            share = (amount * entry.credit / shared).quantize(CENT, rounding=ROUND_HALF_UP) if shared else ZERO
+        remaining -= share
+        lines.append((entry.account, share, ZERO))
+
+    customer = get_account('CUSTOMER', user=transaction_obj.user)
+    lines += [
+        (customer, ZERO, amount),
+        (customer, amount, ZERO),
+        (get_account('GATEWAY_CLEARING', name=transaction_obj.payment_gateway or 'gateway'), ZERO, amount),
+    ]
+    return post_journal(
+        f'refund:{refund.refund_id}', 'REFUND', lines,
+        description=f'Refund {refund.refund_id} for payment {transaction_obj.transaction_id}',
+        transaction_obj=transaction_obj, refund=refund, posted_at=posted_at,
+    )
+
+
+def _settlement_line(earnings):
+    return 'HOTEL' if earnings.hotel_booking_id else 'TRANSPORT'
+
+
+def post_settlement(earnings, posted_at=None):
+    """Post the payout of a settled ProviderEarnings row (idempotent per settlement)"""
+    line = _settlement_line(earnings)
+    amount = earnings.provider_earnings
+    return post_journal(
+        f'settlement:{earnings.pk}:{_settlement_stamp(earnings.settled_at)}', 'SETTLEMENT', [
+            (get_account('PROVIDER_PAYABLE', provider=earnings.provider, business_line=line), amount, ZERO),
+            (_payouts_account(earnings.provider, line), ZERO, amount),
+        ],
+        description=f'Payout {earnings.settlement_reference or earnings.pk} to {earnings.provider}',
+        posted_at=posted_at,
+    )
+
+
+def reverse_settlement(earnings, settled_at, posted_at=None):
+    """Undo the payout posted for a settlement that was taken back (idempotent)"""
+    line = _settlement_line(earnings)
+    amount = earnings.provider_earnings
+    return post_journal(
+        f'settlement-reversal:{earnings.pk}:{_settlement_stamp(settled_at)}', 'SETTLEMENT', [
+            (_payouts_account(earnings.provider, line), amount, ZERO),
+            (get_account('PROVIDER_PAYABLE', provider=earnings.provider, business_line=line), ZERO, amount),
+        ],
+        description=f'Reversed payout {earnings.settlement_reference or earnings.pk} to {earnings.provider}',
+        posted_at=posted_at,
+    )
+
+
+def _settlement_stamp(settled_at):
+    return int(settled_at.timestamp() * 1_000_000) if settled_at else 0
+
+
+# READS
+def provider_balances(provider):
+    """
+    {business line: {'payable': owed, 'settled': paid out, 'commission': Decimal}}
+    from the account snapshots; payable + settled is what the provider earned
+    """
+    balances = {}
+    accounts = LedgerAccount.objects.filter(provider=provider, kind__in=['PROVIDER_PAYABLE', 'PLATFORM_COMMISSION', 'GATEWAY_CLEARING'])
+    for account in accounts:
+        line = balances.setdefault(account.business_line, {'payable': ZERO, 'settled': ZERO, 'commission': ZERO})
+        if account.kind == 'PROVIDER_PAYABLE':
+            line['payable'] += account.normal_balance
+        elif account.kind == 'GATEWAY_CLEARING':
+            # Payouts are credited to it
+            line['settled'] -= account.balance
+        else:
+            line['commission'] += account.normal_balance
+    return balances
+
+
+def account_statement(account, start, end):
+    """
+    Opening balance, lines and closing balance for start <= created_at < end.
+    Balances are debit-positive, like LedgerAccount.balance.
+    """
+    entries = LedgerEntry.objects.filter(account=account)
+    opening = entries.filter(created_at__lt=start).order_by('-created_at', '-id').values_list(
+        'balance_after', flat=True).first()
+    opening = ZERO if opening is None else opening
+
+    lines = list(
+        entries.filter(created_at__gte=start, created_at__lt=end)
+        .select_related('journal').order_by('created_at', 'id')
+    )
+    return {
+        'account': account,
+        'opening_balance': opening,
+        'entries': lines,
+        'closing_balance': lines[-1].balance_after if lines else opening,
+        'total_debits': sum((line.debit for line in lines), ZERO),
+        'total_credits': sum((line.credit for line in lines), ZERO),
+    }
+
+
+# BACKFILL
+def backfill_ledger(chunk_size=500):
+    """
+    Post every paid transaction, completed refund and settled provider
+    earning that has no journal yet, oldest first. On an empty ledger the original completion times are
+    used as posting times so past statements come out right; once live
+    postings exist, backfilled journals are posted at the current time to
+    keep each account's balance_after sequence in time order.
+    Returns (captures posted, refunds posted, settlements posted).
+    """
+    from service_provider.models import ProviderEarnings
+
+    from .models import Refund
+
+    historic = not LedgerEntry.objects.exists()
+    transactions = (
+        Transaction.objects.filter(status__in=['SUCCESS', 'REFUNDED'], is_synthetic=False)
+        .exclude(ledger_journals__journal_type='CAPTURE')
+        .select_related('user', 'invoice', 'hotel_booking__hotel__owner', 'transport_booking__route__owner')
+        .order_by('completed_at', 'initiated_at', 'pk')
+    )
+    refunds = (
+        Refund.objects.filter(status='COMPLETED', transaction__is_synthetic=False)
+        .exclude(ledger_journals__journal_type='REFUND')
+        .select_related('transaction__user')
+        .order_by('completed_at', 'pk')
+    )
+    # Already-posted settlements are skipped by their idempotency key
+    settlements = (
+        ProviderEarnings.objects.filter(is_settled=True)
+        .select_related('provider')
+        .order_by('settled_at', 'created_at', 'pk')
+    )
+
+    def events(queryset, kind, when):
+        for obj in queryset.iterator(chunk_size=chunk_size):
+            yield when(obj), kind, obj.pk, obj
+
+    timeline = heapq.merge(
+        events(transactions, 'capture', lambda t: t.completed_at or t.initiated_at),
+        events(refunds, 'refund', lambda r: r.completed_at or r.requested_at),
+        events(settlements, 'settlement', lambda e: e.settled_at or e.created_at),
+        key=lambda event: (event[0], event[1], event[2]),
+    )
+
+    posters = {'capture': post_capture, 'refund': post_refund, 'settlement': post_settlement}
+    posted = {'capture': 0, 'refund': 0, 'settlement': 0}
+    for when, kind, _, obj in timeline:
+        _, created = posters[kind](obj, posted_at=when if historic else None)
+        posted[kind] += created
+    logger.info(f"Ledger backfill posted {posted['capture']} captures, {posted['refund']} refunds "
+                f"and {posted['settlement']} settlements")
+    return posted['capture'], posted['refund'], posted['settlement']
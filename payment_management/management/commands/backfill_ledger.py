@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from payment_management.ledger import backfill_ledger
+
+
+class Command(BaseCommand):
+    help = 'Post ledger journals for paid transactions, completed refunds and settled earnings that have none yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        captures, refunds, settlements = backfill_ledger(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Posted {captures} captures, {refunds} refunds and {settlements} settlements '
+            f'in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from payment_management.outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = 'Deliver post-payment outbox messages (invoices, receipts, provider notifications, earnings)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'OUTBOX_BATCH_SIZE', 100))
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'OUTBOX_MAX_WORKERS', 4))
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when nothing is due')
+        parser.add_argument('--once', action='store_true', help='Drain what is due and exit')
+
+    def handle(self, *args, **options):
+        delivered = 0
+
+        while True:
+            counts = drain_outbox(batch_size=options['batch_size'], max_workers=options['workers'])
+            if counts:
+                delivered += sum(counts.values())
+                self.stdout.write(', '.join(f'{status}: {count}' for status, count in sorted(counts.items())))
+                continue
+
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'Handled {delivered} outbox messages'))
@@ -0,0 +1,59 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from export_utils import EXPORT_DATASETS, EXPORT_FORMATS, build_export_rows, parse_export_date
+
+
+class Command(BaseCommand):
+    help = 'Stream transactions or bookings to CSV / JSON lines without loading them into memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(EXPORT_DATASETS))
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--columns', help='Comma separated column names (default: all)')
+        parser.add_argument('--from', dest='date_from', help='First day to include (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', help='Last day to include (YYYY-MM-DD)')
+        parser.add_argument('--output', '-o', help='File to write (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per database round trip')
+        parser.add_argument('--list-columns', action='store_true', help='Print the available columns and exit')
+
+    def handle(self, *args, **options):
+        dataset = options['dataset']
+        if options['list_columns']:
+            self.stdout.write('\n'.join(EXPORT_DATASETS[dataset]['columns']))
+            return
+
+        try:
+            columns, rows = build_export_rows(
+                dataset,
+                columns=options['columns'],
+                date_from=parse_export_date(options['date_from']),
+                date_to=parse_export_date(options['date_to']),
+                chunk_size=options['chunk_size'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        render = EXPORT_FORMATS[options['format']][0]
+        row_count = 0
+
+        def counted(iterator):
+            nonlocal row_count
+            for row in iterator:
+                row_count += 1
+                yield row
+
+        started = time.perf_counter()
+        output = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            for block in render(columns, counted(rows)):
+                output.write(block)
+        finally:
+            if options['output']:
+                output.close()
+
+        self.stderr.write(self.style.SUCCESS(
+            f'Exported {row_count} {dataset} rows in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,43 @@
+import time
+from datetime import date, datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payment_management.invoice_documents import DocumentFormatUnavailable, generate_monthly_statements
+
+
+class Command(BaseCommand):
+    help = 'Render monthly statements (and their invoice documents) for every invoiced user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help='Statement month as YYYY-MM (default: previous month)')
+        parser.add_argument('--format', choices=['html', 'pdf'], default='html')
+        parser.add_argument('--processes', type=int, default=None, help='Worker processes (default: CPU count)')
+        parser.add_argument('--chunk-size', type=int, default=50, help='Users per worker task')
+
+    def handle(self, *args, **options):
+        if options['month']:
+            try:
+                period = datetime.strptime(options['month'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError('--month must look like 2025-01')
+        else:
+            today = date.today()
+            period = date(today.year - (today.month == 1), (today.month - 2) % 12 + 1, 1)
+
+        started = time.perf_counter()
+        try:
+            totals = generate_monthly_statements(
+                period,
+                fmt=options['format'],
+                processes=options['processes'],
+                chunk_size=options['chunk_size'],
+            )
+        except DocumentFormatUnavailable as e:
+            raise CommandError(str(e))
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{period:%B %Y}: {totals['statements']} statements, {totals['invoices']} invoices, "
+            f"{totals['errors']} errors in {elapsed:.1f}s"
+        ))
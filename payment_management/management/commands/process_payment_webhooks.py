@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from payment_management.webhooks import process_pending_events
+
+
+class Command(BaseCommand):
+    help = 'Process stored payment gateway webhook events'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'PAYMENT_WEBHOOK_BATCH_SIZE', 100))
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        processed = 0
+
+        while True:
+            counts = process_pending_events(batch_size=batch_size)
+            if counts:
+                processed += sum(counts.values())
+                self.stdout.write(', '.join(f'{status}: {count}' for status, count in sorted(counts.items())))
+                continue
+
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} webhook events'))
@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from payment_management.refunds import process_refunds
+
+
+class Command(BaseCommand):
+    help = 'Send approved refunds to the payment gateway and record the results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'REFUND_BATCH_SIZE', 100))
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'REFUND_MAX_WORKERS', 8))
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep when nothing is due')
+        parser.add_argument('--once', action='store_true', help='Process what is due and exit')
+
+    def handle(self, *args, **options):
+        handled = 0
+        started = time.perf_counter()
+
+        while True:
+            counts = process_refunds(batch_size=options['batch_size'], max_workers=options['workers'])
+            if counts:
+                handled += sum(counts.values())
+                self.stdout.write(', '.join(f'{status}: {count}' for status, count in sorted(counts.items())))
+                continue
+
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Handled {handled} refunds in {time.perf_counter() - started:.1f}s'
+        ))
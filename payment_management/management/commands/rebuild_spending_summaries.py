@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from payment_management.spending import rebuild_spending_summaries
+
+
+class Command(BaseCommand):
+    help = 'Recompute per-user spending summaries from transactions (drift repair / backfill)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='Only this user id (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            written = rebuild_spending_summaries(user_ids=options['user_ids'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {written} spending summaries in {time.perf_counter() - started:.1f}s'
+        ))
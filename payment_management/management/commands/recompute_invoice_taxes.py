@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payment_management.models import Invoice
+from payment_management.tax import recompute_invoice_taxes
+
+
+class Command(BaseCommand):
+    help = 'Re-apply the current tax rules to existing invoices (set-based, one UPDATE per rule)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only invoices dated on or after YYYY-MM-DD')
+        parser.add_argument('--until', help='Only invoices dated on or before YYYY-MM-DD')
+        parser.add_argument('--missing-only', action='store_true', help='Only invoices without a recorded tax rate')
+        parser.add_argument('--dry-run', action='store_true', help='Report matches per rule without updating')
+
+    def _date(self, value, option):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'{option} must look like 2025-01-31')
+
+    def handle(self, *args, **options):
+        invoices = Invoice.objects.all()
+        if options['since']:
+            invoices = invoices.filter(invoice_date__date__gte=self._date(options['since'], '--since'))
+        if options['until']:
+            invoices = invoices.filter(invoice_date__date__lte=self._date(options['until'], '--until'))
+        if options['missing_only']:
+            invoices = invoices.filter(tax_rate__isnull=True)
+
+        results = recompute_invoice_taxes(invoices, dry_run=options['dry_run'])
+        for rule, count in results:
+            self.stdout.write(f'{rule}: {count}')
+
+        verb = 'would be matched' if options['dry_run'] else 'recomputed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{invoices.count()} invoices in scope; {sum(count for _, count in results)} rule applications {verb}'
+        ))
@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payment_management.reconciliation import reconcile_file
+
+
+class Command(BaseCommand):
+    help = 'Reconcile a gateway settlement/report file (CSV, JSON or JSON lines) against transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Settlement or payments report file')
+        parser.add_argument('--format', choices=['csv', 'json', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--amount-unit', choices=['rupees', 'paise'], default='rupees')
+        parser.add_argument('--fix', action='store_true', help='Replay missed captures and fail stuck transactions')
+        parser.add_argument('--stale-hours', type=int, default=24, help='Age after which PROCESSING rows are stale')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        try:
+            summary = reconcile_file(
+                options['path'],
+                file_format=options['format'],
+                amount_unit=options['amount_unit'],
+                fix=options['fix'],
+                stale_after=timedelta(hours=options['stale_hours']),
+                chunk_size=options['chunk_size'],
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not reconcile {options["path"]}: {e}')
+
+        self.stdout.write(f"Run {summary['run_id']}: {summary['records']} records, "
+                          f"{summary['matched']} matched in {summary['elapsed']:.2f}s")
+        for issue_type, count in sorted(summary['issues'].items()):
+            self.stdout.write(f'  {issue_type}: {count}')
+        if options['fix']:
+            self.stdout.write(f"  Captures replayed: {summary['captures_replayed']}, "
+                              f"marked failed: {summary['marked_failed']}")
+        self.stdout.write(self.style.SUCCESS('Reconciliation complete'))
@@ -0,0 +1,99 @@
+import time
+import uuid
+from decimal import Decimal
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from payment_management.gateway_simulator import generate_storm, local_gateway_enabled, new_order_id, replay_storm
+from payment_management.models import Transaction
+from payment_management.webhooks import process_pending_events
+from worker_utils import inline_workers_paused
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay a storm of signed gateway webhooks against synthetic transactions and report '
+        'ingest/processing throughput (DEBUG with PAYMENT_GATEWAY_MODE = local only)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transactions', type=int, default=100, help='Number of synthetic transactions to create and settle')
+        parser.add_argument('--username', help='Owner of synthetic transactions (defaults to the first superuser)')
+        parser.add_argument('--duplicates', type=float, default=0.3, help='Probability of each retry delivery')
+        parser.add_argument('--failures', type=float, default=0.05, help='Share of payment.failed events')
+        parser.add_argument('--forged', type=float, default=0.02, help='Share of deliveries with a bad signature')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--url', help='Deliver over HTTP to this webhook URL instead of in-process')
+        parser.add_argument('--process', action='store_true', help='Run the webhook worker after the storm and time it')
+        parser.add_argument('--seed', type=int)
+
+    def handle(self, *args, **options):
+        # The storm is signed with the real webhook secret, so it must never reach a live worker
+        if not local_gateway_enabled():
+            raise CommandError('The gateway simulator only runs with DEBUG on and PAYMENT_GATEWAY_MODE = local')
+
+        transactions = self._create_synthetic(options['transactions'], options['username'])
+        if not transactions:
+            raise CommandError('--transactions must be at least 1')
+
+        deliveries = generate_storm(
+            transactions,
+            duplicate_rate=options['duplicates'],
+            failure_rate=options['failures'],
+            forged_rate=options['forged'],
+            seed=options['seed'],
+        )
+        self.stdout.write(f'Replaying {len(deliveries)} deliveries for {len(transactions)} transactions...')
+
+        # Measure ingest on its own; events are drained by --process or the real worker
+        with inline_workers_paused():
+            stats = replay_storm(deliveries, url=options['url'], concurrency=options['concurrency'])
+        codes = ', '.join(f'{code}: {count}' for code, count in sorted(stats['status_codes'].items()))
+        self.stdout.write(f"Ingest: {stats['delivered']} deliveries in {stats['elapsed']:.2f}s "
+                          f"({stats['rate']:.0f}/s) [{codes}]")
+
+        if options['process']:
+            started = time.perf_counter()
+            totals = {}
+            # Receipts and earnings are only queued; the outbox and notification workers stay paused
+            with inline_workers_paused():
+                while True:
+                    counts = process_pending_events()
+                    if not counts:
+                        break
+                    for status, count in counts.items():
+                        totals[status] = totals.get(status, 0) + count
+            elapsed = time.perf_counter() - started
+            handled = sum(totals.values())
+            rate = handled / elapsed if elapsed else 0
+            summary = ', '.join(f'{status}: {count}' for status, count in sorted(totals.items()))
+            self.stdout.write(f'Worker: {handled} events in {elapsed:.2f}s ({rate:.0f}/s) [{summary}]')
+
+        self.stdout.write(self.style.SUCCESS('Simulation complete'))
+
+    def _create_synthetic(self, count, username):
+        if username:
+            user = User.objects.filter(username=username).first()
+        else:
+            user = User.objects.filter(is_superuser=True).first()
+        if user is None:
+            raise CommandError('No user available to own synthetic transactions')
+
+        rng = random.Random()
+        transactions = [
+            Transaction(
+                transaction_id=uuid.uuid4(),
+                user=user,
+                transaction_type=rng.choice(['HOTEL_BOOKING', 'TRANSPORT_BOOKING']),
+                amount=Decimal(rng.randrange(50000, 2500000)) / 100,
+                gateway_transaction_id=new_order_id(),
+                status='PROCESSING',
+                is_synthetic=True,
+            )
+            for _ in range(count)
+        ]
+        return Transaction.objects.bulk_create(transactions, batch_size=500)
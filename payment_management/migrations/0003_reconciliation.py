@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_management', '0002_webhook_events'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='gateway_payment_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='gateway_transaction_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+        migrations.CreateModel(
+            name='ReconciliationIssue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_id', models.UUIDField(db_index=True)),
+                ('issue_type', models.CharField(choices=[('AMOUNT_MISMATCH', 'Amount Mismatch'), ('STATUS_MISMATCH', 'Status Mismatch'), ('MISSING_CAPTURE', 'Missing Capture'), ('ORPHAN_PAYMENT', 'Orphan Payment'), ('STALE_PROCESSING', 'Stale Processing')], max_length=20)),
+                ('gateway_order_id', models.CharField(blank=True, max_length=100)),
+                ('gateway_payment_id', models.CharField(blank=True, max_length=100)),
+                ('local_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('gateway_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('local_status', models.CharField(blank=True, max_length=20)),
+                ('gateway_status', models.CharField(blank=True, max_length=20)),
+                ('resolved', models.BooleanField(default=False)),
+                ('resolution', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reconciliation_issues', to='payment_management.transaction')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_management', '0004_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('INVOICE', 'Invoice'), ('STATEMENT', 'Monthly Statement')], default='INVOICE', max_length=10)),
+                ('format', models.CharField(choices=[('html', 'HTML'), ('pdf', 'PDF')], default='html', max_length=4)),
+                ('period', models.DateField(blank=True, null=True)),
+                ('content_hash', models.CharField(db_index=True, max_length=64)),
+                ('storage_name', models.CharField(max_length=255)),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('invoice', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='documents', to='payment_management.invoice')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='invoice_documents', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('kind', 'INVOICE')), fields=('invoice', 'format'), name='unique_invoice_document'), models.UniqueConstraint(condition=models.Q(('kind', 'STATEMENT')), fields=('user', 'period', 'format'), name='unique_statement_document')],
+            },
+        ),
+    ]
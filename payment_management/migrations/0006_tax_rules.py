@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_management', '0005_invoice_documents'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaxRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('transaction_type', models.CharField(blank=True, choices=[('HOTEL_BOOKING', 'Hotel Booking'), ('TRANSPORT_BOOKING', 'Transport Booking'), ('REFUND', 'Refund'), ('CANCELLATION', 'Cancellation Fee')], max_length=20)),
+                ('service_type', models.CharField(blank=True, max_length=20)),
+                ('min_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('max_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('rate', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('effective_from', models.DateField()),
+                ('effective_to', models.DateField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['transaction_type', 'service_type', 'min_amount', 'effective_from'],
+            },
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='tax_rate',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True),
+        ),
+    ]
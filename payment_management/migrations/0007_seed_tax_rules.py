@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:55
+
+import datetime
+from decimal import Decimal
+
+from django.db import migrations
+
+
+DEFAULT_RULES = [
+    # name, transaction_type, service_type, min_amount, max_amount, rate
+    ('Hotel rooms up to ₹7,500 per night', 'HOTEL_BOOKING', '', '0', '7500.00', '12.00'),
+    ('Hotel rooms above ₹7,500 per night', 'HOTEL_BOOKING', '', '7500.01', None, '18.00'),
+    ('Air travel (economy)', 'TRANSPORT_BOOKING', 'FLIGHT', '0', None, '5.00'),
+    ('Rail travel (AC)', 'TRANSPORT_BOOKING', 'TRAIN', '0', None, '5.00'),
+    ('Bus travel', 'TRANSPORT_BOOKING', 'BUS', '0', None, '5.00'),
+    ('Standard GST', '', '', '0', None, '18.00'),
+]
+
+
+def seed_tax_rules(apps, schema_editor):
+    TaxRule = apps.get_model('payment_management', 'TaxRule')
+    TaxRule.objects.bulk_create([
+        TaxRule(
+            name=name,
+            transaction_type=transaction_type,
+            service_type=service_type,
+            min_amount=Decimal(min_amount),
+            max_amount=Decimal(max_amount) if max_amount else None,
+            rate=Decimal(rate),
+            effective_from=datetime.date(2017, 7, 1),
+        )
+        for name, transaction_type, service_type, min_amount, max_amount, rate in DEFAULT_RULES
+    ])
+
+
+def remove_tax_rules(apps, schema_editor):
+    TaxRule = apps.get_model('payment_management', 'TaxRule')
+    TaxRule.objects.filter(name__in=[rule[0] for rule in DEFAULT_RULES]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_management', '0006_tax_rules'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_tax_rules, remove_tax_rules),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:00
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+PAID_STATUSES = ('SUCCESS', 'REFUNDED')
+BUCKETS = {'HOTEL_BOOKING': 'hotel', 'TRANSPORT_BOOKING': 'transport'}
+ZERO = Decimal('0')
+
+
+def backfill_spending_summaries(apps, schema_editor):
+    Transaction = apps.get_model('payment_management', 'Transaction')
+    UserSpendingSummary = apps.get_model('payment_management', 'UserSpendingSummary')
+
+    aggregates = {}
+    for transaction_type, bucket in list(BUCKETS.items()) + [(None, 'other')]:
+        in_bucket = Q(transaction_type=transaction_type) if transaction_type else ~Q(transaction_type__in=list(BUCKETS))
+        aggregates[f'{bucket}_gross'] = Coalesce(Sum('amount', filter=in_bucket), Value(ZERO))
+        aggregates[f'{bucket}_refunded'] = Coalesce(Sum('refund_amount', filter=in_bucket), Value(ZERO))
+        aggregates[f'{bucket}_transactions'] = Count('id', filter=in_bucket)
+    aggregates['last_transaction_at'] = Max(Coalesce('completed_at', 'initiated_at'))
+
+    rows = Transaction.objects.filter(status__in=PAID_STATUSES).order_by().values('user_id').annotate(**aggregates)
+    now = timezone.now()
+    summaries = []
+    for row in rows:
+        summary = UserSpendingSummary(user_id=row['user_id'], last_transaction_at=row['last_transaction_at'], updated_at=now)
+        for bucket in ('hotel', 'transport', 'other'):
+            setattr(summary, f'{bucket}_spent', row[f'{bucket}_gross'] - row[f'{bucket}_refunded'])
+            setattr(summary, f'{bucket}_transactions', row[f'{bucket}_transactions'])
+        summary.total_refunded = sum(row[f'{bucket}_refunded'] for bucket in ('hotel', 'transport', 'other'))
+        summaries.append(summary)
+    UserSpendingSummary.objects.bulk_create(summaries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_management', '0008_refund_processing'),
+        ('user_management', '0002_alter_customuser_phone_number'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSpendingSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='spending_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('hotel_spent', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('transport_spent', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('other_spent', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_refunded', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('hotel_transactions', models.PositiveIntegerField(default=0)),
+                ('transport_transactions', models.PositiveIntegerField(default=0)),
+                ('other_transactions', models.PositiveIntegerField(default=0)),
+                ('last_transaction_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_spending_summaries, migrations.RunPython.noop),
+    ]
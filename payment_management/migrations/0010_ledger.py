@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_management', '0009_spending_summary'),
+        ('service_provider', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerAccount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=100, unique=True)),
+                ('kind', models.CharField(choices=[('CUSTOMER', 'Customer'), ('GATEWAY_CLEARING', 'Gateway Clearing'), ('PLATFORM_COMMISSION', 'Platform Commission'), ('PROVIDER_PAYABLE', 'Provider Payable'), ('TAX_PAYABLE', 'Tax Payable')], max_length=30)),
+                ('business_line', models.CharField(blank=True, max_length=20)),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_debits', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_credits', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('provider', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_accounts', to='service_provider.serviceprovider')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_accounts', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LedgerJournal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=100, unique=True)),
+                ('journal_type', models.CharField(choices=[('CAPTURE', 'Payment Capture'), ('REFUND', 'Refund'), ('SETTLEMENT', 'Provider Settlement'), ('ADJUSTMENT', 'Adjustment')], max_length=20)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('refund', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_journals', to='payment_management.refund')),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_journals', to='payment_management.transaction')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('debit', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('credit', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('balance_after', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='entries', to='payment_management.ledgeraccount')),
+                ('journal', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='entries', to='payment_management.ledgerjournal')),
+            ],
+            options={
+                'ordering': ['account', 'id'],
+                'indexes': [models.Index(fields=['account', 'created_at', 'id'], name='payment_man_account_51dc5e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_management', '0012_outbox_claimed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='invoicedocument',
+            name='source_key',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from decimal import Decimal
 import uuid
 import random
@@ -87,7 +88,8 @@ class Transaction(models.Model):
     # Payment details
     payment_method = models.ForeignKey(PaymentMethod, on_delete=models.SET_NULL, null=True, blank=True)
     payment_gateway = models.CharField(max_length=50, default='Razorpay')
-    gateway_transaction_id = models.CharField(max_length=100, blank=True)
+    gateway_transaction_id = models.CharField(max_length=100, blank=True, db_index=True)
+    gateway_payment_id = models.CharField(max_length=100, blank=True, db_index=True)
     
     # Status and timing
     status = models.CharField(max_length=20, choices=TRANSACTION_STATUS, default='PENDING')
@@ -96,6 +98,8 @@ class Transaction(models.Model):
     
     # Additional info
     failure_reason = models.TextField(blank=True)
+    # Created by simulate_gateway_webhooks; kept out of the ledger, spending summaries and exports
+    is_synthetic = models.BooleanField(default=False)
     refund_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     refund_date = models.DateTimeField(null=True, blank=True)
     
@@ -116,12 +120,14 @@ class Invoice(models.Model):
     # Amounts
     subtotal = models.DecimalField(max_digits=10, decimal_places=2)
     tax_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    tax_rate = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)  # Percent applied
     discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     
     # Status
     is_paid = models.BooleanField(default=False)
     paid_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)  # Bulk updates must set it too (statement ETags)
     
     def save(self, *args, **kwargs):
         if not self.invoice_number:
@@ -138,6 +144,7 @@ class Refund(models.Model):
         ('APPROVED', 'Approved'),
         ('REJECTED', 'Rejected'),
         ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
     ]
     
     refund_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
@@ -159,8 +166,302 @@ class Refund(models.Model):
     # Admin notes
     admin_notes = models.TextField(blank=True)
     
+    # Gateway processing (see payment_management.refunds)
+    gateway_refund_id = models.CharField(max_length=100, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    
     def __str__(self):
         return f"Refund {self.refund_id} - {self.status}"
     
     class Meta:
-        ordering = ['-requested_at']
\ No newline at end of file
+        ordering = ['-requested_at']
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+        ]
+
+class PaymentWebhookEvent(models.Model):
+    """Gateway webhook delivery, stored before it is processed by the worker"""
+    EVENT_STATUS = [
+        ('PENDING', 'Pending'),
+        ('PROCESSING', 'Processing'),
+        ('PROCESSED', 'Processed'),
+        ('IGNORED', 'Ignored'),
+        ('FAILED', 'Failed'),
+    ]
+    
+    # Gateway event identity (X-Razorpay-Event-Id, or a hash of the body)
+    event_id = models.CharField(max_length=100, unique=True)
+    event_type = models.CharField(max_length=50)
+    gateway = models.CharField(max_length=50, default='Razorpay')
+    
+    # Raw delivery
+    payload = models.JSONField()
+    signature = models.CharField(max_length=128, blank=True)
+    
+    # Extracted references
+    gateway_order_id = models.CharField(max_length=100, blank=True)
+    gateway_payment_id = models.CharField(max_length=100, blank=True)
+    transaction = models.ForeignKey(Transaction, on_delete=models.SET_NULL, null=True, blank=True, related_name='webhook_events')
+    
+    # Processing state
+    status = models.CharField(max_length=20, choices=EVENT_STATUS, default='PENDING')
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)  # When a worker moved it to PROCESSING
+    
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"Webhook {self.event_type} ({self.event_id}) - {self.status}"
+    
+    class Meta:
+        ordering = ['received_at']
+        indexes = [
+            models.Index(fields=['status', 'received_at']),
+        ]
+
+
+class ReconciliationIssue(models.Model):
+    """Discrepancy found while matching a gateway settlement file against Transactions"""
+    ISSUE_TYPE = [
+        ('AMOUNT_MISMATCH', 'Amount Mismatch'),
+        ('STATUS_MISMATCH', 'Status Mismatch'),
+        ('MISSING_CAPTURE', 'Missing Capture'),
+        ('ORPHAN_PAYMENT', 'Orphan Payment'),
+        ('STALE_PROCESSING', 'Stale Processing'),
+    ]
+    
+    run_id = models.UUIDField(db_index=True)
+    issue_type = models.CharField(max_length=20, choices=ISSUE_TYPE)
+    transaction = models.ForeignKey(Transaction, on_delete=models.SET_NULL, null=True, blank=True, related_name='reconciliation_issues')
+    
+    # What each side reported
+    gateway_order_id = models.CharField(max_length=100, blank=True)
+    gateway_payment_id = models.CharField(max_length=100, blank=True)
+    local_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    gateway_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    local_status = models.CharField(max_length=20, blank=True)
+    gateway_status = models.CharField(max_length=20, blank=True)
+    
+    # Resolution
+    resolved = models.BooleanField(default=False)
+    resolution = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.get_issue_type_display()} - {self.gateway_order_id or self.gateway_payment_id}"
+    
+    class Meta:
+        ordering = ['-created_at']
+
+
+class OutboxMessage(models.Model):
+    """Post-payment side effect, written in the same DB transaction as the payment"""
+    TOPIC = [
+        ('INVOICE', 'Create Invoice'),
+        ('PROVIDER_EARNINGS', 'Record Provider Earnings'),
+        ('PROVIDER_NOTIFICATION', 'Notify Provider'),
+        ('RECEIPT_EMAIL', 'Send Receipt Email'),
+    ]
+    
+    MESSAGE_STATUS = [
+        ('PENDING', 'Pending'),
+        ('PROCESSING', 'Processing'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+    
+    topic = models.CharField(max_length=30, choices=TOPIC)
+    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='outbox_messages')
+    payload = models.JSONField(default=dict, blank=True)
+    
+    # Delivery state
+    status = models.CharField(max_length=20, choices=MESSAGE_STATUS, default='PENDING')
+    attempts = models.IntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)  # When a worker moved it to PROCESSING
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.topic} for {self.transaction_id} - {self.status}"
+    
+    class Meta:
+        ordering = ['available_at']
+        unique_together = ['topic', 'transaction']
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+        ]
+
+
+class InvoiceDocument(models.Model):
+    """Rendered invoice or monthly statement, stored once in content-addressed storage"""
+    DOCUMENT_KIND = [
+        ('INVOICE', 'Invoice'),
+        ('STATEMENT', 'Monthly Statement'),
+    ]
+    
+    DOCUMENT_FORMAT = [
+        ('html', 'HTML'),
+        ('pdf', 'PDF'),
+    ]
+    
+    kind = models.CharField(max_length=10, choices=DOCUMENT_KIND, default='INVOICE')
+    format = models.CharField(max_length=4, choices=DOCUMENT_FORMAT, default='html')
+    invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, null=True, blank=True, related_name='documents')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='invoice_documents')
+    period = models.DateField(null=True, blank=True)  # First day of the statement month
+    
+    # Storage (name is derived from the SHA-256 of the content)
+    content_hash = models.CharField(max_length=64, db_index=True)
+    storage_name = models.CharField(max_length=255)
+    size = models.PositiveIntegerField(default=0)
+    # Statements: digest of the invoices rendered (see invoice_documents.statement_source_key)
+    source_key = models.CharField(max_length=64, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        target = self.invoice.invoice_number if self.invoice_id else self.period
+        return f"{self.get_kind_display()} {target} ({self.format})"
+    
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['invoice', 'format'], condition=models.Q(kind='INVOICE'), name='unique_invoice_document'),
+            models.UniqueConstraint(fields=['user', 'period', 'format'], condition=models.Q(kind='STATEMENT'), name='unique_statement_document'),
+        ]
+
+class TaxRule(models.Model):
+    """GST rate for a transaction type / service, amount slab and date range"""
+    name = models.CharField(max_length=100)
+    # Blank matches any transaction type / service
+    transaction_type = models.CharField(max_length=20, choices=Transaction.TRANSACTION_TYPE, blank=True)
+    service_type = models.CharField(max_length=20, blank=True)  # Route transport_type for transport bookings
+
+    # Slab: min_amount <= basis <= max_amount (no upper bound when max_amount is empty).
+    # The basis is the room price per night for hotel bookings, the invoice subtotal otherwise.
+    min_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    max_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    rate = models.DecimalField(max_digits=5, decimal_places=2)  # Percent, e.g. 18.00
+    effective_from = models.DateField()
+    effective_to = models.DateField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.rate}%)"
+
+    class Meta:
+        ordering = ['transaction_type', 'service_type', 'min_amount', 'effective_from']
+
+class UserSpendingSummary(models.Model):
+    """Per-user spending totals, kept current by payment_management.spending"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='spending_summary')
+    
+    # Net of refunds
+    hotel_spent = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    transport_spent = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    other_spent = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_refunded = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    # Paid (SUCCESS or REFUNDED) transactions
+    hotel_transactions = models.PositiveIntegerField(default=0)
+    transport_transactions = models.PositiveIntegerField(default=0)
+    other_transactions = models.PositiveIntegerField(default=0)
+    
+    last_transaction_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    @property
+    def lifetime_value(self):
+        return self.hotel_spent + self.transport_spent + self.other_spent
+    
+    @property
+    def paid_transactions(self):
+        return self.hotel_transactions + self.transport_transactions + self.other_transactions
+    
+    def __str__(self):
+        return f"Spending summary for {self.user}"
+
+class LedgerAccount(models.Model):
+    """Double-entry ledger account with a running balance snapshot (see payment_management.ledger)"""
+    ACCOUNT_KIND = [
+        ('CUSTOMER', 'Customer'),
+        ('GATEWAY_CLEARING', 'Gateway Clearing'),
+        ('PLATFORM_COMMISSION', 'Platform Commission'),
+        ('PROVIDER_PAYABLE', 'Provider Payable'),
+        ('TAX_PAYABLE', 'Tax Payable'),
+    ]
+    
+    code = models.CharField(max_length=100, unique=True)
+    kind = models.CharField(max_length=30, choices=ACCOUNT_KIND)
+    # PROTECT on purpose: the ledger is append-only, so a user, provider or
+    # transaction with postings cannot be deleted (see LedgerProtectedDeleteMixin)
+    user = models.ForeignKey(User, on_delete=models.PROTECT, null=True, blank=True, related_name='ledger_accounts')
+    provider = models.ForeignKey('service_provider.ServiceProvider', on_delete=models.PROTECT, null=True, blank=True, related_name='ledger_accounts')
+    business_line = models.CharField(max_length=20, blank=True)  # HOTEL / TRANSPORT for provider accounts
+    
+    # Snapshots, updated with every posting. balance = total_debits - total_credits
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_debits = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_credits = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    @property
+    def normal_balance(self):
+        """Balance on the account's natural side (credit-side for liabilities and revenue)"""
+        if self.kind in ('CUSTOMER', 'GATEWAY_CLEARING'):
+            return self.balance
+        return -self.balance
+    
+    def __str__(self):
+        return self.code
+
+class LedgerJournal(models.Model):
+    """One balanced posting; idempotency_key makes re-posting a no-op"""
+    JOURNAL_TYPE = [
+        ('CAPTURE', 'Payment Capture'),
+        ('REFUND', 'Refund'),
+        ('SETTLEMENT', 'Provider Settlement'),
+        ('ADJUSTMENT', 'Adjustment'),
+    ]
+    
+    idempotency_key = models.CharField(max_length=100, unique=True)
+    journal_type = models.CharField(max_length=20, choices=JOURNAL_TYPE)
+    description = models.CharField(max_length=255, blank=True)
+    transaction = models.ForeignKey(Transaction, on_delete=models.PROTECT, null=True, blank=True, related_name='ledger_journals')
+    refund = models.ForeignKey(Refund, on_delete=models.PROTECT, null=True, blank=True, related_name='ledger_journals')
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    def __str__(self):
+        return f"{self.journal_type} {self.idempotency_key}"
+    
+    class Meta:
+        ordering = ['-created_at']
+
+class LedgerEntry(models.Model):
+    """Append-only ledger line; never updated or deleted"""
+    journal = models.ForeignKey(LedgerJournal, on_delete=models.PROTECT, related_name='entries')
+    account = models.ForeignKey(LedgerAccount, on_delete=models.PROTECT, related_name='entries')
+    debit = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    credit = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    balance_after = models.DecimalField(max_digits=14, decimal_places=2)  # Account balance including this line
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.account.code} Dr {self.debit} Cr {self.credit}"
+    
+    class Meta:
+        ordering = ['account', 'id']
+        indexes = [
+            models.Index(fields=['account', 'created_at', 'id']),
+        ]
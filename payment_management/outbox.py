@@ -0,0 +1,239 @@
+# payment_management/outbox.py
+"""
+Transactional outbox for post-payment side effects.
+
+confirm_transaction() writes one OutboxMessage per side effect inside the
+same DB transaction that marks the payment successful. A worker
+(`python manage.py drain_outbox`) delivers them afterwards, so payment
+confirmation never waits on SMTP or other downstream work.
+
+A transaction's messages run in TOPIC_ORDER. Once one of them fails, the
+later ones wait for it: they are retried after it, or marked FAILED with
+it when it runs out of attempts. Messages left in PROCESSING by a worker
+that died go back to PENDING after OUTBOX_CLAIM_TIMEOUT_SECONDS.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from worker_utils import InlineWorker
+
+from .models import OutboxMessage, Transaction
+
+logger = logging.getLogger(__name__)
+
+# Messages for one transaction are delivered in this order (the receipt
+# includes the invoice, so the invoice goes first)
+TOPIC_ORDER = ['INVOICE', 'PROVIDER_EARNINGS', 'PROVIDER_NOTIFICATION', 'RECEIPT_EMAIL']
+
+
+def enqueue_post_payment_messages(transaction_obj):
+    """Queue every post-payment side effect. Call inside the confirming transaction."""
+    OutboxMessage.objects.bulk_create(
+        [OutboxMessage(topic=topic, transaction=transaction_obj) for topic in TOPIC_ORDER],
+        ignore_conflicts=True,
+    )
+
+
+def _booking_provider(transaction_obj):
+    """(provider, booking, booking field name) for a transaction's booking"""
+    if transaction_obj.hotel_booking:
+        booking = transaction_obj.hotel_booking
+        return booking.hotel.owner, booking, 'hotel_booking'
+    if transaction_obj.transport_booking:
+        booking = transaction_obj.transport_booking
+        return booking.route.owner, booking, 'transport_booking'
+    return None, None, None
+
+
+# HANDLERS
+def handle_invoice(transaction_obj, payload):
+    from .invoice_documents import get_invoice_document
+    from .views import create_invoice_for_transaction
+
+    invoice = create_invoice_for_transaction(transaction_obj)
+    if invoice is None:
+        raise RuntimeError('Invoice could not be created')
+    # Render the downloadable copy now so the first download is a cache hit
+    get_invoice_document(invoice)
+
+
+def handle_receipt_email(transaction_obj, payload):
+    from .views import send_booking_receipt_email
+
+    if not (transaction_obj.hotel_booking or transaction_obj.transport_booking):
+        return
+    if not send_booking_receipt_email(transaction_obj):
+        raise RuntimeError('Receipt email was not sent')
+
+
+def handle_provider_notification(transaction_obj, payload):
+    from service_provider.models import ProviderNotification
+
+    provider, booking, booking_field = _booking_provider(transaction_obj)
+    if provider is None:
+        return
+
+    already_sent = ProviderNotification.objects.filter(
+        provider=provider, notification_type='BOOKING', **{booking_field: booking}
+    ).exists()
+    if already_sent:
+        return
+
+    ProviderNotification.objects.create(
+        provider=provider,
+        notification_type='BOOKING',
+        title=f'New booking {booking.booking_id}',
+        message=f'{transaction_obj.user.get_full_name() or transaction_obj.user.username} paid '
+                f'₹{transaction_obj.amount} for booking {booking.booking_id}.',
+        **{booking_field: booking}
+    )
+
+
+def handle_provider_earnings(transaction_obj, payload):
+    from service_provider.models import ProviderEarnings, ServiceProvider
+
+    from .ledger import post_capture
+
+    provider, booking, booking_field = _booking_provider(transaction_obj)
+    with transaction.atomic():
+        if provider is not None and not ProviderEarnings.objects.filter(provider=provider, **{booking_field: booking}).exists():
+            commission_amount = (transaction_obj.amount * provider.commission_rate / Decimal('100')).quantize(
+                Decimal('0.01'), rounding=ROUND_HALF_UP)
+            earnings = ProviderEarnings.objects.create(
+                provider=provider,
+                booking_amount=transaction_obj.amount,
+                commission_rate=provider.commission_rate,
+                commission_amount=commission_amount,
+                provider_earnings=transaction_obj.amount - commission_amount,
+                **{booking_field: booking}
+            )
+            ServiceProvider.objects.filter(pk=provider.pk).update(
+                total_earnings=F('total_earnings') + earnings.provider_earnings
+            )
+        # Idempotent, so a retried message never double-posts
+        if not transaction_obj.is_synthetic:
+            post_capture(transaction_obj)
+
+
+HANDLERS = {
+    'INVOICE': handle_invoice,
+    'PROVIDER_EARNINGS': handle_provider_earnings,
+    'PROVIDER_NOTIFICATION': handle_provider_notification,
+    'RECEIPT_EMAIL': handle_receipt_email,
+}
+
+
+# WORKER
+def _deliver(message, transaction_obj):
+    max_attempts = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 6)
+    retry_base = getattr(settings, 'OUTBOX_RETRY_BASE_SECONDS', 30)
+
+    message.attempts += 1
+    try:
+        HANDLERS[message.topic](transaction_obj, message.payload)
+    except Exception as e:
+        logger.error(f"Outbox {message.topic} for transaction {transaction_obj.transaction_id} failed: {str(e)}")
+        message.last_error = str(e)
+        if message.attempts >= max_attempts:
+            message.status = 'FAILED'
+        else:
+            message.status = 'PENDING'
+            message.available_at = timezone.now() + timedelta(seconds=retry_base * 2 ** (message.attempts - 1))
+    else:
+        message.status = 'DONE'
+        message.last_error = ''
+        message.processed_at = timezone.now()
+
+    message.claimed_at = None
+    message.save(update_fields=['status', 'attempts', 'available_at', 'last_error', 'claimed_at', 'processed_at'])
+    return message.status
+
+
+def _hold(message, blocker):
+    """Keep a message back until the earlier topic that failed gets through"""
+    if blocker.status == 'FAILED':
+        message.status = 'FAILED'
+        message.last_error = f'Not delivered: {blocker.topic} failed'
+    else:
+        message.status = 'PENDING'
+        message.last_error = f'Waiting for {blocker.topic}'
+        retry_base = getattr(settings, 'OUTBOX_RETRY_BASE_SECONDS', 30)
+        message.available_at = max(blocker.available_at, timezone.now() + timedelta(seconds=retry_base))
+    message.claimed_at = None
+    message.save(update_fields=['status', 'available_at', 'last_error', 'claimed_at'])
+    return message.status
+
+
+def _deliver_group(transaction_pk, messages):
+    """Deliver one transaction's messages in TOPIC_ORDER, stopping at the first failure (runs in a worker thread)"""
+    try:
+        transaction_obj = Transaction.objects.select_related(
+            'user', 'hotel_booking__hotel__owner', 'transport_booking__route__owner'
+        ).get(pk=transaction_pk)
+        messages.sort(key=lambda m: TOPIC_ORDER.index(m.topic))
+        # An earlier topic still outstanding from a previous batch holds back the ones after it
+        outstanding = OutboxMessage.objects.filter(transaction_id=transaction_pk).exclude(
+            status='DONE').exclude(pk__in=[message.pk for message in messages])
+        blocker = min(outstanding, key=lambda m: TOPIC_ORDER.index(m.topic), default=None)
+
+        statuses = []
+        for message in messages:
+            if blocker is not None and TOPIC_ORDER.index(message.topic) > TOPIC_ORDER.index(blocker.topic):
+                statuses.append(_hold(message, blocker))
+                continue
+            status = _deliver(message, transaction_obj)
+            statuses.append(status)
+            if status != 'DONE' and blocker is None:
+                blocker = message
+        return statuses
+    finally:
+        connection.close()
+
+
+def release_stale_claims():
+    """Put messages claimed by a worker that died back to PENDING"""
+    timeout = getattr(settings, 'OUTBOX_CLAIM_TIMEOUT_SECONDS', 300)
+    # No claimed_at: claimed before the column existed
+    return OutboxMessage.objects.filter(
+        Q(claimed_at__lt=timezone.now() - timedelta(seconds=timeout)) | Q(claimed_at__isnull=True),
+        status='PROCESSING',
+    ).update(status='PENDING', claimed_at=None)
+
+
+def drain_outbox(batch_size=None, max_workers=None):
+    """Deliver one batch of due messages concurrently. Returns a count per resulting status."""
+    batch_size = batch_size or getattr(settings, 'OUTBOX_BATCH_SIZE', 100)
+    max_workers = max_workers or getattr(settings, 'OUTBOX_MAX_WORKERS', 4)
+
+    released = release_stale_claims()
+    if released:
+        logger.warning(f"Released {released} outbox messages left in PROCESSING")
+
+    now = timezone.now()
+    due = list(OutboxMessage.objects.filter(status='PENDING', available_at__lte=now)[:batch_size])
+
+    groups = {}
+    for message in due:
+        # Claim; another worker may have taken it already
+        if OutboxMessage.objects.filter(pk=message.pk, status='PENDING').update(status='PROCESSING', claimed_at=now) == 1:
+            groups.setdefault(message.transaction_id, []).append(message)
+
+    counts = {}
+    if not groups:
+        return counts
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for statuses in pool.map(lambda item: _deliver_group(*item), groups.items()):
+            for status in statuses:
+                counts[status] = counts.get(status, 0) + 1
+    return counts
+
+
+kick_inline_worker = InlineWorker(drain_outbox, 'OUTBOX_INLINE_WORKER').kick
@@ -0,0 +1,329 @@
+# payment_management/reconciliation.py
+"""
+Reconcile gateway settlement/report files against Transaction rows.
+
+Files are streamed record by record. Each chunk of records is joined in
+memory against one indexed lookup of the matching Transactions (by
+gateway_transaction_id, falling back to gateway_payment_id), so a file
+costs one query per chunk rather than one per line.
+"""
+import csv
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import PaymentWebhookEvent, ReconciliationIssue, Transaction
+
+logger = logging.getLogger(__name__)
+
+# Gateway status -> the local status it implies
+GATEWAY_STATUS_MAP = {
+    'captured': 'SUCCESS',
+    'settled': 'SUCCESS',
+    'failed': 'FAILED',
+    'refunded': 'REFUNDED',
+}
+
+TRANSACTION_FIELDS = ('id', 'transaction_id', 'amount', 'status', 'gateway_transaction_id', 'gateway_payment_id', 'completed_at')
+
+
+class SettlementRecord:
+    """One normalized payment line from a settlement or payments report"""
+    __slots__ = ('order_id', 'payment_id', 'amount', 'status', 'timestamp')
+
+    def __init__(self, order_id, payment_id, amount, status, timestamp):
+        self.order_id = order_id
+        self.payment_id = payment_id
+        self.amount = amount
+        self.status = status
+        self.timestamp = timestamp
+
+
+def _parse_timestamp(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, (int, float)) or str(value).isdigit():
+        return datetime.fromtimestamp(int(value), tz=dt_timezone.utc)
+    parsed = parse_datetime(str(value))
+    if parsed and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def _parse_amount(value, amount_unit):
+    try:
+        amount = Decimal(str(value).replace(',', ''))
+    except (InvalidOperation, TypeError):
+        return None
+    if amount_unit == 'paise':
+        amount = amount / 100
+    return amount.quantize(Decimal('0.01'))
+
+
+def normalize_record(row, amount_unit='rupees'):
+    """Map a raw CSV/JSON row onto a SettlementRecord; None for non-payment lines"""
+    row = {str(key).strip().lower(): value for key, value in row.items()}
+
+    row_type = (row.get('type') or row.get('entity') or 'payment').strip().lower()
+    if row_type != 'payment':
+        return None
+
+    payment_id = row.get('payment_id') or row.get('entity_id') or ''
+    if not payment_id and str(row.get('id', '')).startswith('pay_'):
+        payment_id = row['id']
+
+    return SettlementRecord(
+        order_id=(row.get('order_id') or row.get('gateway_transaction_id') or '').strip(),
+        payment_id=str(payment_id).strip(),
+        amount=_parse_amount(row.get('amount', row.get('credit')), amount_unit),
+        status=(row.get('status') or 'captured').strip().lower(),
+        timestamp=_parse_timestamp(row.get('settled_at') or row.get('captured_at') or row.get('created_at')),
+    )
+
+
+def _iter_json_array(handle, read_size=65536):
+    """Yield the elements of a top-level JSON array without loading the file"""
+    decoder = json.JSONDecoder()
+    buffer = handle.read(read_size).lstrip()
+
+    if buffer.startswith('{'):
+        # API-style {"items": [...]} document
+        document = json.loads(buffer + handle.read())
+        yield from document.get('items', [document])
+        return
+
+    if not buffer.startswith('['):
+        raise ValueError('Expected a JSON array of settlement records')
+    buffer = buffer[1:]
+
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            obj, end = decoder.raw_decode(buffer)
+        except ValueError:
+            more = handle.read(read_size)
+            if not more:
+                raise
+            buffer += more
+            continue
+        yield obj
+        buffer = buffer[end:]
+
+
+def iter_settlement_rows(path, file_format=None):
+    """Stream raw rows from a CSV, JSON array or JSON-lines file"""
+    file_format = file_format or path.rsplit('.', 1)[-1].lower()
+
+    with open(path, newline='', encoding='utf-8') as handle:
+        if file_format == 'csv':
+            yield from csv.DictReader(handle)
+        elif file_format in ('jsonl', 'ndjson'):
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+        elif file_format == 'json':
+            yield from _iter_json_array(handle)
+        else:
+            raise ValueError(f'Unsupported settlement file format: {file_format}')
+
+
+def iter_settlement_records(path, file_format=None, amount_unit='rupees'):
+    for row in iter_settlement_rows(path, file_format):
+        record = normalize_record(row, amount_unit)
+        if record is not None:
+            yield record
+
+
+def _capture_event(transaction_row, record):
+    """Synthetic payment.captured event replayed through the webhook worker"""
+    key = record.payment_id or record.order_id
+    return PaymentWebhookEvent(
+        event_id=f'recon_{key}'[:100],
+        event_type='payment.captured',
+        gateway='Reconciliation',
+        gateway_order_id=transaction_row['gateway_transaction_id'],
+        gateway_payment_id=record.payment_id,
+        payload={
+            'event': 'payment.captured',
+            'payload': {'payment': {'entity': {
+                'id': record.payment_id,
+                'order_id': transaction_row['gateway_transaction_id'],
+                'amount': int(transaction_row['amount'] * 100),
+                'status': 'captured',
+                'notes': {'transaction_id': str(transaction_row['transaction_id'])},
+            }}},
+        },
+    )
+
+
+class Reconciler:
+    """
+    Hash-join settlement records against Transactions and collect issues.
+    With fix=True, stuck captures are replayed through the webhook worker
+    and gateway-failed or stale PROCESSING rows are failed in bulk.
+    """
+
+    def __init__(self, fix=False, stale_after=timedelta(hours=24), chunk_size=5000, now=None):
+        self.fix = fix
+        self.stale_after = stale_after
+        self.chunk_size = chunk_size
+        self.now = now or timezone.now()
+        self.run_id = uuid.uuid4()
+
+        self.issues = []
+        self.seen_ids = set()
+        self.to_fail = {}
+        self.capture_events = []
+        self.window_start = None
+        self.window_end = None
+        self.stats = {'records': 0, 'matched': 0, 'captures_replayed': 0, 'marked_failed': 0}
+
+    def _issue(self, issue_type, record=None, row=None, resolved=False, resolution=''):
+        self.issues.append(ReconciliationIssue(
+            run_id=self.run_id,
+            issue_type=issue_type,
+            transaction_id=row['id'] if row else None,
+            gateway_order_id=(record.order_id if record else '') or (row['gateway_transaction_id'] if row else ''),
+            gateway_payment_id=(record.payment_id if record else '') or (row['gateway_payment_id'] if row else ''),
+            local_amount=row['amount'] if row else None,
+            gateway_amount=record.amount if record else None,
+            local_status=row['status'] if row else '',
+            gateway_status=record.status if record else '',
+            resolved=resolved,
+            resolution=resolution,
+        ))
+
+    def _build_index(self, records):
+        """One indexed query per chunk, keyed by order id and payment id"""
+        order_ids = {r.order_id for r in records if r.order_id}
+
+        by_order, by_payment = {}, {}
+        if order_ids:
+            for row in Transaction.objects.filter(gateway_transaction_id__in=order_ids).values(*TRANSACTION_FIELDS):
+                by_order[row['gateway_transaction_id']] = row
+        unmatched = {r.payment_id for r in records if r.payment_id and r.order_id not in by_order}
+        if unmatched:
+            for row in Transaction.objects.filter(gateway_payment_id__in=unmatched).values(*TRANSACTION_FIELDS):
+                by_payment[row['gateway_payment_id']] = row
+        return by_order, by_payment
+
+    def _match_chunk(self, records):
+        by_order, by_payment = self._build_index(records)
+
+        for record in records:
+            row = by_order.get(record.order_id) or by_payment.get(record.payment_id)
+            expected = GATEWAY_STATUS_MAP.get(record.status)
+
+            if row is None:
+                if expected == 'SUCCESS':
+                    self._issue('ORPHAN_PAYMENT', record)
+                continue
+
+            self.stats['matched'] += 1
+            self.seen_ids.add(row['id'])
+            # The file's own timestamps may be settlement times, days after
+            # capture: span the window over our completed_at instead
+            if row['completed_at']:
+                self.window_start = min(self.window_start or row['completed_at'], row['completed_at'])
+                self.window_end = max(self.window_end or row['completed_at'], row['completed_at'])
+
+            if expected == 'SUCCESS':
+                if record.amount is not None and record.amount != row['amount']:
+                    self._issue('AMOUNT_MISMATCH', record, row)
+                elif row['status'] != 'SUCCESS':
+                    replay = self.fix and row['status'] in ('PENDING', 'PROCESSING', 'FAILED')
+                    if replay:
+                        self.capture_events.append(_capture_event(row, record))
+                    self._issue('STATUS_MISMATCH', record, row, resolved=replay,
+                                resolution='Capture replayed through webhook worker' if replay else '')
+            elif expected == 'FAILED' and row['status'] in ('PENDING', 'PROCESSING'):
+                if self.fix:
+                    self.to_fail[row['id']] = 'Payment failed at gateway (reconciliation)'
+                self._issue('STATUS_MISMATCH', record, row, resolved=self.fix,
+                            resolution='Marked failed' if self.fix else '')
+            elif expected and expected != row['status'] and row['status'] not in ('REFUNDED', 'CANCELLED'):
+                self._issue('STATUS_MISMATCH', record, row)
+
+    def _scan_unseen(self):
+        """Anti-join: local rows the gateway file should have contained"""
+        if self.window_start and self.window_end:
+            successes = Transaction.objects.filter(
+                status='SUCCESS',
+                completed_at__range=(self.window_start, self.window_end),
+            ).exclude(gateway_transaction_id='').values(*TRANSACTION_FIELDS)
+            for row in successes.iterator(chunk_size=self.chunk_size):
+                if row['id'] not in self.seen_ids:
+                    self._issue('MISSING_CAPTURE', row=row)
+
+        stale = Transaction.objects.filter(
+            status='PROCESSING',
+            initiated_at__lt=self.now - self.stale_after,
+        ).values(*TRANSACTION_FIELDS)
+        for row in stale.iterator(chunk_size=self.chunk_size):
+            if row['id'] in self.seen_ids:
+                continue
+            if self.fix:
+                self.to_fail[row['id']] = 'Payment not captured by gateway (reconciliation)'
+            self._issue('STALE_PROCESSING', row=row, resolved=self.fix,
+                        resolution='Marked failed' if self.fix else '')
+
+    def _apply_fixes(self):
+        if self.capture_events:
+            # Only count events actually inserted: earlier runs may have replayed the same capture
+            events = {event.event_id: event for event in self.capture_events}
+            existing = set()
+            event_ids = list(events)
+            for start in range(0, len(event_ids), 500):
+                existing.update(PaymentWebhookEvent.objects.filter(
+                    event_id__in=event_ids[start:start + 500]).values_list('event_id', flat=True))
+            new_events = [event for event_id, event in events.items() if event_id not in existing]
+            PaymentWebhookEvent.objects.bulk_create(new_events, batch_size=500, ignore_conflicts=True)
+            self.stats['captures_replayed'] = len(new_events)
+
+        by_reason = {}
+        for transaction_pk, reason in self.to_fail.items():
+            by_reason.setdefault(reason, []).append(transaction_pk)
+        for reason, ids in by_reason.items():
+            for start in range(0, len(ids), 500):
+                self.stats['marked_failed'] += Transaction.objects.filter(
+                    id__in=ids[start:start + 500],
+                    status__in=['PENDING', 'PROCESSING'],
+                ).update(status='FAILED', failure_reason=reason)
+
+    def run(self, records):
+        started = time.perf_counter()
+        chunk = []
+        for record in records:
+            self.stats['records'] += 1
+            chunk.append(record)
+            if len(chunk) >= self.chunk_size:
+                self._match_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._match_chunk(chunk)
+
+        self._scan_unseen()
+        if self.fix:
+            self._apply_fixes()
+        ReconciliationIssue.objects.bulk_create(self.issues, batch_size=1000)
+
+        counts = {}
+        for issue in self.issues:
+            counts[issue.issue_type] = counts.get(issue.issue_type, 0) + 1
+
+        summary = dict(self.stats, run_id=str(self.run_id), issues=counts, elapsed=time.perf_counter() - started)
+        logger.info(f"Reconciliation {self.run_id}: {summary}")
+        return summary
+
+
+def reconcile_file(path, file_format=None, amount_unit='rupees', **options):
+    """Reconcile one settlement file and return the run summary"""
+    return Reconciler(**options).run(iter_settlement_records(path, file_format, amount_unit))
@@ -0,0 +1,295 @@
+# payment_management/refunds.py
+"""
+Refund pipeline.
+
+Cancellations price the refund from the cancellation policy and queue an
+APPROVED Refund row (request_refund / refund_cancelled_booking). The
+worker (`python manage.py process_refunds`) claims a batch, calls the
+gateway from a bounded thread pool - the threads never touch the
+database - and writes the results back with one bulk update for the
+Refund rows and one for their Transactions; completed refunds are
+posted to the ledger in the same database transaction. A Transaction
+becomes REFUNDED once its refunds add up to the full amount; a partial
+refund leaves its status as it was.
+
+A refund left in PROCESSING by a worker that died (processed_at older
+than REFUND_CLAIM_TIMEOUT_SECONDS) goes back to APPROVED and is retried.
+Keep the timeout well above the gateway call's own timeout, so a refund
+still in flight is never sent twice.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, CharField, DecimalField, F, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
+
+from worker_utils import InlineWorker
+
+from .ledger import post_refund
+from .models import Refund, Transaction
+from .spending import apply_refund_deltas
+
+logger = logging.getLogger(__name__)
+
+OPEN_REFUND_STATUSES = ['REQUESTED', 'APPROVED', 'PROCESSING']
+
+# (minimum notice before the service starts, percent of the payment refunded); first match wins
+HOTEL_CANCELLATION_POLICY = [
+    (timedelta(days=7), Decimal('100')),
+    (timedelta(days=2), Decimal('50')),
+]
+TRANSPORT_CANCELLATION_POLICY = [
+    (timedelta(hours=48), Decimal('90')),
+    (timedelta(hours=4), Decimal('50')),
+]
+HOTEL_CHECK_IN_TIME = time(14, 0)
+
+
+# POLICY
+def service_start(booking):
+    """When the stay or journey begins, as an aware datetime"""
+    if hasattr(booking, 'check_in_date'):
+        start = datetime.combine(booking.check_in_date, HOTEL_CHECK_IN_TIME)
+    else:
+        start = datetime.combine(booking.travel_date, booking.route.departure_time)
+    return timezone.make_aware(start)
+
+
+def refund_percent(booking, now=None, provider_initiated=False):
+    """Share of the payment returned when this booking is cancelled now"""
+    if provider_initiated:
+        return Decimal('100')
+
+    notice = service_start(booking) - (now or timezone.now())
+    policy = HOTEL_CANCELLATION_POLICY if hasattr(booking, 'check_in_date') else TRANSPORT_CANCELLATION_POLICY
+    for minimum_notice, percent in policy:
+        if notice >= minimum_notice:
+            return percent
+    return Decimal('0')
+
+
+def refundable_balance(transaction_obj):
+    """Paid amount not yet refunded or queued for refund"""
+    queued = transaction_obj.refunds.filter(status__in=OPEN_REFUND_STATUSES).aggregate(
+        total=Sum('approved_amount'))['total'] or Decimal('0')
+    return transaction_obj.amount - (transaction_obj.refund_amount or Decimal('0')) - queued
+
+
+def paid_transaction_for(booking):
+    booking_field = 'hotel_booking' if hasattr(booking, 'check_in_date') else 'transport_booking'
+    return Transaction.objects.filter(status='SUCCESS', **{booking_field: booking}).first()
+
+
+def refund_quote(booking, now=None, provider_initiated=False):
+    """(transaction, percent, amount) the cancellation policy allows; transaction is None when nothing was paid"""
+    transaction_obj = paid_transaction_for(booking)
+    if transaction_obj is None:
+        return None, Decimal('0'), Decimal('0.00')
+
+    percent = refund_percent(booking, now, provider_initiated)
+    amount = (transaction_obj.amount * percent / Decimal('100')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    return transaction_obj, percent, min(amount, refundable_balance(transaction_obj))
+
+
+# REQUESTS
+def request_refund(transaction_obj, amount, reason, admin_notes=''):
+    """Queue an approved refund for the worker. Returns the Refund, or None if nothing is refundable."""
+    with transaction.atomic():
+        transaction_obj = Transaction.objects.select_for_update().get(pk=transaction_obj.pk)
+        amount = min(Decimal(amount), refundable_balance(transaction_obj))
+        if transaction_obj.status != 'SUCCESS' or amount <= 0:
+            return None
+
+        refund = Refund.objects.create(
+            transaction=transaction_obj,
+            requested_amount=amount,
+            approved_amount=amount,
+            reason=reason,
+            status='APPROVED',
+            admin_notes=admin_notes,
+        )
+        kick_inline_worker()
+
+    logger.info(f"Refund {refund.refund_id} of ₹{amount} queued for transaction {transaction_obj.transaction_id}")
+    return refund
+
+
+def refund_cancelled_booking(booking, reason, provider_initiated=False):
+    """Price and queue the refund for a booking that has just been cancelled"""
+    transaction_obj, percent, amount = refund_quote(booking, provider_initiated=provider_initiated)
+    if transaction_obj is None or amount <= 0:
+        return None
+    return request_refund(transaction_obj, amount, reason, admin_notes=f'{percent}% under cancellation policy')
+
+
+def cancel_route_departures(route, travel_date, reason):
+    """
+    Cancel every open booking on a route for one travel date and queue a
+    full refund for each paid one, using set-based updates throughout.
+    """
+    from transportation.models import Route, TransportBooking
+
+    with transaction.atomic():
+        bookings = TransportBooking.objects.select_for_update().filter(
+            route=route, travel_date=travel_date, booking_status__in=['PENDING', 'CONFIRMED'],
+        )
+        booking_ids = list(bookings.values_list('id', flat=True))
+        if not booking_ids:
+            return {'bookings': 0, 'refunds': 0}
+
+        seats = bookings.filter(booking_status='CONFIRMED').aggregate(total=Sum('passengers'))['total'] or 0
+        TransportBooking.objects.filter(id__in=booking_ids).update(booking_status='CANCELLED', updated_at=timezone.now())
+        if seats:
+            Route.objects.filter(pk=route.pk).update(available_seats=F('available_seats') + seats)
+
+        paid = Transaction.objects.filter(transport_booking_id__in=booking_ids, status='SUCCESS')
+        already_queued = set(Refund.objects.filter(
+            transaction__in=paid, status__in=OPEN_REFUND_STATUSES,
+        ).values_list('transaction_id', flat=True))
+
+        refunds = []
+        for transaction_pk, amount, refunded in paid.values_list('id', 'amount', 'refund_amount'):
+            balance = amount - (refunded or Decimal('0'))
+            if transaction_pk in already_queued or balance <= 0:
+                continue
+            refunds.append(Refund(
+                transaction_id=transaction_pk,
+                requested_amount=balance,
+                approved_amount=balance,
+                reason=reason,
+                status='APPROVED',
+                admin_notes='Full refund: departure cancelled by operator',
+            ))
+        Refund.objects.bulk_create(refunds, batch_size=500)
+        kick_inline_worker()
+
+    logger.info(f"Cancelled {len(booking_ids)} bookings on route {route.route_number} for {travel_date}; "
+                f"{len(refunds)} refunds queued")
+    return {'bookings': len(booking_ids), 'refunds': len(refunds)}
+
+
+# WORKER
+def _gateway_refund(payment_id, amount, receipt, notes):
+    """Call the configured gateway (or the local stand-in). Runs in worker threads: no DB access."""
+    from .gateway_simulator import local_gateway_enabled, simulate_refund
+    if local_gateway_enabled():
+        return simulate_refund(payment_id, amount, receipt=receipt, notes=notes)
+
+    try:
+        from payment_utils import create_razorpay_refund
+    except ImportError:
+        return {'success': False, 'error': 'Payment service unavailable'}
+    if not payment_id:
+        return {'success': False, 'error': 'Payment has no gateway payment id'}
+    return create_razorpay_refund(payment_id, amount, receipt=receipt, notes=notes)
+
+
+def _refund_call(refund):
+    try:
+        return _gateway_refund(
+            refund.transaction.gateway_payment_id,
+            refund.approved_amount,
+            receipt=str(refund.refund_id),
+            notes={'refund_id': str(refund.refund_id), 'transaction_id': str(refund.transaction.transaction_id)},
+        )
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
+
+
+def release_stale_claims():
+    """Put refunds claimed by a worker that died back to APPROVED"""
+    timeout = getattr(settings, 'REFUND_CLAIM_TIMEOUT_SECONDS', 900)
+    now = timezone.now()
+    return Refund.objects.filter(
+        status='PROCESSING', processed_at__lt=now - timedelta(seconds=timeout),
+    ).update(status='APPROVED', available_at=now)
+
+
+def process_refunds(batch_size=None, max_workers=None):
+    """Send one batch of approved refunds to the gateway. Returns a count per resulting status."""
+    batch_size = batch_size or getattr(settings, 'REFUND_BATCH_SIZE', 100)
+    max_workers = max_workers or getattr(settings, 'REFUND_MAX_WORKERS', 8)
+    max_attempts = getattr(settings, 'REFUND_MAX_ATTEMPTS', 5)
+    retry_base = getattr(settings, 'REFUND_RETRY_BASE_SECONDS', 60)
+
+    released = release_stale_claims()
+    if released:
+        logger.warning(f"Released {released} refunds left in PROCESSING")
+
+    now = timezone.now()
+    # Oldest first, so a backlog cannot starve early requests (Meta ordering is newest first)
+    due = list(
+        Refund.objects.filter(status='APPROVED', available_at__lte=now)
+        .select_related('transaction').order_by('requested_at', 'pk')[:batch_size]
+    )
+    # Claim; another worker may have taken some already
+    claimed = [
+        refund for refund in due
+        if Refund.objects.filter(pk=refund.pk, status='APPROVED').update(status='PROCESSING', processed_at=now) == 1
+    ]
+    if not claimed:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(_refund_call, claimed))
+
+    now = timezone.now()
+    refunded = {}
+    for refund, result in zip(claimed, results):
+        refund.attempts += 1
+        refund.processed_at = now
+        if result['success']:
+            refund.status = 'COMPLETED'
+            refund.gateway_refund_id = result['refund'].get('id', '')
+            refund.completed_at = now
+            refund.last_error = ''
+            refunded[refund.transaction_id] = refunded.get(refund.transaction_id, Decimal('0')) + refund.approved_amount
+        else:
+            refund.last_error = result.get('error', 'Unknown error')
+            logger.error(f"Refund {refund.refund_id} attempt {refund.attempts} failed: {refund.last_error}")
+            if refund.attempts >= max_attempts:
+                refund.status = 'FAILED'
+            else:
+                refund.status = 'APPROVED'
+                refund.available_at = now + timedelta(seconds=retry_base * 2 ** (refund.attempts - 1))
+
+    with transaction.atomic():
+        Refund.objects.bulk_update(
+            claimed,
+            ['status', 'attempts', 'processed_at', 'completed_at', 'gateway_refund_id', 'last_error', 'available_at'],
+            batch_size=500,
+        )
+        if refunded:
+            money = DecimalField(max_digits=10, decimal_places=2)
+            refund_amount = Coalesce(F('refund_amount'), Value(Decimal('0')), output_field=money) + Case(
+                *[When(pk=pk, then=Value(amount)) for pk, amount in refunded.items()],
+                output_field=money,
+            )
+            Transaction.objects.filter(pk__in=refunded).update(
+                refund_amount=refund_amount,
+                refund_date=now,
+                # Only a full refund changes the status
+                status=Case(
+                    When(GreaterThanOrEqual(refund_amount, F('amount')), then=Value('REFUNDED')),
+                    default=F('status'),
+                    output_field=CharField(),
+                ),
+            )
+            apply_refund_deltas(refunded)
+            for refund in claimed:
+                if refund.status == 'COMPLETED' and not refund.transaction.is_synthetic:
+                    post_refund(refund, posted_at=now)
+
+    counts = {}
+    for refund in claimed:
+        counts[refund.status] = counts.get(refund.status, 0) + 1
+    return counts
+
+
+kick_inline_worker = InlineWorker(process_refunds, 'REFUND_INLINE_WORKER').kick
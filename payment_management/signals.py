@@ -0,0 +1,58 @@
+# payment_management/signals.py
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from service_provider.models import ProviderEarnings
+
+from .models import TaxRule, Transaction
+
+
+@receiver([post_save, post_delete], sender=TaxRule)
+def invalidate_tax_rule_index(sender, **kwargs):
+    from .tax import invalidate_tax_rules
+
+    invalidate_tax_rules()
+
+
+@receiver(post_init, sender=Transaction)
+def remember_spending_state(sender, instance, **kwargs):
+    # __dict__ lookups so deferred fields are not fetched
+    instance._spending_state = (instance.__dict__.get('status'), instance.__dict__.get('refund_amount'))
+
+
+@receiver(post_save, sender=Transaction)
+def update_spending_summary(sender, instance, created, raw=False, **kwargs):
+    from .spending import record_transaction_change
+
+    if raw:
+        return
+    old_status, old_refund_amount = (None, None) if created else instance._spending_state
+    record_transaction_change(instance, old_status, old_refund_amount)
+    instance._spending_state = (instance.status, instance.refund_amount)
+
+
+@receiver(pre_save, sender=ProviderEarnings)
+def stamp_settlement(sender, instance, raw=False, **kwargs):
+    stored = sender.objects.filter(pk=instance.pk).values('is_settled', 'settled_at').first() if instance.pk else None
+    instance._stored_settlement = stored
+    if raw:
+        return
+    if instance.is_settled and not instance.settled_at:
+        instance.settled_at = timezone.now()
+    elif not instance.is_settled:
+        instance.settled_at = None
+
+
+@receiver(post_save, sender=ProviderEarnings)
+def post_settlement_to_ledger(sender, instance, raw=False, **kwargs):
+    from .ledger import post_settlement, reverse_settlement
+
+    if raw:
+        return
+    stored = getattr(instance, '_stored_settlement', None)
+    was_settled = bool(stored and stored['is_settled'])
+    if instance.is_settled and not was_settled:
+        post_settlement(instance)
+    elif was_settled and not instance.is_settled:
+        reverse_settlement(instance, stored['settled_at'])
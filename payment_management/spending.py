@@ -0,0 +1,150 @@
+# payment_management/spending.py
+"""
+Incremental per-user spending totals (UserSpendingSummary).
+
+Each Transaction save (see signals.py) is turned into a delta - a payment
+becoming paid, a refund growing - and applied with one F() update on the
+user's summary row, inside the same database transaction. Code that
+changes transactions with QuerySet.update() must report the change itself
+(the refund worker calls apply_refund_deltas). rebuild_spending_summaries()
+recomputes everything from Transaction to repair drift. Synthetic
+transactions from the gateway simulator are left out.
+"""
+import logging
+from decimal import Decimal
+
+from django.db.models import Count, F, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import Transaction, UserSpendingSummary
+
+logger = logging.getLogger(__name__)
+
+PAID_STATUSES = ('SUCCESS', 'REFUNDED')
+BUCKETS = {'HOTEL_BOOKING': 'hotel', 'TRANSPORT_BOOKING': 'transport'}
+SUMMARY_FIELDS = [
+    'hotel_spent', 'transport_spent', 'other_spent', 'total_refunded',
+    'hotel_transactions', 'transport_transactions', 'other_transactions',
+    'last_transaction_at', 'updated_at',
+]
+ZERO = Decimal('0')
+
+
+def _bucket(transaction_type):
+    return BUCKETS.get(transaction_type, 'other')
+
+
+def _contribution(status, amount, refund_amount):
+    """(net spent, paid count, refunded) a transaction adds to its owner's summary"""
+    if status not in PAID_STATUSES:
+        return ZERO, 0, ZERO
+    refunded = refund_amount or ZERO
+    return amount - refunded, 1, refunded
+
+
+def _apply(user_id, bucket, spent=ZERO, count=0, refunded=ZERO, last_at=None):
+    changes = {}
+    if spent:
+        changes[f'{bucket}_spent'] = F(f'{bucket}_spent') + spent
+    if count:
+        changes[f'{bucket}_transactions'] = F(f'{bucket}_transactions') + count
+    if refunded:
+        changes['total_refunded'] = F('total_refunded') + refunded
+    if last_at:
+        # GREATEST is NULL-propagating on some backends
+        changes['last_transaction_at'] = Coalesce(Greatest(F('last_transaction_at'), Value(last_at)), Value(last_at))
+    if not changes:
+        return
+    changes['updated_at'] = timezone.now()
+
+    if not UserSpendingSummary.objects.filter(pk=user_id).update(**changes):
+        # No row yet: build it from source, which already includes this change
+        rebuild_spending_summaries(user_ids=[user_id])
+
+
+def record_transaction_change(transaction_obj, old_status, old_refund_amount):
+    """Apply the summary delta for one saved Transaction"""
+    if transaction_obj.is_synthetic:
+        return
+    before = _contribution(old_status, transaction_obj.amount, old_refund_amount)
+    after = _contribution(transaction_obj.status, transaction_obj.amount, transaction_obj.refund_amount)
+    spent, count, refunded = (a - b for a, b in zip(after, before))
+
+    last_at = None
+    if count > 0:
+        last_at = transaction_obj.completed_at or transaction_obj.initiated_at
+    _apply(transaction_obj.user_id, _bucket(transaction_obj.transaction_type), spent, count, refunded, last_at)
+
+
+def apply_refund_deltas(refunded):
+    """Report refunds written with QuerySet.update(); refunded maps transaction pk -> amount"""
+    grouped = {}
+    rows = Transaction.objects.filter(pk__in=refunded, is_synthetic=False).values_list('pk', 'user_id', 'transaction_type')
+    for pk, user_id, transaction_type in rows:
+        key = (user_id, _bucket(transaction_type))
+        grouped[key] = grouped.get(key, ZERO) + refunded[pk]
+    for (user_id, bucket), amount in grouped.items():
+        _apply(user_id, bucket, spent=-amount, refunded=amount)
+
+
+def rebuild_spending_summaries(user_ids=None, batch_size=1000):
+    """Recompute summaries from Transaction with one grouped query; returns rows written"""
+    transactions = Transaction.objects.filter(status__in=PAID_STATUSES, is_synthetic=False)
+    if user_ids is not None:
+        transactions = transactions.filter(user_id__in=user_ids)
+
+    aggregates = {}
+    for transaction_type, bucket in list(BUCKETS.items()) + [(None, 'other')]:
+        in_bucket = Q(transaction_type=transaction_type) if transaction_type else ~Q(transaction_type__in=list(BUCKETS))
+        aggregates[f'{bucket}_gross'] = Coalesce(Sum('amount', filter=in_bucket), Value(ZERO))
+        aggregates[f'{bucket}_refunded'] = Coalesce(Sum('refund_amount', filter=in_bucket), Value(ZERO))
+        aggregates[f'{bucket}_transactions'] = Count('id', filter=in_bucket)
+    aggregates['last_transaction_at'] = Max(Coalesce('completed_at', 'initiated_at'))
+
+    rows = transactions.order_by().values('user_id').annotate(**aggregates)
+
+    now = timezone.now()
+    written = 0
+    batch = []
+    seen = set()
+    for row in rows.iterator(chunk_size=batch_size):
+        seen.add(row['user_id'])
+        summary = UserSpendingSummary(user_id=row['user_id'], last_transaction_at=row['last_transaction_at'], updated_at=now)
+        total_refunded = ZERO
+        for bucket in ('hotel', 'transport', 'other'):
+            setattr(summary, f'{bucket}_spent', row[f'{bucket}_gross'] - row[f'{bucket}_refunded'])
+            setattr(summary, f'{bucket}_transactions', row[f'{bucket}_transactions'])
+            total_refunded += row[f'{bucket}_refunded']
+        summary.total_refunded = total_refunded
+        batch.append(summary)
+
+        if len(batch) >= batch_size:
+            written += _upsert(batch)
+            batch = []
+    if batch:
+        written += _upsert(batch)
+
+    # Users with no paid transactions left
+    stale = UserSpendingSummary.objects.all() if user_ids is None else UserSpendingSummary.objects.filter(pk__in=user_ids)
+    stale_ids = [pk for pk in stale.values_list('pk', flat=True) if pk not in seen]
+    if stale_ids:
+        UserSpendingSummary.objects.filter(pk__in=stale_ids).delete()
+
+    logger.info(f"Rebuilt {written} spending summaries")
+    return written
+
+
+def _upsert(batch):
+    UserSpendingSummary.objects.bulk_create(
+        batch,
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=SUMMARY_FIELDS,
+    )
+    return len(batch)
+
+
+def get_spending_summary(user):
+    """The user's summary, or an unsaved all-zero one"""
+    return UserSpendingSummary.objects.filter(pk=user.pk).first() or UserSpendingSummary(user=user)
@@ -0,0 +1,219 @@
+# payment_management/tax.py
+"""
+GST rules engine.
+
+Active TaxRule rows are loaded once per process into an index keyed by
+(transaction_type, service_type), with each bucket sorted by slab so a
+lookup is a dict hit plus a bisect. Saving or deleting a rule drops the
+index (see signals.py); TAX_RULES_CACHE_SECONDS bounds how long another
+process can keep a stale copy. All amounts are Decimal, rounded half-up
+to the paisa.
+"""
+import bisect
+import logging
+import threading
+import time
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BigIntegerField, DecimalField, ExpressionWrapper, F, Q, Value
+from django.db.models.functions import Cast, Round
+from django.utils import timezone
+
+from .models import Invoice, InvoiceDocument, TaxRule
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('0.01')
+HUNDRED = Decimal('100')
+
+
+def quantize_money(value):
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class TaxQuote:
+    """Result of applying a rule to an amount"""
+    __slots__ = ('rule', 'rate', 'taxable_amount', 'tax_amount', 'total_amount')
+
+    def __init__(self, rule, rate, taxable_amount):
+        self.rule = rule
+        self.rate = rate
+        self.taxable_amount = quantize_money(taxable_amount)
+        self.tax_amount = quantize_money(self.taxable_amount * rate / HUNDRED)
+        self.total_amount = self.taxable_amount + self.tax_amount
+
+
+def _specificity(transaction_type, service_type):
+    """Lookup precedence of a rule key; higher wins"""
+    return (2 if transaction_type else 0) + (1 if service_type else 0)
+
+
+class TaxEngine:
+    def __init__(self, rules):
+        self._buckets = {}
+        for rule in rules:
+            self._buckets.setdefault((rule.transaction_type, rule.service_type), []).append(rule)
+
+        self._slab_starts = {}
+        for key, bucket in self._buckets.items():
+            # Within a bucket the highest matching slab wins, then the latest effective date
+            bucket.sort(key=lambda rule: (rule.min_amount, rule.effective_from))
+            self._slab_starts[key] = [rule.min_amount for rule in bucket]
+
+    def find_rule(self, transaction_type, service_type, basis, on_date):
+        # Most specific key first: type + service, type, service, catch-all
+        keys = [(transaction_type, service_type), (transaction_type, ''), ('', service_type), ('', '')]
+        if not service_type:
+            keys = keys[1::2]
+        if not transaction_type:
+            keys = keys[len(keys) // 2:]
+
+        for key in keys:
+            bucket = self._buckets.get(key)
+            if not bucket:
+                continue
+            position = bisect.bisect_right(self._slab_starts[key], basis)
+            for index in range(position - 1, -1, -1):
+                rule = bucket[index]
+                if rule.max_amount is not None and basis > rule.max_amount:
+                    continue
+                if rule.effective_from > on_date or (rule.effective_to and rule.effective_to < on_date):
+                    continue
+                return rule
+        return None
+
+    def quote(self, transaction_type, subtotal, service_type='', basis=None, discount=Decimal('0'), on_date=None):
+        subtotal = Decimal(subtotal)
+        on_date = on_date or timezone.localdate()
+        rule = self.find_rule(transaction_type, service_type, subtotal if basis is None else Decimal(basis), on_date)
+        rate = rule.rate if rule else Decimal(str(getattr(settings, 'TAX_DEFAULT_RATE', '18.00')))
+        return TaxQuote(rule, rate, subtotal - Decimal(discount))
+
+
+_engine = None
+_engine_loaded_at = 0.0
+_engine_lock = threading.Lock()
+
+
+def get_tax_engine():
+    """Process-wide engine, rebuilt after invalidation or TAX_RULES_CACHE_SECONDS"""
+    global _engine, _engine_loaded_at
+
+    max_age = getattr(settings, 'TAX_RULES_CACHE_SECONDS', 300)
+    engine = _engine
+    if engine is not None and time.monotonic() - _engine_loaded_at < max_age:
+        return engine
+
+    with _engine_lock:
+        if _engine is None or time.monotonic() - _engine_loaded_at >= max_age:
+            _engine = TaxEngine(list(TaxRule.objects.filter(is_active=True)))
+            _engine_loaded_at = time.monotonic()
+        return _engine
+
+
+def invalidate_tax_rules():
+    global _engine
+    _engine = None
+
+
+def quote_for_transaction(transaction_obj, subtotal=None, discount=Decimal('0'), on_date=None):
+    """Tax quote for a transaction's booking (nightly rate slab for hotels, subtotal otherwise)"""
+    subtotal = transaction_obj.amount if subtotal is None else subtotal
+    basis = subtotal
+    service_type = ''
+    if transaction_obj.hotel_booking:
+        basis = transaction_obj.hotel_booking.price_per_night
+    elif transaction_obj.transport_booking:
+        service_type = transaction_obj.transport_booking.route.transport_type
+
+    return get_tax_engine().quote(
+        transaction_obj.transaction_type, subtotal,
+        service_type=service_type, basis=basis, discount=discount, on_date=on_date,
+    )
+
+
+# BULK RECOMPUTE
+def _slab_filter(rule):
+    if not rule.min_amount and rule.max_amount is None:
+        return Q()
+
+    def within(field):
+        condition = Q(**{f'{field}__gte': rule.min_amount})
+        if rule.max_amount is not None:
+            condition &= Q(**{f'{field}__lte': rule.max_amount})
+        return condition
+
+    return (
+        (Q(transaction__hotel_booking__isnull=False) & within('transaction__hotel_booking__price_per_night'))
+        | (Q(transaction__hotel_booking__isnull=True) & within('subtotal'))
+    )
+
+
+def _rule_filter(rule):
+    condition = Q(invoice_date__date__gte=rule.effective_from) & _slab_filter(rule)
+    if rule.effective_to:
+        condition &= Q(invoice_date__date__lte=rule.effective_to)
+    if rule.transaction_type:
+        condition &= Q(transaction__transaction_type=rule.transaction_type)
+    if rule.service_type:
+        condition &= Q(transaction__transport_booking__route__transport_type=rule.service_type)
+    return condition
+
+
+def _tax_expressions(rule):
+    """
+    Tax and total as SQL for one rule. Computed in integer paise so the
+    database rounds half-up exactly like TaxQuote, whatever its numeric type.
+    """
+    basis_points = int(rule.rate * 100)
+    taxable_paise = Cast(Round((F('subtotal') - F('discount_amount')) * 100), BigIntegerField())
+    tax_paise = ExpressionWrapper(
+        (taxable_paise * Value(basis_points) + Value(5000)) / Value(10000),
+        output_field=BigIntegerField(),
+    )
+    tax_amount = ExpressionWrapper(tax_paise * Value(CENT), output_field=DecimalField(max_digits=10, decimal_places=2))
+    total_amount = ExpressionWrapper(
+        F('subtotal') - F('discount_amount') + tax_amount,
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+    return tax_amount, total_amount
+
+
+def recompute_invoice_taxes(invoices=None, dry_run=False):
+    """
+    Re-apply the rule table to existing invoices with one UPDATE per rule.
+    Rules run from least to most specific (matching TaxEngine precedence),
+    so the rule a new invoice would get is the one that writes last.
+    Returns [(rule, invoices matched)].
+    """
+    invoices = Invoice.objects.all() if invoices is None else invoices
+    rules = sorted(
+        TaxRule.objects.filter(is_active=True),
+        key=lambda rule: (_specificity(rule.transaction_type, rule.service_type), rule.min_amount, rule.effective_from),
+    )
+
+    results = []
+    with transaction.atomic():
+        # Fixed up front: a filter such as tax_rate__isnull would stop matching once the first rule wrote
+        pks = list(invoices.values_list('pk', flat=True))
+        for rule in rules:
+            matched = Invoice.objects.filter(_rule_filter(rule), pk__in=pks)
+            if dry_run:
+                results.append((rule, matched.count()))
+                continue
+            tax_amount, total_amount = _tax_expressions(rule)
+            updated = matched.update(
+                tax_rate=rule.rate, tax_amount=tax_amount, total_amount=total_amount, updated_at=timezone.now(),
+            )
+            results.append((rule, updated))
+            logger.info(f"Tax rule {rule.name}: recomputed {updated} invoices")
+
+        if not dry_run:
+            # Rendered copies now show stale amounts
+            InvoiceDocument.objects.filter(invoice__in=pks).delete()
+            InvoiceDocument.objects.filter(
+                kind='STATEMENT', user__in=Invoice.objects.filter(pk__in=pks).values('transaction__user')
+            ).delete()
+    return results
@@ -1,3 +1,459 @@
-from django.test import TestCase
+import json
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from hotel_booking.models import Hotel, HotelBooking
+from service_provider.models import ProviderEarnings, ServiceProvider
+
+from . import outbox
+from .ledger import UnbalancedJournal, get_account, post_capture, post_journal, post_refund, provider_balances
+from .models import (
+    Invoice, LedgerAccount, LedgerEntry, LedgerJournal, OutboxMessage, PaymentWebhookEvent, Refund,
+    TaxRule, Transaction, UserSpendingSummary,
+)
+from .reconciliation import Reconciler, SettlementRecord
+from .refunds import process_refunds, request_refund
+from .spending import get_spending_summary, rebuild_spending_summaries
+from .tax import TaxEngine, quantize_money
+from .webhooks import compute_webhook_signature, process_pending_events, record_webhook_event
+
+User = get_user_model()
+
+
+def make_provider(username='owner', commission_rate=Decimal('10.00')):
+    return ServiceProvider.objects.create(
+        user=User.objects.create_user(username=username, password='pw-12345'),
+        provider_type='HOTEL', business_name='Lake Stays', business_registration_number='REG1',
+        business_phone='9999999999', business_email='owner@example.com', business_address='Lake Road',
+        bank_account_number='1234', bank_name='Bank', bank_ifsc_code='BANK0000001', account_holder_name='Owner',
+        commission_rate=commission_rate,
+    )
+
+
+def make_hotel_booking(user, provider, price=Decimal('1000.00'), nights=2):
+    hotel = Hotel.objects.create(
+        owner=provider, name='Lake View', description='-', address='-', city='Udaipur', state='RJ',
+        pincode='313001', phone='9999999999', email='hotel@example.com', price_per_night=price,
+    )
+    check_in = timezone.localdate() + timedelta(days=30)
+    return HotelBooking.objects.create(
+        user=user, hotel=hotel, check_in_date=check_in, check_out_date=check_in + timedelta(days=nights),
+        price_per_night=price, contact_name='Guest', contact_phone='9999999999', contact_email='guest@example.com',
+    )
+
+
+def make_transaction(user, amount=Decimal('2000.00'), status='PENDING', **fields):
+    return Transaction.objects.create(
+        user=user, transaction_type=fields.pop('transaction_type', 'HOTEL_BOOKING'), amount=amount, status=status,
+        **fields
+    )
+
+
+def capture_body(order_id, amount_paise, currency='INR', event='payment.captured', payment_id='pay_1'):
+    return json.dumps({
+        'event': event,
+        'payload': {'payment': {'entity': {
+            'id': payment_id, 'order_id': order_id, 'amount': amount_paise, 'currency': currency,
+        }}},
+    })
+
+
+class WebhookTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='guest', password='pw-12345')
+        self.transaction = make_transaction(self.user, gateway_transaction_id='order_1')
+
+    def test_capture_confirms_once_and_queues_outbox(self):
+        body = capture_body('order_1', 200000)
+        event, created = record_webhook_event(body, event_id='evt_1')
+        duplicate, created_again = record_webhook_event(body, event_id='evt_1')
+
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(duplicate.pk, event.pk)
+        self.assertEqual(process_pending_events(), {'PROCESSED': 1})
+
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'SUCCESS')
+        self.assertEqual(self.transaction.gateway_payment_id, 'pay_1')
+        self.assertEqual(
+            sorted(self.transaction.outbox_messages.values_list('topic', flat=True)), sorted(outbox.TOPIC_ORDER))
+
+    def test_amount_and_currency_mismatch_fail_the_event(self):
+        record_webhook_event(capture_body('order_1', 100), event_id='evt_amount')
+        record_webhook_event(capture_body('order_1', 200000, currency='USD'), event_id='evt_currency')
+
+        self.assertEqual(process_pending_events(), {'FAILED': 2})
+        errors = dict(PaymentWebhookEvent.objects.values_list('event_id', 'last_error'))
+        self.assertIn('Amount mismatch', errors['evt_amount'])
+        self.assertIn('Currency mismatch', errors['evt_currency'])
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'PENDING')
+
+    def test_failure_after_capture_keeps_success(self):
+        record_webhook_event(capture_body('order_1', 200000), event_id='evt_capture')
+        process_pending_events()
+        record_webhook_event(capture_body('order_1', 200000, event='payment.failed'), event_id='evt_failed')
+        process_pending_events()
+
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'SUCCESS')
+
+    def test_stale_claim_is_released_and_processed(self):
+        event, _ = record_webhook_event(capture_body('order_1', 200000), event_id='evt_stale')
+        PaymentWebhookEvent.objects.filter(pk=event.pk).update(
+            status='PROCESSING', claimed_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(process_pending_events(), {'PROCESSED': 1})
+
+    def test_endpoint_rejects_bad_signature_and_non_object_payload(self):
+        url = reverse('payment_webhook')
+        body = capture_body('order_1', 200000)
+        response = self.client.post(url, body, content_type='application/json', HTTP_X_RAZORPAY_SIGNATURE='forged')
+        self.assertEqual(response.status_code, 400)
+
+        for payload in ('[1, 2]', '"text"', '{not json'):
+            response = self.client.post(url, payload, content_type='application/json',
+                                        HTTP_X_RAZORPAY_SIGNATURE=compute_webhook_signature(payload))
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(PaymentWebhookEvent.objects.exists())
+
+        response = self.client.post(url, body, content_type='application/json',
+                                    HTTP_X_RAZORPAY_SIGNATURE=compute_webhook_signature(body))
+        self.assertEqual(response.json(), {'success': True, 'duplicate': False})
+
+
+@mock.patch('payment_management.outbox.connection')
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='guest', password='pw-12345')
+        self.transaction = make_transaction(self.user, status='SUCCESS')
+        outbox.enqueue_post_payment_messages(self.transaction)
+        self.delivered = []
+
+    def handlers(self, failing=()):
+        def handler(topic):
+            def deliver(transaction_obj, payload):
+                if topic in failing:
+                    raise RuntimeError(f'{topic} is down')
+                self.delivered.append(topic)
+            return deliver
+        return {topic: handler(topic) for topic in outbox.TOPIC_ORDER}
+
+    def deliver_all(self):
+        messages = list(OutboxMessage.objects.filter(transaction=self.transaction))
+        return outbox._deliver_group(self.transaction.pk, messages)
+
+    def test_enqueue_is_idempotent(self, connection):
+        outbox.enqueue_post_payment_messages(self.transaction)
+        self.assertEqual(self.transaction.outbox_messages.count(), len(outbox.TOPIC_ORDER))
+
+    def test_topics_run_in_order(self, connection):
+        with mock.patch.dict(outbox.HANDLERS, self.handlers()):
+            self.assertEqual(self.deliver_all(), ['DONE'] * 4)
+        self.assertEqual(self.delivered, outbox.TOPIC_ORDER)
+
+    def test_failure_holds_later_topics(self, connection):
+        with mock.patch.dict(outbox.HANDLERS, self.handlers(failing={'PROVIDER_EARNINGS'})):
+            self.assertEqual(self.deliver_all(), ['DONE', 'PENDING', 'PENDING', 'PENDING'])
+        self.assertEqual(self.delivered, ['INVOICE'])
+
+        held = OutboxMessage.objects.get(transaction=self.transaction, topic='RECEIPT_EMAIL')
+        self.assertEqual(held.attempts, 0)
+        self.assertEqual(held.last_error, 'Waiting for PROVIDER_EARNINGS')
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=1)
+    def test_exhausted_topic_fails_the_rest(self, connection):
+        with mock.patch.dict(outbox.HANDLERS, self.handlers(failing={'INVOICE'})):
+            self.assertEqual(self.deliver_all(), ['FAILED'] * 4)
+        self.assertEqual(self.delivered, [])
+
+    def test_stale_claims_are_released(self, connection):
+        OutboxMessage.objects.filter(transaction=self.transaction).update(
+            status='PROCESSING', claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(outbox.release_stale_claims(), 4)
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='guest', password='pw-12345')
+        self.provider = make_provider()
+        self.booking = make_hotel_booking(self.user, self.provider)
+        self.transaction = make_transaction(self.user, status='SUCCESS', hotel_booking=self.booking)
+        Invoice.objects.create(
+            transaction=self.transaction, due_date=timezone.now(), subtotal=Decimal('2000.00'),
+            tax_amount=Decimal('360.00'), total_amount=Decimal('2360.00'),
+        )
+
+    def assertBalanced(self):
+        for journal in LedgerJournal.objects.all():
+            debits = sum(entry.debit for entry in journal.entries.all())
+            credits = sum(entry.credit for entry in journal.entries.all())
+            self.assertEqual(debits, credits, journal.idempotency_key)
+
+    def test_unbalanced_journal_is_rejected(self):
+        account = get_account('CUSTOMER', user=self.user)
+        with self.assertRaises(UnbalancedJournal):
+            post_journal('bad', 'ADJUSTMENT', [(account, Decimal('1'), Decimal('0'))])
+        self.assertFalse(LedgerJournal.objects.exists())
+
+    def test_capture_splits_and_is_idempotent(self):
+        journal, created = post_capture(self.transaction)
+        _, created_again = post_capture(self.transaction)
+
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(LedgerJournal.objects.count(), 1)
+        self.assertBalanced()
+        self.assertEqual(get_account('CUSTOMER', user=self.user).balance, 0)
+        self.assertEqual(get_account('TAX_PAYABLE', name='gst').balance, Decimal('-360.00'))
+        # 10% commission: the provider is owed 1800, GST comes out of the platform's 200
+        self.assertEqual(provider_balances(self.provider)['HOTEL'], {
+            'payable': Decimal('1800.00'), 'settled': Decimal('0'), 'commission': Decimal('-160.00'),
+        })
+
+    def test_refund_reverses_shares_in_capture_ratio(self):
+        Invoice.objects.filter(transaction=self.transaction).update(tax_amount=0)
+        self.transaction.refresh_from_db()
+        post_capture(self.transaction)
+        refund = Refund.objects.create(
+            transaction=self.transaction, requested_amount=Decimal('1000.00'), approved_amount=Decimal('1000.00'),
+            reason='Cancelled', status='COMPLETED',
+        )
+        post_refund(refund)
+        post_refund(refund)
+
+        self.assertEqual(LedgerJournal.objects.filter(journal_type='REFUND').count(), 1)
+        self.assertBalanced()
+        payable = LedgerAccount.objects.get(kind='PROVIDER_PAYABLE', provider=self.provider)
+        commission = LedgerAccount.objects.get(kind='PLATFORM_COMMISSION', provider=self.provider)
+        # Credited 1800 / 200, so the 1000 refund comes back 900 / 100
+        self.assertEqual(payable.normal_balance, Decimal('900.00'))
+        self.assertEqual(commission.normal_balance, Decimal('100.00'))
+
+    def test_settlement_and_reversal(self):
+        post_capture(self.transaction)
+        earnings = ProviderEarnings.objects.create(
+            provider=self.provider, hotel_booking=self.booking, booking_amount=Decimal('2000.00'),
+            commission_rate=Decimal('10.00'), commission_amount=Decimal('200.00'), provider_earnings=Decimal('1800.00'),
+        )
+        earnings.is_settled = True
+        earnings.save()
+        self.assertEqual(provider_balances(self.provider)['HOTEL']['settled'], Decimal('1800.00'))
+
+        earnings.is_settled = False
+        earnings.save()
+        self.assertEqual(provider_balances(self.provider)['HOTEL']['settled'], Decimal('0'))
+        self.assertEqual(provider_balances(self.provider)['HOTEL']['payable'], Decimal('1800.00'))
+        self.assertBalanced()
+
+    def test_entries_carry_running_balance(self):
+        post_capture(self.transaction)
+        customer = get_account('CUSTOMER', user=self.user)
+        balances = list(LedgerEntry.objects.filter(account=customer).order_by('id').values_list('balance_after', flat=True))
+        self.assertEqual(balances, [Decimal('2000.00'), Decimal('0.00')])
+
+
+class TaxEngineTests(TestCase):
+    def rule(self, rate, transaction_type='', service_type='', min_amount='0', max_amount=None,
+             effective_from=date(2020, 1, 1), effective_to=None):
+        return TaxRule(
+            name=f'{rate}%', rate=Decimal(rate), transaction_type=transaction_type, service_type=service_type,
+            min_amount=Decimal(min_amount), max_amount=Decimal(max_amount) if max_amount else None,
+            effective_from=effective_from, effective_to=effective_to,
+        )
+
+    def test_slabs_pick_the_highest_matching_band(self):
+        engine = TaxEngine([
+            self.rule('0', 'HOTEL_BOOKING', max_amount='1000'),
+            self.rule('12', 'HOTEL_BOOKING', min_amount='1000.01', max_amount='7500'),
+            self.rule('18', 'HOTEL_BOOKING', min_amount='7500.01'),
+        ])
+        today = date(2024, 6, 1)
+        self.assertEqual(engine.find_rule('HOTEL_BOOKING', '', Decimal('1000'), today).rate, 0)
+        self.assertEqual(engine.find_rule('HOTEL_BOOKING', '', Decimal('1000.01'), today).rate, 12)
+        self.assertEqual(engine.find_rule('HOTEL_BOOKING', '', Decimal('9000'), today).rate, 18)
+
+    def test_specific_rules_take_precedence(self):
+        engine = TaxEngine([
+            self.rule('18'),
+            self.rule('12', transaction_type='TRANSPORT_BOOKING'),
+            self.rule('5', transaction_type='TRANSPORT_BOOKING', service_type='BUS'),
+        ])
+        today = date(2024, 6, 1)
+        self.assertEqual(engine.find_rule('TRANSPORT_BOOKING', 'BUS', Decimal('500'), today).rate, 5)
+        self.assertEqual(engine.find_rule('TRANSPORT_BOOKING', 'FLIGHT', Decimal('500'), today).rate, 12)
+        self.assertEqual(engine.find_rule('HOTEL_BOOKING', '', Decimal('500'), today).rate, 18)
+
+    def test_effective_dates(self):
+        engine = TaxEngine([
+            self.rule('12', effective_to=date(2023, 12, 31)),
+            self.rule('18', effective_from=date(2024, 1, 1)),
+        ])
+        self.assertEqual(engine.find_rule('HOTEL_BOOKING', '', Decimal('500'), date(2023, 6, 1)).rate, 12)
+        self.assertEqual(engine.find_rule('HOTEL_BOOKING', '', Decimal('500'), date(2024, 6, 1)).rate, 18)
+        self.assertIsNone(engine.find_rule('HOTEL_BOOKING', '', Decimal('500'), date(2019, 6, 1)))
+
+    @override_settings(TAX_DEFAULT_RATE='18.00')
+    def test_quote_rounds_half_up_and_falls_back_to_default(self):
+        quote = TaxEngine([]).quote('HOTEL_BOOKING', Decimal('100.25'), discount=Decimal('0.20'))
+        self.assertIsNone(quote.rule)
+        self.assertEqual(quote.taxable_amount, Decimal('100.05'))
+        self.assertEqual(quote.tax_amount, Decimal('18.01'))
+        self.assertEqual(quote.total_amount, Decimal('118.06'))
+        self.assertEqual(quantize_money('0.005'), Decimal('0.01'))
+
+
+class RefundTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='guest', password='pw-12345')
+        self.transaction = make_transaction(self.user, status='SUCCESS', transaction_type='TRANSPORT_BOOKING',
+                                            gateway_payment_id='pay_1')
+
+    def gateway(self, *results):
+        return mock.patch('payment_management.refunds._gateway_refund', side_effect=list(results))
+
+    def test_request_is_capped_at_refundable_balance(self):
+        first = request_refund(self.transaction, Decimal('1500.00'), 'Cancelled')
+        second = request_refund(self.transaction, Decimal('1500.00'), 'Cancelled')
+        self.assertEqual(first.approved_amount, Decimal('1500.00'))
+        self.assertEqual(second.approved_amount, Decimal('500.00'))
+        self.assertIsNone(request_refund(self.transaction, Decimal('1.00'), 'Cancelled'))
+
+    @override_settings(REFUND_MAX_ATTEMPTS=2, REFUND_RETRY_BASE_SECONDS=60)
+    def test_failed_call_is_retried_with_backoff_then_failed(self):
+        refund = request_refund(self.transaction, Decimal('500.00'), 'Cancelled')
+        with self.gateway({'success': False, 'error': 'Gateway timeout'}):
+            self.assertEqual(process_refunds(), {'APPROVED': 1})
+        refund.refresh_from_db()
+        self.assertEqual(refund.attempts, 1)
+        self.assertEqual(refund.last_error, 'Gateway timeout')
+        self.assertGreater(refund.available_at, timezone.now() + timedelta(seconds=50))
+
+        # Not due yet
+        self.assertEqual(process_refunds(), {})
+        Refund.objects.filter(pk=refund.pk).update(available_at=timezone.now())
+        with self.gateway({'success': False, 'error': 'Gateway timeout'}):
+            self.assertEqual(process_refunds(), {'FAILED': 1})
+
+    def test_completed_refunds_update_the_transaction(self):
+        request_refund(self.transaction, Decimal('500.00'), 'Cancelled')
+        with self.gateway({'success': True, 'refund': {'id': 'rfnd_1'}}):
+            self.assertEqual(process_refunds(), {'COMPLETED': 1})
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.refund_amount, Decimal('500.00'))
+        self.assertEqual(self.transaction.status, 'SUCCESS')
+
+        request_refund(self.transaction, Decimal('1500.00'), 'Cancelled')
+        with self.gateway({'success': True, 'refund': {'id': 'rfnd_2'}}):
+            process_refunds()
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'REFUNDED')
+        self.assertEqual(get_spending_summary(self.user).total_refunded, Decimal('2000.00'))
+
+    def test_oldest_refund_is_claimed_first(self):
+        older = request_refund(self.transaction, Decimal('100.00'), 'First')
+        request_refund(self.transaction, Decimal('100.00'), 'Second')
+        Refund.objects.filter(pk=older.pk).update(requested_at=timezone.now() - timedelta(days=1))
+        with self.gateway({'success': True, 'refund': {'id': 'rfnd_1'}}):
+            process_refunds(batch_size=1)
+        older.refresh_from_db()
+        self.assertEqual(older.status, 'COMPLETED')
+
+
+class ReconciliationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='guest', password='pw-12345')
+        self.completed_at = timezone.now() - timedelta(days=1)
+
+    def record(self, order_id, amount='2000.00', status='captured'):
+        return SettlementRecord(order_id, f'pay_{order_id}', Decimal(amount), status, timezone.now())
+
+    def test_issues_are_classified(self):
+        make_transaction(self.user, status='SUCCESS', gateway_transaction_id='o_ok', completed_at=self.completed_at)
+        make_transaction(self.user, status='SUCCESS', gateway_transaction_id='o_amount', completed_at=self.completed_at)
+        make_transaction(self.user, status='SUCCESS', gateway_transaction_id='o_missing', completed_at=self.completed_at)
+        make_transaction(self.user, status='PENDING', gateway_transaction_id='o_pending')
+
+        summary = Reconciler().run([
+            self.record('o_ok'), self.record('o_amount', '1999.00'), self.record('o_pending'), self.record('o_orphan'),
+        ])
+        self.assertEqual(summary['issues'], {
+            'AMOUNT_MISMATCH': 1, 'STATUS_MISMATCH': 1, 'ORPHAN_PAYMENT': 1, 'MISSING_CAPTURE': 1,
+        })
+
+    def test_fix_replays_each_capture_once(self):
+        make_transaction(self.user, status='PENDING', gateway_transaction_id='o_pending')
+        records = [self.record('o_pending')]
+
+        self.assertEqual(Reconciler(fix=True).run(records)['captures_replayed'], 1)
+        self.assertEqual(Reconciler(fix=True).run(records)['captures_replayed'], 0)
+        self.assertEqual(PaymentWebhookEvent.objects.count(), 1)
+
+    def test_fix_fails_gateway_failures_and_stale_processing(self):
+        failed = make_transaction(self.user, status='PENDING', gateway_transaction_id='o_failed')
+        stale = make_transaction(self.user, status='PROCESSING', gateway_transaction_id='o_stale')
+        Transaction.objects.filter(pk=stale.pk).update(initiated_at=timezone.now() - timedelta(days=3))
+
+        summary = Reconciler(fix=True).run([self.record('o_failed', status='failed')])
+        self.assertEqual(summary['marked_failed'], 2)
+        self.assertEqual(set(Transaction.objects.filter(pk__in=[failed.pk, stale.pk]).values_list('status', flat=True)),
+                         {'FAILED'})
+
+
+class SpendingSummaryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='guest', password='pw-12345')
+
+    def test_status_changes_update_the_summary(self):
+        transaction_obj = make_transaction(self.user, amount=Decimal('800.00'))
+        self.assertFalse(UserSpendingSummary.objects.filter(pk=self.user.pk).exists())
+
+        transaction_obj.status = 'SUCCESS'
+        transaction_obj.save()
+        transaction_obj.status = 'REFUNDED'
+        transaction_obj.refund_amount = Decimal('300.00')
+        transaction_obj.save()
+
+        summary = get_spending_summary(self.user)
+        self.assertEqual(summary.hotel_spent, Decimal('500.00'))
+        self.assertEqual(summary.total_refunded, Decimal('300.00'))
+        self.assertEqual(summary.paid_transactions, 1)
+
+    def test_rebuild_matches_incremental_and_skips_synthetic(self):
+        make_transaction(self.user, amount=Decimal('800.00'), status='SUCCESS')
+        make_transaction(self.user, amount=Decimal('200.00'), status='SUCCESS', transaction_type='TRANSPORT_BOOKING')
+        make_transaction(self.user, amount=Decimal('999.00'), status='SUCCESS', is_synthetic=True)
+        incremental = get_spending_summary(self.user)
+
+        rebuild_spending_summaries()
+        rebuilt = get_spending_summary(self.user)
+        self.assertEqual(rebuilt.lifetime_value, Decimal('1000.00'))
+        self.assertEqual(
+            (rebuilt.hotel_spent, rebuilt.transport_spent, rebuilt.paid_transactions),
+            (incremental.hotel_spent, incremental.transport_spent, incremental.paid_transactions),
+        )
+
+
+class GatewaySimulatorTests(TestCase):
+    @override_settings(DEBUG=False)
+    def test_refuses_without_local_gateway(self):
+        with self.assertRaises(CommandError):
+            call_command('simulate_gateway_webhooks', transactions=1)
+        self.assertFalse(Transaction.objects.exists())
+
+
+class StatementDownloadTests(TestCase):
+    def test_invalid_period_redirects(self):
+        user = User.objects.create_user(username='guest', password='pw-12345')
+        self.client.force_login(user)
+        for year, month in ((2024, 13), (0, 1), (99999, 1)):
+            response = self.client.get(reverse('statement_download', args=[year, month]))
+            self.assertEqual(response.status_code, 302)
@@ -6,15 +6,22 @@ urlpatterns = [
     path('', views.payment_dashboard_view, name='payment_dashboard'),
     path('methods/', views.payment_methods_view, name='payment_methods'),
     path('history/', views.transaction_history_view, name='transaction_history'),
+    path('history/export/', views.export_transactions_view, name='export_transactions'),
     
     # PAYMENT PROCESSING URLs
     path('process/', views.process_payment_view, name='process_payment'),
     path('payment/<uuid:transaction_id>/', views.payment_page_view, name='payment_page'),
     path('verify/', views.verify_payment_view, name='verify_payment'),
+    path('status/<uuid:transaction_id>/', views.payment_status_view, name='payment_status'),
+    path('webhooks/razorpay/', views.payment_webhook_view, name='payment_webhook'),
     path('success/<uuid:transaction_id>/', views.payment_success_view, name='payment_success'),
     path('failure/<uuid:transaction_id>/', views.payment_failure_view, name='payment_failure'),
     path('retry/<uuid:transaction_id>/', views.retry_payment_view, name='retry_payment'),
-    
+
+    # INVOICE DOCUMENT URLs
+    path('invoices/<str:invoice_number>/download/', views.invoice_download_view, name='invoice_download'),
+    path('statements/<int:year>/<int:month>/', views.statement_download_view, name='statement_download'),
+
     # PAYMENT METHOD & RECEIPT URLs
     path('save-method/', views.save_payment_method_view, name='save_payment_method'),
     path('send-receipt/', views.send_email_receipt_view, name='send_email_receipt'),
@@ -6,7 +6,6 @@ from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 from django.utils import timezone
 from django.db import transaction
-from django.db import models
 import json
 import logging
 from .models import PaymentMethod, Transaction, Invoice, Refund
@@ -22,16 +21,15 @@ def payment_dashboard_view(request):
     recent_transactions = Transaction.objects.filter(user=request.user)[:5]
     payment_methods = PaymentMethod.objects.filter(user=request.user, is_active=True)
     
-    # Calculate total spent
-    total_spent = Transaction.objects.filter(
-        user=request.user, 
-        status='SUCCESS'
-    ).aggregate(total=models.Sum('amount'))['total'] or 0
+    # Totals are maintained incrementally (see spending.py)
+    from .spending import get_spending_summary
+    spending = get_spending_summary(request.user)
     
     context = {
         'recent_transactions': recent_transactions,
         'payment_methods': payment_methods,
-        'total_spent': total_spent,
+        'total_spent': spending.lifetime_value,
+        'spending': spending,
     }
     return render(request, 'payment_management/dashboard.html', context)
 
@@ -51,6 +49,25 @@ def transaction_history_view(request):
     }
     return render(request, 'payment_management/history.html', context)
 
+@login_required
+def export_transactions_view(request):
+    """
+    Stream the user's transactions as CSV or JSON lines
+    (?format=csv|jsonl&columns=a,b&from=YYYY-MM-DD&to=YYYY-MM-DD)
+    """
+    from export_utils import streaming_export_response
+
+    try:
+        return streaming_export_response(
+            'transactions',
+            request.GET,
+            queryset=Transaction.objects.filter(user=request.user),
+            filename=f"nomado-transactions-{timezone.localdate():%Y%m%d}",
+        )
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('payment_dashboard')
+
 
 # NEW PAYMENT PROCESSING VIEWS
 @login_required
@@ -193,7 +210,8 @@ def payment_page_view(request, transaction_id):
 @login_required
 def verify_payment_view(request):
     """
-    SIMPLIFIED: Skip all validation and mark payment as successful
+    Checkout callback. Confirmation happens when the gateway webhook is
+    processed; this only reports the transaction's current status.
     """
     if request.method != 'POST':
         return JsonResponse({'success': False, 'message': 'Invalid request method'})
@@ -214,46 +232,19 @@ def verify_payment_view(request):
             user=request.user
         )
         
-        # SKIP ALL VALIDATION - Always mark as successful
-        with transaction.atomic():
-            # Payment automatically successful
-            transaction_obj.status = 'SUCCESS'
-            transaction_obj.completed_at = timezone.now()
-            transaction_obj.save()
-            
-            # Update booking status
-            if transaction_obj.hotel_booking:
-                booking = transaction_obj.hotel_booking
-                booking.booking_status = 'CONFIRMED'
-                booking.save()
-            elif transaction_obj.transport_booking:
-                booking = transaction_obj.transport_booking
-                booking.booking_status = 'CONFIRMED'
-                booking.save()
-                # Update seat availability
-                if hasattr(booking, 'route') and hasattr(booking.route, 'available_seats'):
-                    route = booking.route
-                    route.available_seats = max(0, route.available_seats - booking.passengers)
-                    route.save()
+        # In local mode the bundled simulator plays the gateway and delivers the webhook
+        from .gateway_simulator import local_gateway_enabled, simulate_checkout_capture
+        if local_gateway_enabled() and transaction_obj.status == 'PROCESSING':
+            from .webhooks import kick_inline_worker
             
-            # Create invoice
-            create_invoice_for_transaction(transaction_obj)
-            
-            # SEND EMAIL RECEIPT - This is the important part
-            email_sent = send_booking_receipt_email(transaction_obj)
-            
-            # Log successful payment
-            logger.info(f"Payment successful for transaction {transaction_id}, Email sent: {email_sent}")
-            
-            # Clear session
-            if 'current_transaction_id' in request.session:
-                del request.session['current_transaction_id']
-            
-            return JsonResponse({
-                'success': True,
-                'message': 'Payment successful! Your booking is confirmed. Receipt sent to your email.',
-                'redirect_url': f'/payments/success/{transaction_id}/'
-            })
+            simulate_checkout_capture(transaction_obj)
+            kick_inline_worker()
+        
+        # Clear session
+        if 'current_transaction_id' in request.session:
+            del request.session['current_transaction_id']
+        
+        return JsonResponse(_payment_status_payload(transaction_obj))
                 
     except Exception as e:
         logger.error(f"Payment verification error: {str(e)}")
@@ -262,6 +253,45 @@ def verify_payment_view(request):
             'message': f'Payment processing error: {str(e)}'
         })
 
+@login_required
+def payment_status_view(request, transaction_id):
+    """Polled by the payment page until the webhook worker settles the transaction"""
+    transaction_obj = get_object_or_404(
+        Transaction, 
+        transaction_id=transaction_id, 
+        user=request.user
+    )
+    return JsonResponse(_payment_status_payload(transaction_obj))
+
+@csrf_exempt
+def payment_webhook_view(request):
+    """
+    Gateway webhook endpoint. Verifies the signature and stores the event;
+    the booking is confirmed later by the webhook worker.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Invalid request method'}, status=405)
+    
+    from .webhooks import kick_inline_worker, record_webhook_event, verify_webhook_signature
+    
+    signature = request.headers.get('X-Razorpay-Signature', '')
+    if not verify_webhook_signature(request.body, signature):
+        logger.warning("Rejected webhook with invalid signature")
+        return JsonResponse({'success': False, 'message': 'Invalid signature'}, status=400)
+    
+    try:
+        event, created = record_webhook_event(
+            request.body,
+            signature=signature,
+            event_id=request.headers.get('X-Razorpay-Event-Id')
+        )
+        if created:
+            kick_inline_worker()
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Malformed payload'}, status=400)
+    
+    return JsonResponse({'success': True, 'duplicate': not created})
+
 @login_required
 def payment_success_view(request, transaction_id):
     """
@@ -495,7 +525,119 @@ def send_email_receipt_view(request):
         })
 
 
+# INVOICE DOCUMENT VIEWS
+def _client_has(request, etag):
+    return etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]
+
+def _not_modified(etag):
+    from django.http import HttpResponseNotModified
+
+    response = HttpResponseNotModified()
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, max-age=0, must-revalidate'
+    return response
+
+def _document_response(request, document, filename, etag=None):
+    """Serve a stored document, answering 304 when the client's copy is current"""
+    from django.core.files.storage import default_storage
+    from django.http import FileResponse
+    from .invoice_documents import CONTENT_TYPES
+
+    etag = f'"{etag or document.content_hash}"'
+    if _client_has(request, etag):
+        return _not_modified(etag)
+    response = FileResponse(
+        default_storage.open(document.storage_name, 'rb'),
+        content_type=CONTENT_TYPES[document.format],
+        as_attachment=request.GET.get('download') == '1',
+        filename=f'{filename}.{document.format}',
+    )
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, max-age=0, must-revalidate'
+    return response
+
+@login_required
+def invoice_download_view(request, invoice_number):
+    """
+    Download an invoice as HTML or PDF (?format=pdf)
+    """
+    from .invoice_documents import DocumentFormatUnavailable, get_invoice_document
+
+    invoice = get_object_or_404(Invoice.objects.select_related('transaction__user'), invoice_number=invoice_number)
+    if invoice.transaction.user != request.user and not request.user.is_staff:
+        messages.error(request, 'Invoice not found')
+        return redirect('transaction_history')
+
+    fmt = request.GET.get('format', 'html')
+    if fmt not in ('html', 'pdf'):
+        fmt = 'html'
+
+    try:
+        document = get_invoice_document(invoice, fmt)
+    except DocumentFormatUnavailable as e:
+        logger.warning(str(e))
+        messages.error(request, 'PDF invoices are not available right now. Showing the HTML invoice instead.')
+        return redirect(f"{request.path}?format=html")
+
+    return _document_response(request, document, invoice.invoice_number)
+
+@login_required
+def statement_download_view(request, year, month):
+    """
+    Monthly statement of all invoices for the logged-in user
+    """
+    from datetime import MAXYEAR, MINYEAR, date
+    from .invoice_documents import DocumentFormatUnavailable, get_statement_document, statement_source_key
+
+    # MAXYEAR is excluded: the statement query needs the following month too
+    if not (1 <= month <= 12 and MINYEAR <= year < MAXYEAR):
+        messages.error(request, 'Invalid statement month')
+        return redirect('transaction_history')
+
+    fmt = 'pdf' if request.GET.get('format') == 'pdf' else 'html'
+    period = date(year, month, 1)
+    # Checked before anything is rendered or read from storage
+    source_key = statement_source_key(request.user, period, fmt)
+    if _client_has(request, f'"{source_key}"'):
+        return _not_modified(f'"{source_key}"')
+    try:
+        document = get_statement_document(request.user, period, fmt, source_key=source_key)
+    except DocumentFormatUnavailable as e:
+        logger.warning(str(e))
+        messages.error(request, 'PDF statements are not available right now. Showing the HTML statement instead.')
+        return redirect(request.path)
+
+    return _document_response(request, document, f'nomado-statement-{year}-{month:02d}', etag=source_key)
+
+
 # UTILITY FUNCTIONS
+def _payment_status_payload(transaction_obj):
+    """JSON body describing where a transaction stands"""
+    transaction_obj.refresh_from_db(fields=['status', 'failure_reason'])
+    status = transaction_obj.status
+    
+    if status == 'SUCCESS':
+        return {
+            'success': True,
+            'status': status,
+            'message': 'Payment successful! Your booking is confirmed. Receipt sent to your email.',
+            'redirect_url': f'/payments/success/{transaction_obj.transaction_id}/'
+        }
+    if status in ['FAILED', 'CANCELLED']:
+        return {
+            'success': False,
+            'status': status,
+            'message': transaction_obj.failure_reason or 'Payment failed',
+            'redirect_url': f'/payments/failure/{transaction_obj.transaction_id}/'
+        }
+    return {
+        'success': True,
+        'pending': True,
+        'status': status,
+        'message': 'Waiting for payment confirmation from the gateway',
+        'status_url': f'/payments/status/{transaction_obj.transaction_id}/'
+    }
+
 def create_invoice_for_transaction(transaction_obj):
     """
     Create invoice for successful transaction
@@ -506,18 +648,18 @@ def create_invoice_for_transaction(transaction_obj):
             return transaction_obj.invoice
         
         # Calculate invoice details
+        from .tax import quote_for_transaction
         subtotal = transaction_obj.amount
-        tax_rate = 0.18  # 18% GST
-        tax_amount = subtotal * tax_rate
-        total_amount = subtotal + tax_amount
+        quote = quote_for_transaction(transaction_obj, subtotal)
         
         # Create invoice
         invoice = Invoice.objects.create(
             transaction=transaction_obj,
             due_date=timezone.now() + timezone.timedelta(days=30),
             subtotal=subtotal,
-            tax_amount=tax_amount,
-            total_amount=total_amount,
+            tax_rate=quote.rate,
+            tax_amount=quote.tax_amount,
+            total_amount=quote.total_amount,
             is_paid=True,
             paid_at=timezone.now()
         )
@@ -530,12 +672,12 @@ def create_invoice_for_transaction(transaction_obj):
         return None
 
 def send_booking_receipt_email(transaction):
-    """Send booking confirmation email with receipt"""
+    """Queue booking confirmation email with receipt"""
     try:
-        from django.core.mail import send_mail
+        from location_sos.models import QueuedNotification
+        from location_sos.notification_queue import enqueue_email
         from django.template.loader import render_to_string
         from django.utils.html import strip_tags
-        from django.conf import settings
         import logging
         
         logger = logging.getLogger(__name__)
@@ -598,42 +740,17 @@ def send_booking_receipt_email(transaction):
             """
             html_message = None
         
-        # Send email
-        try:
-            email_sent = send_mail(
-                subject=subject_line,
-                message=plain_message,
-                from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@nomado.com'),
-                recipient_list=[transaction.user.email],
-                html_message=html_message,
-                fail_silently=False
-            )
-            
-            if email_sent:
-                logger.info(f"Receipt email sent successfully to {transaction.user.email} for transaction {transaction.transaction_id}")
-                return True
-            else:
-                logger.error(f"Failed to send receipt email - send_mail returned False")
-                return False
-                
-        except Exception as email_error:
-            logger.error(f"SMTP Error sending email: {str(email_error)}")
-            
-            # Try to send a simple text email as fallback
-            try:
-                from django.core.mail import EmailMessage
-                email = EmailMessage(
-                    subject=subject_line,
-                    body=plain_message,
-                    from_email=settings.EMAIL_HOST_USER,
-                    to=[transaction.user.email],
-                )
-                email.send(fail_silently=False)
-                logger.info(f"Fallback email sent successfully")
-                return True
-            except Exception as fallback_error:
-                logger.error(f"Fallback email also failed: {str(fallback_error)}")
-                return False
+        # Queue for the notification worker, which retries and dead-letters failures
+        queued = enqueue_email(
+            transaction.user.email,
+            subject_line,
+            plain_message,
+            html_message or '',
+            category='RECEIPT',
+            priority=QueuedNotification.PRIORITY_RECEIPT,
+        )
+        logger.info(f"Receipt email queued for {transaction.user.email} for transaction {transaction.transaction_id}")
+        return bool(queued)
         
     except Exception as e:
         logger.error(f"General error sending receipt email for transaction {transaction.transaction_id}: {str(e)}")
@@ -0,0 +1,237 @@
+# payment_management/webhooks.py
+"""
+Gateway webhook ingestion and processing.
+
+The webhook endpoint only verifies the signature and stores the event.
+Events are then confirmed against their Transaction by a worker
+(`python manage.py process_payment_webhooks`), so a duplicate or replayed
+delivery never confirms a booking twice.
+"""
+import hashlib
+import hmac
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from worker_utils import InlineWorker
+
+from .models import PaymentWebhookEvent, Transaction
+from .outbox import enqueue_post_payment_messages, kick_inline_worker as kick_outbox_worker
+
+logger = logging.getLogger(__name__)
+
+# Gateway event types and the transaction state they drive
+CAPTURE_EVENTS = ('payment.captured', 'order.paid')
+FAILURE_EVENTS = ('payment.failed',)
+
+
+def compute_webhook_signature(body, secret=None):
+    """HMAC-SHA256 hex digest of the raw request body (Razorpay scheme)"""
+    secret = secret or settings.RAZORPAY_WEBHOOK_SECRET
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+
+def verify_webhook_signature(body, signature, secret=None):
+    """Constant-time check of the X-Razorpay-Signature header"""
+    if not signature:
+        return False
+    return hmac.compare_digest(compute_webhook_signature(body, secret), signature)
+
+
+def _object(value):
+    return value if isinstance(value, dict) else {}
+
+
+def _extract_references(data):
+    """Pull order/payment ids and our transaction id out of an event payload"""
+    payload = _object(data.get('payload'))
+    payment = _object(_object(payload.get('payment')).get('entity'))
+    order = _object(_object(payload.get('order')).get('entity'))
+    notes = _object(payment.get('notes') or order.get('notes'))
+    return {
+        'order_id': payment.get('order_id') or order.get('id') or '',
+        'payment_id': payment.get('id') or '',
+        'amount': payment.get('amount', order.get('amount_paid')),
+        'currency': payment.get('currency') or order.get('currency') or '',
+        'error': payment.get('error_description') or payment.get('error_reason') or '',
+        'transaction_id': notes.get('transaction_id', ''),
+    }
+
+
+def record_webhook_event(body, signature='', event_id=None):
+    """
+    Durably store a verified webhook delivery.
+    Returns (event, created); created is False for a duplicate delivery.
+    """
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    data = json.loads(body)
+    if not isinstance(data, dict):
+        raise ValueError('Webhook payload is not a JSON object')
+    refs = _extract_references(data)
+    event_id = event_id or hashlib.sha256(body).hexdigest()[:64]
+
+    # Insert first: duplicates are rare and the unique event_id rejects them
+    try:
+        with transaction.atomic():
+            event = PaymentWebhookEvent.objects.create(
+                event_id=event_id,
+                event_type=data.get('event', ''),
+                payload=data,
+                signature=signature,
+                gateway_order_id=refs['order_id'],
+                gateway_payment_id=refs['payment_id'],
+            )
+        created = True
+    except IntegrityError:
+        event, created = PaymentWebhookEvent.objects.get(event_id=event_id), False
+
+    if created:
+        logger.info(f"Stored webhook {event.event_type} ({event.event_id})")
+    return event, created
+
+
+def _find_transaction(refs):
+    """Resolve the Transaction an event refers to"""
+    qs = Transaction.objects.select_related('hotel_booking', 'transport_booking__route')
+    if refs['order_id']:
+        transaction_obj = qs.filter(gateway_transaction_id=refs['order_id']).first()
+        if transaction_obj:
+            return transaction_obj
+    if refs['transaction_id']:
+        return qs.filter(transaction_id=refs['transaction_id']).first()
+    return None
+
+
+def confirm_transaction(transaction_obj, payment_id=''):
+    """
+    Mark a transaction successful, confirm its booking and queue the
+    post-payment outbox messages. Must run inside transaction.atomic();
+    returns False if it was already confirmed.
+    """
+    transaction_obj = Transaction.objects.select_for_update().get(pk=transaction_obj.pk)
+    if transaction_obj.status == 'SUCCESS':
+        return False
+
+    transaction_obj.status = 'SUCCESS'
+    transaction_obj.completed_at = timezone.now()
+    transaction_obj.failure_reason = ''
+    if payment_id:
+        transaction_obj.gateway_payment_id = payment_id
+    transaction_obj.save()
+
+    # Update booking status
+    if transaction_obj.hotel_booking:
+        booking = transaction_obj.hotel_booking
+        booking.booking_status = 'CONFIRMED'
+        booking.save()
+    elif transaction_obj.transport_booking:
+        booking = transaction_obj.transport_booking
+        booking.booking_status = 'CONFIRMED'
+        booking.save()
+        # Update seat availability
+        if hasattr(booking, 'route') and hasattr(booking.route, 'available_seats'):
+            route = booking.route
+            route.available_seats = max(0, route.available_seats - booking.passengers)
+            route.save()
+
+    # Invoice, receipt and provider side effects are delivered by the outbox worker
+    enqueue_post_payment_messages(transaction_obj)
+    kick_outbox_worker()
+    logger.info(f"Payment successful for transaction {transaction_obj.transaction_id}")
+    return True
+
+
+def fail_transaction(transaction_obj, reason):
+    """Mark a transaction failed unless a capture already confirmed it"""
+    updated = Transaction.objects.filter(pk=transaction_obj.pk).exclude(status__in=['SUCCESS', 'REFUNDED']).update(
+        status='FAILED',
+        failure_reason=reason or 'Payment failed at gateway',
+    )
+    return bool(updated)
+
+
+def process_webhook_event(event):
+    """Apply one stored event to its transaction. Safe to call repeatedly."""
+    refs = _extract_references(event.payload)
+    transaction_obj = _find_transaction(refs)
+
+    if transaction_obj is None:
+        return 'IGNORED', 'No matching transaction'
+
+    event.transaction = transaction_obj
+
+    if event.event_type in CAPTURE_EVENTS:
+        if refs['amount'] is not None and int(refs['amount']) != int(transaction_obj.amount * 100):
+            return 'FAILED', f"Amount mismatch: gateway {refs['amount']} paise, expected {int(transaction_obj.amount * 100)}"
+        if refs['currency'] and str(refs['currency']).upper() != transaction_obj.currency.upper():
+            return 'FAILED', f"Currency mismatch: gateway {refs['currency']}, expected {transaction_obj.currency}"
+        with transaction.atomic():
+            changed = confirm_transaction(transaction_obj, payment_id=refs['payment_id'])
+        return 'PROCESSED', '' if changed else 'Already confirmed'
+
+    if event.event_type in FAILURE_EVENTS:
+        changed = fail_transaction(transaction_obj, refs['error'])
+        return 'PROCESSED', '' if changed else 'Transaction already confirmed'
+
+    return 'IGNORED', f"Unhandled event type {event.event_type}"
+
+
+def release_stale_claims():
+    """Put events claimed by a worker that died back to PENDING"""
+    timeout = getattr(settings, 'PAYMENT_WEBHOOK_CLAIM_TIMEOUT_SECONDS', 300)
+    # No claimed_at: claimed before the column existed
+    return PaymentWebhookEvent.objects.filter(
+        Q(claimed_at__lt=timezone.now() - timedelta(seconds=timeout)) | Q(claimed_at__isnull=True),
+        status='PROCESSING',
+    ).update(status='PENDING', claimed_at=None)
+
+
+def _claim(event):
+    """Move an event to PROCESSING; False if another worker got it first"""
+    return PaymentWebhookEvent.objects.filter(pk=event.pk, status='PENDING').update(
+        status='PROCESSING', claimed_at=timezone.now()) == 1
+
+
+def process_pending_events(batch_size=None):
+    """Drain one batch of pending events. Returns a count per resulting status."""
+    batch_size = batch_size or getattr(settings, 'PAYMENT_WEBHOOK_BATCH_SIZE', 100)
+    max_attempts = getattr(settings, 'PAYMENT_WEBHOOK_MAX_ATTEMPTS', 5)
+    counts = {}
+
+    released = release_stale_claims()
+    if released:
+        logger.warning(f"Released {released} webhook events left in PROCESSING")
+
+    events = list(PaymentWebhookEvent.objects.filter(status='PENDING').order_by('received_at')[:batch_size])
+    for event in events:
+        if not _claim(event):
+            continue
+
+        event.attempts += 1
+        try:
+            status, message = process_webhook_event(event)
+        except Exception as e:
+            logger.error(f"Webhook {event.event_id} processing error: {str(e)}")
+            status = 'FAILED' if event.attempts >= max_attempts else 'PENDING'
+            message = str(e)
+
+        event.status = status
+        event.last_error = message
+        event.claimed_at = None
+        if status in ('PROCESSED', 'IGNORED'):
+            event.processed_at = timezone.now()
+        event.save(update_fields=['status', 'attempts', 'last_error', 'claimed_at', 'processed_at', 'transaction'])
+        counts[status] = counts.get(status, 0) + 1
+
+    return counts
+
+
+kick_inline_worker = InlineWorker(process_pending_events, 'PAYMENT_WEBHOOK_INLINE_WORKER').kick
@@ -74,4 +74,30 @@ def get_payment_details(payment_id):
         return {
             'success': False,
             'error': str(e)
-        }
\ No newline at end of file
+        }
+def create_razorpay_refund(payment_id, amount, receipt=None, notes=None):
+    """Refund (part of) a captured Razorpay payment"""
+    try:
+        client = get_razorpay_client()
+        
+        refund_data = {
+            'amount': int(amount * 100),  # Convert to paisa
+            'speed': 'normal',
+        }
+        
+        if receipt:
+            refund_data['receipt'] = receipt
+        if notes:
+            refund_data['notes'] = notes
+            
+        refund = client.payment.refund(payment_id, refund_data)
+        return {
+            'success': True,
+            'refund': refund
+        }
+    except Exception as e:
+        logger.error(f"Razorpay refund failed for {payment_id}: {str(e)}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
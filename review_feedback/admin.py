@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import HotelReview, TransportReview, ReviewHelpful, Feedback
+from .models import HotelReview, TransportReview, ReviewHelpful, Feedback, HotelRatingAggregate, RouteRatingAggregate
+from .aggregates import approve_reviews
 
 @admin.register(HotelReview)
 class HotelReviewAdmin(admin.ModelAdmin):
@@ -31,7 +32,7 @@ class HotelReviewAdmin(admin.ModelAdmin):
     actions = ['approve_reviews', 'feature_reviews', 'verify_reviews']
     
     def approve_reviews(self, request, queryset):
-        updated = queryset.update(is_approved=True)
+        updated = approve_reviews(HotelReview, queryset)
         self.message_user(request, f'{updated} reviews approved.')
     approve_reviews.short_description = 'Approve selected reviews'
     
@@ -71,6 +72,13 @@ class TransportReviewAdmin(admin.ModelAdmin):
             'fields': ('created_at', 'updated_at')
         }),
     )
+    
+    actions = ['approve_reviews']
+    
+    def approve_reviews(self, request, queryset):
+        updated = approve_reviews(TransportReview, queryset)
+        self.message_user(request, f'{updated} reviews approved.')
+    approve_reviews.short_description = 'Approve selected reviews'
 
 @admin.register(Feedback)
 class FeedbackAdmin(admin.ModelAdmin):
@@ -102,4 +110,16 @@ class FeedbackAdmin(admin.ModelAdmin):
 class ReviewHelpfulAdmin(admin.ModelAdmin):
     list_display = ['user', 'hotel_review', 'transport_review', 'is_helpful', 'created_at']
     list_filter = ['is_helpful', 'created_at']
-    search_fields = ['user__username']
\ No newline at end of file
+    search_fields = ['user__username']
+
+@admin.register(HotelRatingAggregate)
+class HotelRatingAggregateAdmin(admin.ModelAdmin):
+    list_display = ['hotel', 'review_count', 'overall_average', 'updated_at']
+    search_fields = ['hotel__name']
+    readonly_fields = ['updated_at']
+
+@admin.register(RouteRatingAggregate)
+class RouteRatingAggregateAdmin(admin.ModelAdmin):
+    list_display = ['route', 'review_count', 'overall_average', 'updated_at']
+    search_fields = ['route__route_number']
+    readonly_fields = ['updated_at']
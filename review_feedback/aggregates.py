@@ -0,0 +1,130 @@
+# review_feedback/aggregates.py
+"""
+Incremental rating aggregates for hotels and routes.
+
+HotelRatingAggregate and RouteRatingAggregate hold the number of approved
+reviews and the sum of each rating dimension. A review's contribution is
+applied as a delta. Creating, approving, editing, unapproving or deleting
+a review costs a fixed handful of queries, however many reviews the
+target has. Signals (review_feedback.signals) compare a review with its
+stored state. Bulk paths that skip signals, such as the admin approve
+action, call apply_deltas() themselves.
+
+Hotel.overall_rating is kept equal to the review average, so search
+filtering and sorting stay plain column reads. A hotel with no approved
+reviews falls back to its listed ratings. `python manage.py
+rebuild_rating_aggregates` recomputes everything from the reviews if the
+aggregates ever drift.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from hotel_booking.models import Hotel
+
+from .models import HotelRatingAggregate, HotelReview, RouteRatingAggregate, TransportReview
+
+# Review model -> (aggregate model, field of the review pointing at the target)
+TARGETS = {
+    HotelReview: (HotelRatingAggregate, 'hotel_id'),
+    TransportReview: (RouteRatingAggregate, 'route_id'),
+}
+
+
+def _rating_field(dimension):
+    return f'{dimension}_rating'
+
+
+def contribution(review_model, values):
+    """(target id, {dimension: rating}) a review adds when approved, from a review or a values() dict"""
+    aggregate_model, target_field = TARGETS[review_model]
+    get = values.get if isinstance(values, dict) else lambda name: getattr(values, name)
+    return get(target_field), {dimension: get(_rating_field(dimension)) for dimension in aggregate_model.DIMENSIONS}
+
+
+def stored_state(review_model, pk):
+    """What the database holds for a review now: (is_approved, target id, ratings), or None"""
+    aggregate_model, target_field = TARGETS[review_model]
+    fields = ['is_approved', target_field, *(_rating_field(dimension) for dimension in aggregate_model.DIMENSIONS)]
+    row = review_model.objects.filter(pk=pk).values(*fields).first()
+    if row is None:
+        return None
+    target_id, ratings = contribution(review_model, row)
+    return row['is_approved'], target_id, ratings
+
+
+def add_delta(deltas, target_id, sign, ratings):
+    """Add (sign=1) or remove (sign=-1) one review's ratings to a {target id: [count, {dimension: sum}]} dict"""
+    entry = deltas.setdefault(target_id, [0, {}])
+    entry[0] += sign
+    for dimension, rating in ratings.items():
+        entry[1][dimension] = entry[1].get(dimension, 0) + sign * rating
+
+
+def apply_deltas(review_model, deltas):
+    """Fold {target id: [count delta, {dimension: sum delta}]} into the aggregates"""
+    aggregate_model, target_field = TARGETS[review_model]
+    with transaction.atomic():
+        for target_id, (count, sums) in deltas.items():
+            if not count and not any(sums.values()):
+                continue
+            aggregate = aggregate_model.objects.filter(**{target_field: target_id})
+            changes = {
+                'review_count': F('review_count') + count,
+                **{f'{dimension}_sum': F(f'{dimension}_sum') + delta for dimension, delta in sums.items()},
+            }
+            if not aggregate.update(**changes):
+                if count <= 0:
+                    # Nothing recorded to take away from (the target may be being deleted)
+                    continue
+                aggregate_model.objects.get_or_create(**{target_field: target_id})
+                aggregate.update(**changes)
+            if aggregate_model is HotelRatingAggregate:
+                sync_hotel_rating(target_id)
+
+
+def approve_reviews(review_model, queryset):
+    """Approve reviews in bulk, counting the newly approved ones in; returns how many were approved"""
+    with transaction.atomic():
+        pending = list(queryset.filter(is_approved=False).select_for_update())
+        review_model.objects.filter(pk__in=[review.pk for review in pending]).update(is_approved=True)
+        deltas = {}
+        for review in pending:
+            target_id, ratings = contribution(review_model, review)
+            add_delta(deltas, target_id, 1, ratings)
+        apply_deltas(review_model, deltas)
+    return len(pending)
+
+
+def sync_hotel_rating(hotel_id):
+    """Copy the review average (or the listed ratings' fallback) into Hotel.overall_rating"""
+    hotel = Hotel.objects.select_related('rating_aggregate').filter(pk=hotel_id).first()
+    if hotel is not None:
+        Hotel.objects.filter(pk=hotel_id).update(overall_rating=hotel.compute_overall_rating())
+
+
+# REPAIR
+def rebuild_aggregates(review_model):
+    """Recompute every aggregate of one kind from the approved reviews; returns how many targets have reviews"""
+    aggregate_model, target_field = TARGETS[review_model]
+    dimensions = aggregate_model.DIMENSIONS
+    rows = review_model.objects.filter(is_approved=True).order_by().values(target_field).annotate(
+        review_count=Count('pk'),
+        **{f'{dimension}_sum': Sum(_rating_field(dimension)) for dimension in dimensions},
+    )
+    aggregates = [aggregate_model(**row) for row in rows]
+    with transaction.atomic():
+        aggregate_model.objects.all().delete()
+        aggregate_model.objects.bulk_create(aggregates, batch_size=500)
+    return len(aggregates)
+
+
+def rebuild_hotel_ratings():
+    """Refresh Hotel.overall_rating for every hotel; returns how many changed"""
+    changed = []
+    for hotel in Hotel.objects.select_related('rating_aggregate').iterator(chunk_size=500):
+        rating = hotel.compute_overall_rating()
+        if rating != hotel.overall_rating:
+            hotel.overall_rating = rating
+            changed.append(hotel)
+    Hotel.objects.bulk_update(changed, ['overall_rating'], batch_size=500)
+    return len(changed)
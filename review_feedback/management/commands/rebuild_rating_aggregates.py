@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from review_feedback.aggregates import rebuild_aggregates, rebuild_hotel_ratings
+from review_feedback.models import HotelReview, TransportReview
+
+
+class Command(BaseCommand):
+    help = 'Recompute hotel and route rating aggregates from the approved reviews and refresh hotel ratings'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        hotels = rebuild_aggregates(HotelReview)
+        self.stdout.write(f'HotelRatingAggregate: rebuilt {hotels} hotels')
+        routes = rebuild_aggregates(TransportReview)
+        self.stdout.write(f'RouteRatingAggregate: rebuilt {routes} routes')
+        changed = rebuild_hotel_ratings()
+        self.stdout.write(f'Hotel: corrected {changed} overall ratings')
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating aggregates in {time.perf_counter() - started:.1f}s"))
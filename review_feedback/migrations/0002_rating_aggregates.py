@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotel_booking', '0002_hotel_owner'),
+        ('review_feedback', '0001_initial'),
+        ('transportation', '0002_route_owner'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HotelRatingAggregate',
+            fields=[
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('overall_sum', models.PositiveIntegerField(default=0)),
+                ('comfort_sum', models.PositiveIntegerField(default=0)),
+                ('service_sum', models.PositiveIntegerField(default=0)),
+                ('value_sum', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('hotel', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_aggregate', serialize=False, to='hotel_booking.hotel')),
+                ('cleanliness_sum', models.PositiveIntegerField(default=0)),
+                ('location_sum', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='RouteRatingAggregate',
+            fields=[
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('overall_sum', models.PositiveIntegerField(default=0)),
+                ('comfort_sum', models.PositiveIntegerField(default=0)),
+                ('service_sum', models.PositiveIntegerField(default=0)),
+                ('value_sum', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('route', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_aggregate', serialize=False, to='transportation.route')),
+                ('punctuality_sum', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:40
+
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+HOTEL_DIMENSIONS = ('overall', 'cleanliness', 'comfort', 'service', 'value', 'location')
+ROUTE_DIMENSIONS = ('overall', 'punctuality', 'comfort', 'service', 'value')
+
+
+def _build(review_model, aggregate_model, target_field, dimensions):
+    rows = review_model.objects.filter(is_approved=True).order_by().values(target_field).annotate(
+        review_count=Count('pk'),
+        **{f'{dimension}_sum': Sum(f'{dimension}_rating') for dimension in dimensions},
+    )
+    aggregates = [aggregate_model(**row) for row in rows]
+    aggregate_model.objects.bulk_create(aggregates, batch_size=500)
+    return aggregates
+
+
+def build_rating_aggregates(apps, schema_editor):
+    Hotel = apps.get_model('hotel_booking', 'Hotel')
+    hotel_aggregates = _build(
+        apps.get_model('review_feedback', 'HotelReview'),
+        apps.get_model('review_feedback', 'HotelRatingAggregate'),
+        'hotel_id', HOTEL_DIMENSIONS,
+    )
+    _build(
+        apps.get_model('review_feedback', 'TransportReview'),
+        apps.get_model('review_feedback', 'RouteRatingAggregate'),
+        'route_id', ROUTE_DIMENSIONS,
+    )
+    for aggregate in hotel_aggregates:
+        Hotel.objects.filter(pk=aggregate.hotel_id).update(
+            overall_rating=round(aggregate.overall_sum / aggregate.review_count, 2))
+
+
+def remove_rating_aggregates(apps, schema_editor):
+    apps.get_model('review_feedback', 'HotelRatingAggregate').objects.all().delete()
+    apps.get_model('review_feedback', 'RouteRatingAggregate').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review_feedback', '0002_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_rating_aggregates, remove_rating_aggregates),
+    ]
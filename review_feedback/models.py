@@ -76,6 +76,52 @@ class TransportReview(models.Model):
         unique_together = ['user', 'route']
         ordering = ['-created_at']
 
+class RatingAggregate(models.Model):
+    """Running count and per-dimension sums of a target's approved reviews (kept by review_feedback.aggregates)"""
+    DIMENSIONS = ()
+    
+    review_count = models.PositiveIntegerField(default=0)
+    overall_sum = models.PositiveIntegerField(default=0)
+    comfort_sum = models.PositiveIntegerField(default=0)
+    service_sum = models.PositiveIntegerField(default=0)
+    value_sum = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        abstract = True
+    
+    def average(self, dimension):
+        if not self.review_count:
+            return None
+        return round(getattr(self, f'{dimension}_sum') / self.review_count, 2)
+    
+    @property
+    def overall_average(self):
+        return self.average('overall')
+    
+    def averages(self):
+        """{dimension: average} for every rating dimension"""
+        return {dimension: self.average(dimension) for dimension in self.DIMENSIONS}
+
+class HotelRatingAggregate(RatingAggregate):
+    DIMENSIONS = ('overall', 'cleanliness', 'comfort', 'service', 'value', 'location')
+    
+    hotel = models.OneToOneField('hotel_booking.Hotel', on_delete=models.CASCADE, primary_key=True, related_name='rating_aggregate')
+    cleanliness_sum = models.PositiveIntegerField(default=0)
+    location_sum = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.hotel.name}: {self.overall_average} from {self.review_count} reviews"
+
+class RouteRatingAggregate(RatingAggregate):
+    DIMENSIONS = ('overall', 'punctuality', 'comfort', 'service', 'value')
+    
+    route = models.OneToOneField('transportation.Route', on_delete=models.CASCADE, primary_key=True, related_name='rating_aggregate')
+    punctuality_sum = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.route}: {self.overall_average} from {self.review_count} reviews"
+
 class ReviewHelpful(models.Model):
     """Track which users found reviews helpful"""
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -0,0 +1,43 @@
+# review_feedback/signals.py
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .aggregates import add_delta, apply_deltas, contribution, stored_state
+from .models import HotelReview, TransportReview
+
+
+@receiver(pre_save, sender=HotelReview)
+@receiver(pre_save, sender=TransportReview)
+def remember_stored_review(sender, instance, **kwargs):
+    # What the review contributed before this save, so post_save can apply the difference
+    instance._stored_rating_state = stored_state(sender, instance.pk) if instance.pk else None
+
+
+@receiver(post_save, sender=HotelReview)
+@receiver(post_save, sender=TransportReview)
+def update_rating_aggregates(sender, instance, **kwargs):
+    deltas = {}
+    stored = getattr(instance, '_stored_rating_state', None)
+    if stored is not None and stored[0]:
+        add_delta(deltas, stored[1], -1, stored[2])
+    if instance.is_approved:
+        target_id, ratings = contribution(sender, instance)
+        add_delta(deltas, target_id, 1, ratings)
+    apply_deltas(sender, deltas)
+
+
+@receiver(pre_delete, sender=HotelReview)
+@receiver(pre_delete, sender=TransportReview)
+def remember_deleted_review(sender, instance, **kwargs):
+    # The stored row, not the instance: a bulk approve may have left the instance stale
+    instance._stored_rating_state = stored_state(sender, instance.pk)
+
+
+@receiver(post_delete, sender=HotelReview)
+@receiver(post_delete, sender=TransportReview)
+def remove_from_rating_aggregates(sender, instance, **kwargs):
+    stored = getattr(instance, '_stored_rating_state', None)
+    if stored is not None and stored[0]:
+        deltas = {}
+        add_delta(deltas, stored[1], -1, stored[2])
+        apply_deltas(sender, deltas)
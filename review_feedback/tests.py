@@ -1,3 +1,77 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-# Create your tests here.
+from hotel_booking.models import Hotel
+
+from .aggregates import approve_reviews, rebuild_aggregates
+from .models import HotelRatingAggregate, HotelReview
+
+User = get_user_model()
+
+
+class HotelRatingAggregateTests(TestCase):
+    def setUp(self):
+        self.hotel = Hotel.objects.create(
+            name='Lake View', description='-', address='-', city='Udaipur', state='RJ', pincode='313001',
+            phone='9999999999', email='hotel@example.com', price_per_night=1000,
+            cleanliness_rating=4, comfort_rating=4, safety_rating=4,
+        )
+
+    def review(self, username, rating, **fields):
+        return HotelReview.objects.create(
+            user=User.objects.create_user(username=username, password='pw-12345'), hotel=self.hotel,
+            overall_rating=rating, cleanliness_rating=rating, comfort_rating=rating, service_rating=rating,
+            value_rating=rating, location_rating=rating, title='Stay', review_text='-', **fields
+        )
+
+    def aggregate(self):
+        return HotelRatingAggregate.objects.get(hotel=self.hotel)
+
+    def overall_rating(self):
+        return Hotel.objects.values_list('overall_rating', flat=True).get(pk=self.hotel.pk)
+
+    def test_listed_ratings_until_reviews_arrive(self):
+        self.assertEqual(self.overall_rating(), 4)
+        self.review('a', 5)
+        self.review('b', 2)
+        self.assertEqual(self.aggregate().review_count, 2)
+        self.assertEqual(self.overall_rating(), 3.5)
+
+    def test_edit_unapprove_and_delete_apply_deltas(self):
+        first = self.review('a', 5)
+        second = self.review('b', 3)
+
+        first.overall_rating = 1
+        first.save()
+        self.assertEqual(self.aggregate().overall_sum, 4)
+
+        second.is_approved = False
+        second.save()
+        self.assertEqual(self.aggregate().review_count, 1)
+        self.assertEqual(self.overall_rating(), 1)
+
+        first.delete()
+        self.assertEqual(self.aggregate().review_count, 0)
+        self.assertEqual(self.overall_rating(), 4)
+
+    def test_bulk_approve_counts_each_review_once(self):
+        self.review('a', 5, is_approved=False)
+        self.review('b', 3, is_approved=False)
+        queryset = HotelReview.objects.filter(hotel=self.hotel)
+
+        self.assertEqual(approve_reviews(HotelReview, queryset), 2)
+        self.assertEqual(approve_reviews(HotelReview, queryset), 0)
+        self.assertEqual(self.aggregate().review_count, 2)
+        self.assertEqual(self.overall_rating(), 4)
+
+    def test_rebuild_matches_incremental(self):
+        self.review('a', 5)
+        self.review('b', 2)
+        self.review('c', 4, is_approved=False)
+        incremental = self.aggregate()
+        HotelRatingAggregate.objects.update(review_count=99)
+
+        self.assertEqual(rebuild_aggregates(HotelReview), 1)
+        rebuilt = self.aggregate()
+        self.assertEqual(rebuilt.review_count, incremental.review_count)
+        self.assertEqual(rebuilt.averages(), incremental.averages())
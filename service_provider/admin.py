@@ -1,8 +1,9 @@
 from django.contrib import admin
+from payment_management.admin import LedgerProtectedDeleteMixin
 from .models import ServiceProvider, ProviderNotification, ProviderEarnings
 
 @admin.register(ServiceProvider)
-class ServiceProviderAdmin(admin.ModelAdmin):
+class ServiceProviderAdmin(LedgerProtectedDeleteMixin, admin.ModelAdmin):
     list_display = ['business_name', 'user', 'provider_type', 'verification_status', 'is_active', 'total_earnings', 'created_at']
     list_filter = ['provider_type', 'verification_status', 'is_active', 'created_at']
     search_fields = ['business_name', 'user__username', 'user__email', 'business_email', 'gst_number']
@@ -1,8 +1,9 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum, Count
+from django.db.models import Count
 from .models import ServiceProvider, ProviderEarnings
+from payment_management.ledger import provider_balances
 from .forms import HotelForm, HotelImageForm, RouteForm
 from hotel_booking.models import Hotel, HotelBooking, HotelImage
 from transportation.models import Route, TransportBooking
@@ -17,6 +18,8 @@ def provider_dashboard_view(request):
         return redirect('home')
     
     provider = request.user.serviceprovider
+    # Revenue is read from the ledger snapshots: provider share plus commission, net of refunds
+    balances = provider_balances(provider)
     
     # Get statistics
     if provider.provider_type in ['HOTEL', 'BOTH']:
@@ -24,8 +27,7 @@ def provider_dashboard_view(request):
         hotel_count = hotels.count()
         hotel_bookings = HotelBooking.objects.filter(hotel__owner=provider)
         hotel_bookings_count = hotel_bookings.count()
-        hotel_revenue = hotel_bookings.filter(booking_status__in=['CONFIRMED', 'COMPLETED']).aggregate(
-            total=Sum('total_amount'))['total'] or 0
+        hotel_revenue = sum(balances.get('HOTEL', {}).values())
     else:
         hotel_count = 0
         hotel_bookings_count = 0
@@ -36,8 +38,7 @@ def provider_dashboard_view(request):
         routes_count = routes.count()
         transport_bookings = TransportBooking.objects.filter(route__owner=provider)
         transport_bookings_count = transport_bookings.count()
-        transport_revenue = transport_bookings.filter(booking_status__in=['CONFIRMED', 'COMPLETED']).aggregate(
-            total=Sum('total_amount'))['total'] or 0
+        transport_revenue = sum(balances.get('TRANSPORT', {}).values())
     else:
         routes_count = 0
         transport_bookings_count = 0
@@ -214,9 +215,11 @@ def provider_earnings_view(request):
     provider = request.user.serviceprovider
     earnings = ProviderEarnings.objects.filter(provider=provider).order_by('-created_at')
     
-    total_earnings = earnings.aggregate(total=Sum('provider_earnings'))['total'] or 0
-    settled_earnings = earnings.filter(is_settled=True).aggregate(total=Sum('provider_earnings'))['total'] or 0
-    pending_earnings = total_earnings - settled_earnings
+    # All from the ledger snapshots: owed (net of refunds) and paid out
+    balances = provider_balances(provider).values()
+    pending_earnings = sum(line['payable'] for line in balances)
+    settled_earnings = sum(line['settled'] for line in balances)
+    total_earnings = pending_earnings + settled_earnings
     
     context = {
         'provider': provider,
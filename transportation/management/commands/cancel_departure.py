@@ -0,0 +1,49 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from payment_management.refunds import cancel_route_departures, process_refunds
+from transportation.models import Route
+
+
+class Command(BaseCommand):
+    help = 'Cancel every booking on a route for one travel date and queue full refunds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('route', help='Route id or route number (e.g. 12951)')
+        parser.add_argument('travel_date', help='YYYY-MM-DD')
+        parser.add_argument('--reason', default='Departure cancelled by operator')
+        parser.add_argument('--process', action='store_true', help='Send the refunds to the gateway before exiting')
+
+    def handle(self, *args, **options):
+        try:
+            travel_date = datetime.strptime(options['travel_date'], '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError('travel_date must look like 2025-01-31')
+
+        routes = Route.objects.filter(route_number=options['route'])
+        if options['route'].isdigit():
+            routes = routes | Route.objects.filter(pk=int(options['route']))
+        if routes.count() != 1:
+            raise CommandError(f"Expected exactly one route matching {options['route']}, found {routes.count()}")
+        route = routes.get()
+        if options['process']:
+            # Refunds are sent below; no background thread needed
+            settings.REFUND_INLINE_WORKER = False
+
+        result = cancel_route_departures(route, travel_date, options['reason'])
+        self.stdout.write(f"Cancelled {result['bookings']} bookings on {route.route_number} ({travel_date}); "
+                          f"{result['refunds']} refunds queued")
+
+        if options['process']:
+            totals = {}
+            while True:
+                counts = process_refunds()
+                if not counts:
+                    break
+                for status, count in counts.items():
+                    totals[status] = totals.get(status, 0) + count
+            self.stdout.write(', '.join(f'{status}: {count}' for status, count in sorted(totals.items())) or 'No refunds due')
+
+        self.stdout.write(self.style.SUCCESS('Done'))
@@ -30,8 +30,8 @@ def transport_search_view(request):
             budget = form.cleaned_data.get('budget', '')
             departure_time = form.cleaned_data.get('departure_time', '')
             
-            # Base query
-            routes = Route.objects.filter(is_active=True)
+            # Base query (the review aggregate rides along for the ratings)
+            routes = Route.objects.filter(is_active=True).select_related('rating_aggregate')
             
             # City filters
             if source_city:
@@ -96,7 +96,8 @@ def transport_search_view(request):
     return render(request, 'transportation/search.html', context)
 
 def route_detail_view(request, route_id):
-    route = get_object_or_404(Route, id=route_id, is_active=True)
+    route = get_object_or_404(Route.objects.select_related('rating_aggregate'), id=route_id, is_active=True)
+    rating_aggregate = getattr(route, 'rating_aggregate', None)
     
     # Get search parameters
     travel_date = request.GET.get('travel_date')
@@ -104,6 +105,8 @@ def route_detail_view(request, route_id):
     
     context = {
         'route': route,
+        'review_count': rating_aggregate.review_count if rating_aggregate else 0,
+        'review_averages': rating_aggregate.averages() if rating_aggregate and rating_aggregate.review_count else {},
         'travel_date': travel_date,
         'passengers': passengers,
     }
@@ -247,6 +250,8 @@ def cancel_transport_booking_view(request, booking_id):
         messages.error(request, 'This booking cannot be cancelled.')
         return redirect('my_transport_bookings')
     
+    from payment_management.refunds import refund_cancelled_booking, refund_quote
+    
     if request.method == 'POST':
         # Restore seats if booking was confirmed
         if booking.booking_status == 'CONFIRMED':
@@ -257,10 +262,17 @@ def cancel_transport_booking_view(request, booking_id):
         booking.booking_status = 'CANCELLED'
         booking.save()
         
-        messages.success(request, f'Booking {booking.booking_id} has been cancelled.')
+        refund = refund_cancelled_booking(booking, f'Transport booking {booking.booking_id} cancelled by passenger')
+        if refund:
+            messages.success(request, f'Booking {booking.booking_id} has been cancelled. A refund of ₹{refund.approved_amount} is being processed.')
+        else:
+            messages.success(request, f'Booking {booking.booking_id} has been cancelled.')
         return redirect('my_transport_bookings')
     
+    _, refund_percent, refund_amount = refund_quote(booking)
     context = {
         'booking': booking,
+        'refund_percent': refund_percent,
+        'refund_amount': refund_amount,
     }
     return render(request, 'transportation/cancel_booking.html', context)
\ No newline at end of file
@@ -2,10 +2,12 @@ from django.contrib import admin
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 
+from payment_management.admin import LedgerProtectedDeleteMixin
+
 User = get_user_model()
 
 @admin.register(User)
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(LedgerProtectedDeleteMixin, BaseUserAdmin):
     list_display = ['username', 'email', 'first_name', 'last_name', 'is_service_provider', 'is_staff', 'is_active', 'date_joined']
     list_filter = ['is_staff', 'is_active', 'is_superuser', 'is_service_provider', 'date_joined']
     search_fields = ['username', 'email', 'first_name', 'last_name']
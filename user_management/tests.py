@@ -1,3 +1,43 @@
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
+
+from payment_management.ledger import get_account
+
+User = get_user_model()
+
+
+class LedgerProtectedUserDeleteTests(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(username='admin', password='pw-12345', email='admin@example.com')
+        self.client.force_login(self.admin_user)
+        self.user = User.objects.create_user(username='guest', password='pw-12345')
+        get_account('CUSTOMER', user=self.user)
+
+    def posted_after_confirmation(self):
+        # The confirmation page saw no ledger rows; one was posted before the delete ran
+        model_admin = admin.site._registry[User]
+        return mock.patch.object(type(model_admin), 'get_deleted_objects', return_value=([], {}, set(), []))
+
+    def test_delete_view_reports_the_protected_user(self):
+        url = reverse('admin:user_management_customuser_delete', args=[self.user.pk])
+        with self.posted_after_confirmation():
+            response = self.client.post(url, {'post': 'yes'})
+
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        self.assertTrue(User.objects.filter(pk=self.user.pk).exists())
+
+    def test_bulk_delete_is_rolled_back(self):
+        url = reverse('admin:user_management_customuser_changelist')
+        with self.posted_after_confirmation():
+            response = self.client.post(url, {
+                'action': 'delete_selected', '_selected_action': [self.user.pk], 'post': 'yes',
+            })
 
-# Create your tests here.
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(User.objects.filter(pk=self.user.pk).exists())
+        self.assertFalse(LogEntry.objects.filter(object_id=str(self.user.pk)).exists())
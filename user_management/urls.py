@@ -21,4 +21,7 @@ urlpatterns = [
     path('management/routes/', views.routes_list_view, name='admin_routes_list'),
     path('management/hotel-bookings/', views.hotel_bookings_list_view, name='admin_hotel_bookings'),
     path('management/transport-bookings/', views.transport_bookings_list_view, name='admin_transport_bookings'),
+    path('management/hotel-bookings/export/', views.export_hotel_bookings_view, name='admin_export_hotel_bookings'),
+    path('management/transport-bookings/export/', views.export_transport_bookings_view, name='admin_export_transport_bookings'),
+    path('management/notifications/metrics/', views.notification_queue_metrics_view, name='admin_notification_metrics'),
 ]
\ No newline at end of file
@@ -1,4 +1,5 @@
 from django.shortcuts import render, redirect
+from django.http import JsonResponse
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
@@ -239,11 +240,9 @@ def user_detail_view(request, user_id):
     hotel_bookings = HotelBooking.objects.filter(user=user).select_related('hotel').order_by('-created_at')
     transport_bookings = TransportBooking.objects.filter(user=user).select_related('route').order_by('-created_at')
     
-    # Calculate statistics
-    total_hotel_spent = hotel_bookings.filter(booking_status__in=['CONFIRMED', 'COMPLETED']).aggregate(
-        total=Sum('total_amount'))['total'] or 0
-    total_transport_spent = transport_bookings.filter(booking_status__in=['CONFIRMED', 'COMPLETED']).aggregate(
-        total=Sum('total_amount'))['total'] or 0
+    # Spending totals (net of refunds) come from the maintained summary row
+    from payment_management.spending import get_spending_summary
+    spending = get_spending_summary(user)
     
     context = {
         'profile_user': user,
@@ -251,9 +250,10 @@ def user_detail_view(request, user_id):
         'transport_bookings': transport_bookings,
         'total_hotel_bookings': hotel_bookings.count(),
         'total_transport_bookings': transport_bookings.count(),
-        'total_hotel_spent': total_hotel_spent,
-        'total_transport_spent': total_transport_spent,
-        'total_spent': total_hotel_spent + total_transport_spent,
+        'total_hotel_spent': spending.hotel_spent,
+        'total_transport_spent': spending.transport_spent,
+        'total_spent': spending.lifetime_value,
+        'spending': spending,
     }
     return render(request, 'user_management/user_detail.html', context)
 
@@ -394,6 +394,38 @@ def transport_bookings_list_view(request):
     }
     return render(request, 'user_management/transport_bookings_list.html', context)
 
+def _booking_export(request, dataset, queryset, list_url_name):
+    """Stream a booking export honouring the list page's status filter"""
+    from export_utils import streaming_export_response
+
+    status = request.GET.get('status', '')
+    if status:
+        queryset = queryset.filter(booking_status=status)
+    try:
+        return streaming_export_response(dataset, request.GET, queryset=queryset)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect(list_url_name)
+
+@login_required
+@user_passes_test(is_admin, login_url='dashboard')
+def export_hotel_bookings_view(request):
+    """Export hotel bookings as CSV / JSON lines"""
+    return _booking_export(request, 'hotel_bookings', HotelBooking.objects.all(), 'admin_hotel_bookings')
+
+@login_required
+@user_passes_test(is_admin, login_url='dashboard')
+def export_transport_bookings_view(request):
+    """Export transport bookings as CSV / JSON lines"""
+    return _booking_export(request, 'transport_bookings', TransportBooking.objects.all(), 'admin_transport_bookings')
+
+@login_required
+@user_passes_test(is_admin, login_url='dashboard')
+def notification_queue_metrics_view(request):
+    """Notification queue depth and health as JSON"""
+    from location_sos.notification_queue import queue_metrics
+    return JsonResponse(queue_metrics())
+
 # Redirect views for main navigation
 def hotel_search_view(request):
     return redirect('/hotels/search/')
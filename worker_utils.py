@@ -0,0 +1,59 @@
+"""
+In-process background workers for the queue tables.
+
+The webhook inbox, the post-payment outbox, the refund queue and the
+notification queue all have a management command for production. In
+development they can also be drained by a background thread that a
+request kicks after its transaction commits. Each queue enables this
+through its own *_INLINE_WORKER setting. One thread per queue drains at
+a time, and it stops as soon as a pass finds nothing to do.
+
+inline_workers_paused() holds every inline worker off (new kicks are
+dropped) so benchmarks can time ingest on its own.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, transaction
+
+_pause_lock = threading.Lock()
+_paused = 0
+
+
+class InlineWorker:
+    def __init__(self, drain, setting):
+        """drain() runs one pass and returns a falsy value once nothing is left"""
+        self.drain = drain
+        self.setting = setting
+        self._lock = threading.Lock()
+
+    def _run(self):
+        try:
+            while self._lock.acquire(blocking=False):
+                try:
+                    counts = self.drain()
+                finally:
+                    self._lock.release()
+                if not counts:
+                    break
+        finally:
+            connection.close()
+
+    def kick(self):
+        """Drain in a background thread after commit, if the queue's setting enables it"""
+        if _paused or not getattr(settings, self.setting, False):
+            return
+        transaction.on_commit(lambda: threading.Thread(target=self._run, daemon=True).start())
+
+
+@contextmanager
+def inline_workers_paused():
+    global _paused
+    with _pause_lock:
+        _paused += 1
+    try:
+        yield
+    finally:
+        with _pause_lock:
+            _paused -= 1